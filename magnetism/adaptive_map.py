@@ -0,0 +1,215 @@
+import numpy as np
+
+from magnetism.coordinate_transformation import is_inside_magnet
+from magnetism.field_map import QUANTITIES
+
+
+def _get_corner_bits(d):
+    # bit a of corner c is its offset along the a-th refined axis
+    return (np.arange(2**d)[:, None] >> np.arange(d)) & 1
+
+
+def _interpolate(corner_values, t):
+    # multilinear interpolation of corner values (n, 2^d, 3) at the local
+    # coordinates t (n, d) in [0, 1]
+    bits = _get_corner_bits(t.shape[1])
+    weights = np.prod(np.where(bits, t[:, None, :], 1 - t[:, None, :]), axis=2)
+    return np.einsum("nc,ncq->nq", weights, corner_values)
+
+
+class _KernelCache:
+    # values of the exact kernel at lattice points, kept sorted by key
+
+    def __init__(self, lower, upper, axes, resolution, evaluate):
+        self.lower = lower
+        self.upper = upper
+        self.axes = axes
+        self.resolution = resolution
+        self.evaluate = evaluate
+        self.keys = np.empty(0, dtype=np.int64)
+        self.values = np.empty((0, 3))
+        self.strides = (resolution + 1) ** np.arange(len(axes), dtype=np.int64)
+
+    def get_coordinates(self, lattice_points):
+        coordinates = np.repeat(self.lower[:, None], len(lattice_points), axis=1)
+        coordinates[self.axes] += (
+            lattice_points.T
+            / self.resolution
+            * (self.upper - self.lower)[self.axes, None]
+        )
+        return coordinates
+
+    def __call__(self, lattice_points):
+        keys = lattice_points @ self.strides
+        new_keys, first = np.unique(keys, return_index=True)
+        position = np.searchsorted(self.keys, new_keys)
+        known = position < len(self.keys)
+        known[known] = self.keys[position[known]] == new_keys[known]
+        if not known.all():
+            x, y, z = self.get_coordinates(lattice_points[first[~known]])
+            new_values = np.asarray(self.evaluate(x, y, z)).T
+            keys_all = np.concatenate([self.keys, new_keys[~known]])
+            order = np.argsort(keys_all, kind="stable")
+            self.keys = keys_all[order]
+            self.values = np.concatenate([self.values, new_values])[order]
+        return self.values[np.searchsorted(self.keys, keys)]
+
+
+def build_adaptive_map(
+    bounds,
+    magnetic_parameters,
+    quantity="field",
+    tolerance=1e-3,
+    absolute_tolerance=0.0,
+    min_depth=2,
+    max_depth=8,
+):
+    """
+    Build an adaptive quadtree/octree map of the field or force.
+
+    bounds are [[x_min, x_max], [y_min, y_max], [z_min, z_max]]; an axis with
+    equal limits is not refined, so a planar slice gives a quadtree. Cells
+    are refined until the multilinear interpolation of their corner values
+    matches the exact kernel at the cell centre and the face centres within
+    tolerance * |value| + absolute_tolerance, or until max_depth. Test points
+    inside the magnet are ignored, cells cut by the surface of the magnet are
+    refined down to max_depth and cells entirely inside it are not refined.
+
+    Returns a dictionary of arrays that can be stored with np.savez and is
+    queried with query_adaptive_map. Its entry "evaluations" is the number
+    of kernel evaluations used to build the map.
+    """
+    lower, upper = np.array(bounds, dtype=np.float64).T
+    axes = np.nonzero(upper > lower)[0]
+    d = len(axes)
+    resolution = 2 ** (max_depth + 1)
+
+    def evaluate(x, y, z):
+        return QUANTITIES[quantity](x, y, z, magnetic_parameters)
+
+    cache = _KernelCache(lower, upper, axes, resolution, evaluate)
+    bits = _get_corner_bits(d)
+    # local coordinates of the cell centre followed by the face centres
+    test_points = np.full((1 + 2 * d, d), 0.5)
+    for a in range(d):
+        test_points[1 + 2 * a, a] = 0.0
+        test_points[2 + 2 * a, a] = 1.0
+
+    origins = np.zeros((1, d), dtype=np.int64)
+    child_or_leaf = []
+    leaf_corners = []
+    n_nodes = 1
+    n_leaves = 0
+    for level in range(max_depth + 1):
+        size = resolution >> level
+        corners = origins[:, None, :] + bits * size
+        corner_values = cache(corners.reshape(-1, d)).reshape(len(origins), -1, 3)
+
+        if level < min_depth:
+            refine = np.ones(len(origins), dtype=bool)
+        elif level == max_depth:
+            refine = np.zeros(len(origins), dtype=bool)
+        else:
+            lattice = origins[:, None, :] + (test_points * size).astype(np.int64)
+            lattice = lattice.reshape(-1, d)
+            exact = cache(lattice).reshape(len(origins), -1, 3)
+            approximate = np.stack(
+                [
+                    _interpolate(corner_values, np.broadcast_to(t, (len(origins), d)))
+                    for t in test_points
+                ],
+                axis=1,
+            )
+            error = np.linalg.norm(approximate - exact, axis=2)
+            allowed = tolerance * np.linalg.norm(exact, axis=2) + absolute_tolerance
+            inside = is_inside_magnet(
+                *cache.get_coordinates(lattice), magnetic_parameters
+            ).reshape(len(origins), -1)
+            inside = np.concatenate(
+                [
+                    inside,
+                    is_inside_magnet(
+                        *cache.get_coordinates(corners.reshape(-1, d)),
+                        magnetic_parameters,
+                    ).reshape(len(origins), -1),
+                ],
+                axis=1,
+            )
+            # the field jumps at the surface of the magnet, cells cut by it
+            # are refined down to max_depth
+            surface = np.any(inside, axis=1) & ~np.all(inside, axis=1)
+            refine = surface | np.any(
+                (error > allowed) & ~inside[:, : len(test_points)], axis=1
+            )
+
+        pointers = np.empty(len(origins), dtype=np.int64)
+        n_refined = np.count_nonzero(refine)
+        pointers[refine] = n_nodes + 2**d * np.arange(n_refined)
+        pointers[~refine] = -(n_leaves + np.arange(len(origins) - n_refined)) - 1
+        child_or_leaf.append(pointers)
+        leaf_corners.append(corners[~refine])
+        n_nodes += 2**d * n_refined
+        n_leaves += len(origins) - n_refined
+
+        origins = (origins[refine][:, None, :] + bits * (size // 2)).reshape(-1, d)
+        if not len(origins):
+            break
+
+    # store every corner value once, leaves refer to them by index
+    leaf_corners = np.concatenate(leaf_corners)
+    keys = leaf_corners.reshape(-1, d) @ cache.strides
+    vertex_keys, leaf_vertices = np.unique(keys, return_inverse=True)
+    vertex_values = cache.values[np.searchsorted(cache.keys, vertex_keys)]
+
+    return {
+        "lower": lower,
+        "upper": upper,
+        "axes": axes,
+        "child_or_leaf": np.concatenate(child_or_leaf).astype(np.int32),
+        "leaf_vertices": leaf_vertices.reshape(-1, 2**d).astype(np.int32),
+        "vertex_values": vertex_values,
+        "evaluations": len(cache.keys),
+    }
+
+
+def query_adaptive_map(tree, x, y, z):
+    """
+    Interpolate an adaptive map at the points x, y, z.
+
+    All points descend the tree together, one level per step. Returns an
+    array of shape (3,) + shape of the points; points outside the bounds of
+    the map are NaN.
+    """
+    x, y, z = np.broadcast_arrays(*(np.asarray(c, dtype=np.float64) for c in (x, y, z)))
+    shape = x.shape
+    coordinates = np.stack([x.ravel(), y.ravel(), z.ravel()])
+    axes = tree["axes"]
+    d = len(axes)
+    lower, upper = tree["lower"], tree["upper"]
+    child_or_leaf = tree["child_or_leaf"]
+
+    outside = np.any((coordinates < lower[:, None]) | (coordinates > upper[:, None]), 0)
+    t = ((coordinates[axes] - lower[axes, None]) / (upper - lower)[axes, None]).T
+    t = np.clip(t, 0, 1)
+
+    n = len(t)
+    node = np.zeros(n, dtype=np.int64)
+    origin = np.zeros((n, d))
+    size = np.ones(n)
+    child_weights = 2 ** np.arange(d)
+    while True:
+        pointer = child_or_leaf[node]
+        descend = np.nonzero(pointer >= 0)[0]
+        if not len(descend):
+            break
+        size[descend] *= 0.5
+        bit = t[descend] >= origin[descend] + size[descend, None]
+        origin[descend] += bit * size[descend, None]
+        node[descend] = pointer[descend] + bit @ child_weights
+
+    leaf = -pointer - 1
+    local = np.clip((t - origin) / size[:, None], 0, 1)
+    corner_values = tree["vertex_values"][tree["leaf_vertices"][leaf]]
+    values = _interpolate(corner_values, local)
+    values[outside] = np.nan
+    return values.T.reshape((3,) + shape)
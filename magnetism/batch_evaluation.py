@@ -0,0 +1,657 @@
+import numpy as np
+from scipy.special import elliprd as CarlsonRD
+from scipy.special import elliprf as CarlsonRF
+from scipy.special import elliprj as CarlsonRJ
+
+from magnetism.magnetic_field import SERIES_LIMIT, get_magnetization_components
+from magnetism.magnetic_force import AXIS_LIMIT, DERIVATIVE_STEP
+from magnetism.magnetisation_model import evaluate_magnetisation_model
+
+# 1 - m for the parameter m = 1 - 1e-9 that replaces the singularity at m = 1,
+# see magnetism.elliptic_integrals
+ONE_MINUS_M_CLAMPED = 1 - (1 - 1e-9)
+
+# size of the workspace per point of a chunk, dominated by the force kernel
+# with a field-dependent magnetisation model
+WORKSPACE_BYTES_PER_POINT = 682
+
+DEFAULT_MEMORY_BUDGET = 64 * 2**20  # bytes
+
+
+class Workspace:
+    """
+    Scratch arrays for the batched field and force kernels.
+
+    The arrays are allocated on first use and reused by every later call, so
+    repeated evaluations do not allocate any memory proportional to the
+    number of points. Batches are evaluated in chunks of chunk_size points;
+    without an explicit chunk size it is chosen such that the scratch arrays
+    of the force kernel fit into memory_budget bytes.
+    """
+
+    def __init__(self, chunk_size=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+        if chunk_size is None:
+            chunk_size = max(1, memory_budget // WORKSPACE_BYTES_PER_POINT)
+        self.chunk_size = int(chunk_size)
+        self.arrays = {}
+
+    def __getitem__(self, name):
+        array = self.arrays.get(name)
+        if array is None:
+            dtype = bool if name.startswith("mask") else np.float64
+            array = np.empty(self.chunk_size, dtype=dtype)
+            self.arrays[name] = array
+        return array
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+
+def _clamp_small(value, ws, n):
+    # replace values with a magnitude below 1e-9 by 1e-9 in place
+    np.abs(value, out=ws["tmp_abs"][:n])
+    np.less(ws["tmp_abs"][:n], 1e-9, out=ws["mask"][:n])
+    np.copyto(value, 1e-9, where=ws["mask"][:n])
+
+
+def _carlson_integrals(m, n_parameter, prefix, ws, n):
+    # evaluate R_F, R_D and R_J of the complete elliptic integrals with
+    # parameter m and characteristic n_parameter, see elliptic_integrals
+    one_minus_m = ws[prefix + "_one_minus_m"][:n]
+    np.subtract(1, m, out=one_minus_m)
+    np.equal(one_minus_m, 0, out=ws["mask"][:n])
+    np.copyto(one_minus_m, ONE_MINUS_M_CLAMPED, where=ws["mask"][:n])
+    np.copyto(m, 1 - 1e-9, where=ws["mask"][:n])
+
+    one_minus_n = ws[prefix + "_one_minus_n"][:n]
+    np.subtract(1, n_parameter, out=one_minus_n)
+    np.equal(one_minus_n, 0, out=ws["mask"][:n])
+    np.copyto(one_minus_n, ONE_MINUS_M_CLAMPED, where=ws["mask"][:n])
+    np.copyto(n_parameter, 1 - 1e-9, where=ws["mask"][:n])
+
+    RF = CarlsonRF(0, one_minus_m, 1, out=ws[prefix + "_RF"][:n])
+    RD = CarlsonRD(0, one_minus_m, 1, out=ws[prefix + "_RD"][:n])
+    RJ = CarlsonRJ(0, one_minus_m, 1, one_minus_n, out=ws[prefix + "_RJ"][:n])
+    return RF, RD, RJ
+
+
+def _complete_integrals(m, n_parameter, prefix, ws, n):
+    # K, E and Pi sharing the Carlson integrals in the workspace
+    RF, RD, RJ = _carlson_integrals(m, n_parameter, prefix, ws, n)
+    K = RF
+    E = ws[prefix + "_E"][:n]
+    np.multiply(1 / 3, m, out=E)
+    np.multiply(E, RD, out=E)
+    np.subtract(RF, E, out=E)
+    Pi = ws[prefix + "_Pi"][:n]
+    np.multiply(1 / 3, n_parameter, out=Pi)
+    np.multiply(Pi, RJ, out=Pi)
+    np.add(RF, Pi, out=Pi)
+    return K, E, Pi
+
+
+def _transform_coordinates_forward(x, y, z, params, ws, n):
+    # in-place version of transform_coordinates_forward
+    gamma = params["rotation_x"] * np.pi / 180
+    beta = params["rotation_y"] * np.pi / 180
+    cos_beta, sin_beta = np.cos(beta), np.sin(beta)
+    cos_gamma, sin_gamma = np.cos(gamma), np.sin(gamma)
+
+    x_t = np.subtract(x, params["x_position"], out=ws["x_translated"][:n])
+    y_t = np.subtract(y, params["y_position"], out=ws["y_translated"][:n])
+    z_t = np.subtract(z, params["z_position"], out=ws["z_translated"][:n])
+    tmp = ws["tmp"][:n]
+
+    xi = np.multiply(x_t, cos_beta, out=ws["xi"][:n])
+    np.add(xi, np.multiply(y_t, sin_beta * sin_gamma, out=tmp), out=xi)
+    np.add(xi, np.multiply(z_t, sin_beta * cos_gamma, out=tmp), out=xi)
+    eta = np.multiply(y_t, cos_gamma, out=ws["eta"][:n])
+    np.subtract(eta, np.multiply(z_t, sin_gamma, out=tmp), out=eta)
+    zeta = np.multiply(x_t, -sin_beta, out=ws["z"][:n])
+    np.add(zeta, np.multiply(y_t, cos_beta * sin_gamma, out=tmp), out=zeta)
+    np.add(zeta, np.multiply(z_t, cos_beta * cos_gamma, out=tmp), out=zeta)
+
+    rho = np.square(xi, out=ws["rho"][:n])
+    np.add(rho, np.square(eta, out=tmp), out=rho)
+    np.sqrt(rho, out=rho)
+    np.maximum(rho, 1e-9, out=rho)
+    phi = np.arctan2(eta, xi, out=ws["phi"][:n])
+    return rho, phi, zeta
+
+
+def _transform_vector_backward(
+    rho_component, z_component, phi, params, out, ws, n, phi_component=None
+):
+    # in-place version of transform_vector_backward writing into out
+    gamma = params["rotation_x"] * np.pi / 180
+    beta = params["rotation_y"] * np.pi / 180
+    cos_beta, sin_beta = np.cos(beta), np.sin(beta)
+    cos_gamma, sin_gamma = np.cos(gamma), np.sin(gamma)
+
+    xi = np.multiply(rho_component, np.cos(phi, out=ws["tmp"][:n]), out=ws["xi"][:n])
+    eta = np.multiply(rho_component, np.sin(phi, out=ws["tmp"][:n]), out=ws["eta"][:n])
+    tmp = ws["tmp"][:n]
+    if phi_component is not None:
+        np.subtract(
+            xi, np.multiply(phi_component, np.sin(phi, out=tmp), out=tmp), out=xi
+        )
+        np.add(eta, np.multiply(phi_component, np.cos(phi, out=tmp), out=tmp), out=eta)
+
+    out_x, out_y, out_z = out
+    np.multiply(xi, cos_beta, out=tmp)
+    np.subtract(tmp, np.multiply(z_component, sin_beta, out=ws["tmp_2"][:n]), out=tmp)
+    out_x[...] = tmp
+
+    np.multiply(xi, sin_beta * sin_gamma, out=tmp)
+    np.add(tmp, np.multiply(eta, cos_gamma, out=ws["tmp_2"][:n]), out=tmp)
+    np.add(
+        tmp,
+        np.multiply(z_component, sin_gamma * cos_beta, out=ws["tmp_2"][:n]),
+        out=tmp,
+    )
+    out_y[...] = tmp
+
+    np.multiply(xi, sin_beta * cos_gamma, out=tmp)
+    np.subtract(tmp, np.multiply(eta, sin_gamma, out=ws["tmp_2"][:n]), out=tmp)
+    np.add(
+        tmp,
+        np.multiply(z_component, cos_beta * cos_gamma, out=ws["tmp_2"][:n]),
+        out=tmp,
+    )
+    out_z[...] = tmp
+
+
+def _field_terms(rho, z, params, magnetization, transverse, prefix, ws, n):
+    # in-place version of evaluate_magnetic_field_cylindrical for one chunk,
+    # writing H_rho, H_z and with transverse=True H_phi / sin(phi) into the
+    # workspace arrays prefix + "_rho", "_zeta" and "_phi"
+    R = params["radius_magnet"]
+    half_length = 0.5 * params["length"]
+    tmp = ws["tmp"][:n]
+
+    # auxiliary variables
+    rho_p = np.add(R, rho, out=ws["rho_p"][:n])
+    _clamp_small(rho_p, ws, n)
+    rho_m = np.subtract(R, rho, out=ws["rho_m"][:n])
+    _clamp_small(rho_m, ws, n)
+    zeta_p = np.add(half_length, z, out=ws["zeta_p"][:n])
+    zeta_m = np.subtract(half_length, z, out=ws["zeta_m"][:n])
+    rho_p_squared = np.square(rho_p, out=ws["rho_p_squared"][:n])
+    rho_m_squared = np.square(rho_m, out=ws["rho_m_squared"][:n])
+
+    gamma = np.subtract(rho, R, out=ws["gamma"][:n])
+    np.divide(gamma, np.add(rho, R, out=tmp), out=gamma)
+    _clamp_small(gamma, ws, n)
+    gamma_squared = np.square(gamma, out=ws["gamma_squared"][:n])
+    one_minus_gamma_squared = np.subtract(
+        1, gamma_squared, out=ws["one_minus_gamma_squared"][:n]
+    )
+
+    H_rho = ws[prefix + "_rho"][:n]
+    H_z = ws[prefix + "_zeta"][:n]
+    H_rho[...] = 0
+    H_z[...] = 0
+    if transverse:
+        H_phi = ws[prefix + "_phi"][:n]
+        H_phi[...] = 0
+    for sign, zeta in [(1, zeta_p), (-1, zeta_m)]:
+        # alpha and beta of the end face, beta_m carries a minus sign
+        zeta_squared = np.square(zeta, out=ws["zeta_squared"][:n])
+        alpha = np.add(zeta_squared, rho_p_squared, out=ws["alpha"][:n])
+        np.sqrt(alpha, out=alpha)
+        np.divide(1, alpha, out=alpha)
+        beta = np.multiply(zeta, alpha, out=ws["beta"][:n])
+        if sign < 0:
+            np.negative(beta, out=beta)
+
+        # k^2 and the parameters of the elliptic integrals
+        k_squared = np.add(zeta_squared, rho_m_squared, out=ws["k_squared"][:n])
+        np.divide(
+            k_squared, np.add(zeta_squared, rho_p_squared, out=tmp), out=k_squared
+        )
+        m = np.subtract(1, k_squared, out=ws["m"][:n])
+        n_parameter = ws["n_parameter"][:n]
+        n_parameter[...] = one_minus_gamma_squared
+        K, E, P = _complete_integrals(m, n_parameter, "field", ws, n)
+
+        # P_1 = K - 2 / (1 - k^2) * (K - E)
+        P_1 = np.subtract(K, E, out=ws["P_1"][:n])
+        np.multiply(
+            P_1, np.divide(2, np.subtract(1, k_squared, out=tmp), out=tmp), out=P_1
+        )
+        np.subtract(K, P_1, out=P_1)
+
+        # P_2 = -gamma / (1 - gamma^2) * (P - K) - (gamma^2 P - K) / (1 - gamma^2)
+        P_2 = np.subtract(P, K, out=ws["P_2"][:n])
+        np.multiply(P_2, gamma, out=P_2)
+        np.multiply(gamma_squared, P, out=tmp)
+        np.subtract(tmp, K, out=tmp)
+        np.add(P_2, tmp, out=P_2)
+        np.divide(P_2, one_minus_gamma_squared, out=P_2)
+        np.negative(P_2, out=P_2)
+
+        # accumulate the contribution of the end face, see Eq. (3)
+        np.multiply(alpha, P_1, out=tmp)
+        np.multiply(tmp, sign, out=tmp)
+        np.add(H_rho, tmp, out=H_rho)
+        np.multiply(beta, P_2, out=tmp)
+        np.multiply(tmp, sign, out=tmp)
+        np.add(H_z, tmp, out=H_z)
+
+        if transverse:
+            _accumulate_transverse_term(m, n_parameter, beta, sign, H_phi, ws, n)
+
+    np.multiply(H_rho, R * (magnetization / np.pi), out=H_rho)
+    np.multiply(H_z, np.divide(R * magnetization / np.pi, rho_p, out=tmp), out=H_z)
+    if transverse:
+        np.divide(4 * R**2 * magnetization / np.pi, rho_p_squared, out=tmp)
+        np.multiply(H_phi, tmp, out=H_phi)
+        return H_rho, H_z, H_phi
+    return H_rho, H_z
+
+
+def _accumulate_transverse_term(m, n_parameter, beta, sign, H_phi, ws, n):
+    # add sign * beta * P_phi with the Carlson integrals of the end face
+    # already in the workspace, see magnetic_field.P_phi
+    P_phi = ws["P_phi"][:n]
+    tmp = ws["tmp"][:n]
+    np.subtract(1, n_parameter, out=tmp)
+    np.multiply(tmp, ws["field_RJ"][:n], out=tmp)
+    np.subtract(ws["field_RD"][:n], tmp, out=P_phi)
+    np.divide(P_phi, np.multiply(3, n_parameter, out=tmp), out=P_phi)
+
+    # series close to the axis
+    close = np.less(n_parameter, SERIES_LIMIT, out=ws["mask_close"][:n])
+    if close.any():
+        series = ws["P_phi_series"][:n]
+        np.multiply(m, 0.375, out=series)
+        np.add(series, np.multiply(n_parameter, 0.5, out=tmp), out=series)
+        np.multiply(series, m, out=series)
+        np.add(series, np.multiply(n_parameter, n_parameter, out=tmp), out=series)
+        np.multiply(series, 5 / 16, out=series)
+        np.add(series, np.multiply(m, 0.25, out=tmp), out=series)
+        np.add(series, np.multiply(n_parameter, 0.5, out=tmp), out=series)
+        np.add(series, 1, out=series)
+        np.multiply(series, np.pi / 16, out=series)
+        np.copyto(P_phi, series, where=close)
+
+    np.multiply(P_phi, beta, out=P_phi)
+    np.multiply(P_phi, sign, out=P_phi)
+    np.add(H_phi, P_phi, out=H_phi)
+
+
+def _field_kernel(x, y, z, params, out, ws):
+    # in-place version of evaluate_magnetic_field for one chunk
+    n = len(x)
+    R = params["radius_magnet"]
+    half_length = 0.5 * params["length"]
+    M_axial, M_transverse, phi_M = get_magnetization_components(params)
+    tmp = ws["tmp"][:n]
+
+    rho, phi, z = _transform_coordinates_forward(x, y, z, params, ws, n)
+
+    if M_transverse == 0:
+        H_rho, H_z = _field_terms(rho, z, params, M_axial, False, "H", ws, n)
+        H_phi = None
+    else:
+        # see evaluate_magnetic_field
+        h_rho, h_z, h_phi = _field_terms(rho, z, params, 1.0, True, "H", ws, n)
+        cos_phi = np.cos(np.subtract(phi, phi_M, out=tmp), out=ws["cos_phi"][:n])
+        sin_phi = np.sin(np.subtract(phi, phi_M, out=tmp), out=ws["sin_phi"][:n])
+        # H_rho = M_a h_rho + M_t cos (h_phi - h_z), H_z = M_a h_z + M_t cos h_rho
+        H_rho = np.subtract(h_phi, h_z, out=ws["H_transverse_rho"][:n])
+        np.multiply(H_rho, cos_phi, out=H_rho)
+        np.multiply(H_rho, M_transverse, out=H_rho)
+        np.add(H_rho, np.multiply(h_rho, M_axial, out=tmp), out=H_rho)
+        H_z = np.multiply(h_z, M_axial, out=h_z)
+        np.multiply(h_rho, cos_phi, out=tmp)
+        np.add(H_z, np.multiply(tmp, M_transverse, out=tmp), out=H_z)
+        H_phi = np.multiply(h_phi, sin_phi, out=h_phi)
+        np.multiply(H_phi, M_transverse, out=H_phi)
+
+    # inside the magnet: subtract the magnetization M
+    inside = ws["mask_inside"][:n]
+    np.less(rho, R, out=inside)
+    np.logical_and(
+        inside, np.less(np.abs(z, out=tmp), half_length, out=ws["mask"][:n]), out=inside
+    )
+    np.subtract(H_z, M_axial, out=H_z, where=inside)
+
+    _transform_vector_backward(H_rho, H_z, phi, params, out, ws, n, H_phi)
+
+
+def _add_field_derivative(
+    H, terms, cos_phi, sin_phi, M_axial, M_transverse, out, ws, n
+):
+    # out = 2 H . dH for the derivatives terms = (d_rho, d_z, d_phi) of the
+    # field terms, see evaluate_magnetic_force_transverse
+    H_rho, H_phi, H_z = H
+    d_rho, d_z, d_phi = terms
+    tmp = ws["tmp"][:n]
+    tmp_2 = ws["tmp_2"][:n]
+
+    # dH_rho = M_a d_rho + M_t cos (d_phi - d_z)
+    np.subtract(d_phi, d_z, out=tmp)
+    np.multiply(tmp, cos_phi, out=tmp)
+    np.multiply(tmp, M_transverse, out=tmp)
+    np.add(tmp, np.multiply(d_rho, M_axial, out=tmp_2), out=tmp)
+    np.multiply(H_rho, tmp, out=out)
+    # dH_phi = M_t sin d_phi
+    np.multiply(d_phi, sin_phi, out=tmp)
+    np.multiply(tmp, M_transverse, out=tmp)
+    np.add(out, np.multiply(H_phi, tmp, out=tmp), out=out)
+    # dH_z = M_a d_z + M_t cos d_rho
+    np.multiply(d_rho, cos_phi, out=tmp)
+    np.multiply(tmp, M_transverse, out=tmp)
+    np.add(tmp, np.multiply(d_z, M_axial, out=tmp_2), out=tmp)
+    np.add(out, np.multiply(H_z, tmp, out=tmp), out=out)
+    np.multiply(out, 2, out=out)
+
+
+def _force_kernel_transverse(x, y, z, params, magnetic_volume, out, ws):
+    # in-place version of evaluate_magnetic_force_transverse for one chunk
+    n = len(x)
+    M_axial, M_transverse, phi_M = get_magnetization_components(params)
+    h = DERIVATIVE_STEP * params["radius_magnet"]
+    tmp = ws["tmp"][:n]
+
+    rho, phi, z = _transform_coordinates_forward(x, y, z, params, ws, n)
+
+    # radial derivatives of the field terms, mirrored at the axis where rho < h
+    differences = []
+    for prefix, offset in [("h_plus", h), ("h_minus", -h)]:
+        rho_offset = np.add(rho, offset, out=ws["rho_offset"][:n])
+        mirrored = np.less(rho_offset, 0, out=ws["mask_mirrored"][:n])
+        np.abs(rho_offset, out=rho_offset)
+        terms = _field_terms(rho_offset, z, params, 1.0, True, prefix, ws, n)
+        np.negative(terms[0], out=terms[0], where=mirrored)
+        differences.append(terms)
+    d_rho = []
+    for plus, minus in zip(*differences):
+        np.subtract(plus, minus, out=plus)
+        d_rho.append(np.multiply(plus, 1 / (2 * h), out=plus))
+    dh_rho, dh_z, dh_phi = d_rho
+    h_rho, h_z, h_phi = _field_terms(rho, z, params, 1.0, True, "h", ws, n)
+
+    # curl H = 0 and div H = 0 give the axial derivatives of the terms
+    h_rho_over_rho = np.divide(h_rho, rho, out=ws["h_rho_over_rho"][:n])
+    np.copyto(h_rho_over_rho, dh_rho, where=np.less_equal(rho, h, out=ws["mask"][:n]))
+    dz_h_z = np.add(dh_rho, h_rho_over_rho, out=differences[1][0])
+    np.negative(dz_h_z, out=dz_h_z)
+    dz_h_phi = np.negative(h_rho_over_rho, out=differences[1][2])
+
+    # the field, see evaluate_magnetic_field
+    cos_phi = np.cos(np.subtract(phi, phi_M, out=tmp), out=ws["cos_phi"][:n])
+    sin_phi = np.sin(np.subtract(phi, phi_M, out=tmp), out=ws["sin_phi"][:n])
+    H_rho = np.subtract(h_phi, h_z, out=ws["H_transverse_rho"][:n])
+    np.multiply(H_rho, cos_phi, out=H_rho)
+    np.multiply(H_rho, M_transverse, out=H_rho)
+    np.add(H_rho, np.multiply(h_rho, M_axial, out=tmp), out=H_rho)
+    H_phi = np.multiply(h_phi, sin_phi, out=ws["H_transverse_phi"][:n])
+    np.multiply(H_phi, M_transverse, out=H_phi)
+    H_z = np.multiply(h_rho, cos_phi, out=ws["H_transverse_z"][:n])
+    np.multiply(H_z, M_transverse, out=H_z)
+    np.add(H_z, np.multiply(h_z, M_axial, out=tmp), out=H_z)
+    H = (H_rho, H_phi, H_z)
+
+    # gradient of |H|^2, the azimuthal derivatives follow from replacing
+    # cos by -sin and sin by cos
+    F_rho = ws["F_rho"][:n]
+    F_z = ws["F_z"][:n]
+    F_phi = ws["F_phi"][:n]
+    args = (cos_phi, sin_phi, M_axial, M_transverse)
+    _add_field_derivative(H, (dh_rho, dh_z, dh_phi), *args, F_rho, ws, n)
+    _add_field_derivative(H, (dh_z, dz_h_z, dz_h_phi), *args, F_z, ws, n)
+    minus_sin_phi = np.negative(sin_phi, out=ws["minus_sin_phi"][:n])
+    _add_field_derivative(
+        H,
+        (h_rho, h_z, h_phi),
+        minus_sin_phi,
+        cos_phi,
+        0.0,
+        M_transverse,
+        F_phi,
+        ws,
+        n,
+    )
+    np.divide(F_phi, rho, out=F_phi)
+
+    # F = mu_0 f_H grad(|H|^2) / 2
+    H_magnitude = np.square(H_rho, out=ws["H_magnitude"][:n])
+    np.add(H_magnitude, np.square(H_phi, out=tmp), out=H_magnitude)
+    np.add(H_magnitude, np.square(H_z, out=tmp), out=H_magnitude)
+    np.sqrt(H_magnitude, out=H_magnitude)
+    f_H = evaluate_magnetisation_model(params, H_magnitude, magnetic_volume)
+    factor = np.multiply(
+        0.5 * params["magnetic_permeability"], f_H, out=ws["factor"][:n]
+    )
+    np.multiply(F_rho, factor, out=F_rho)
+    np.multiply(F_z, factor, out=F_z)
+    np.multiply(F_phi, factor, out=F_phi)
+
+    _transform_vector_backward(F_rho, F_z, phi, params, out, ws, n, F_phi)
+
+
+def _force_kernel(x, y, z, params, magnetic_volume, out, ws):
+    # in-place version of evaluate_magnetic_force for one chunk
+    if get_magnetization_components(params)[1] != 0:
+        _force_kernel_transverse(x, y, z, params, magnetic_volume, out, ws)
+        return
+
+    n = len(x)
+    R = params["radius_magnet"]
+    half_length = 0.5 * params["length"]
+    tmp = ws["tmp"][:n]
+    tmp_2 = ws["tmp_2"][:n]
+
+    # only the saturating magnetisation model depends on the field
+    if params["magnetisation_model"] == "constant":
+        H_magnitude = None
+    else:
+        H = (ws["H_x"][:n], ws["H_y"][:n], ws["H_z"][:n])
+        _field_kernel(x, y, z, params, H, ws)
+        H_magnitude = np.square(H[0], out=ws["H_magnitude"][:n])
+        np.add(H_magnitude, np.square(H[1], out=tmp), out=H_magnitude)
+        np.add(H_magnitude, np.square(H[2], out=tmp), out=H_magnitude)
+        np.sqrt(H_magnitude, out=H_magnitude)
+    f_H = evaluate_magnetisation_model(params, H_magnitude, magnetic_volume)
+
+    rho, phi, z = _transform_coordinates_forward(x, y, z, params, ws, n)
+
+    # auxiliary variables, see evaluate_magnetic_force
+    rho_p = np.add(R, rho, out=ws["rho_p"][:n])
+    rho_m = np.subtract(R, rho, out=ws["rho_m"][:n])
+    zeta_p = np.add(half_length, z, out=ws["zeta_p"][:n])
+    zeta_m = np.subtract(half_length, z, out=ws["zeta_m"][:n])
+    rho_squared = np.square(rho, out=ws["rho_squared"][:n])
+    rho_p_squared = np.square(rho_p, out=ws["rho_p_squared"][:n])
+    rho_m_squared = np.square(rho_m, out=ws["rho_m_squared"][:n])
+    zeta_p_squared = np.square(zeta_p, out=ws["zeta_p_squared"][:n])
+    zeta_m_squared = np.square(zeta_m, out=ws["zeta_m_squared"][:n])
+
+    a_1 = np.add(rho_p_squared, zeta_p_squared, out=ws["a_1"][:n])
+    a_2 = np.add(rho_p_squared, zeta_m_squared, out=ws["a_2"][:n])
+    a_3 = np.add(rho_m_squared, zeta_p_squared, out=ws["a_3"][:n])
+    a_4 = np.add(rho_m_squared, zeta_m_squared, out=ws["a_4"][:n])
+
+    b_1 = np.add(zeta_p_squared, R**2, out=ws["b_1"][:n])
+    b_2 = np.add(zeta_m_squared, R**2, out=ws["b_2"][:n])
+    b_3 = np.subtract(zeta_p_squared, R**2, out=ws["b_3"][:n])
+    b_4 = np.subtract(zeta_m_squared, R**2, out=ws["b_4"][:n])
+
+    c_1 = np.add(b_1, rho_squared, out=ws["c_1"][:n])
+    c_2 = np.add(b_2, rho_squared, out=ws["c_2"][:n])
+    c_3 = np.add(b_3, rho_squared, out=ws["c_3"][:n])
+    c_4 = np.add(b_4, rho_squared, out=ws["c_4"][:n])
+
+    # 1 / alpha_p and 1 / alpha_m
+    sqrt_a_1 = np.sqrt(a_1, out=ws["sqrt_a_1"][:n])
+    sqrt_a_2 = np.sqrt(a_2, out=ws["sqrt_a_2"][:n])
+
+    # parameters of the elliptic integrals
+    np.multiply(4 * R, rho, out=tmp)
+    psi_p = np.divide(tmp, a_1, out=ws["psi_p"][:n])
+    psi_m = np.divide(tmp, a_2, out=ws["psi_m"][:n])
+    beta_p = np.divide(tmp, rho_p_squared, out=ws["beta_p"][:n])
+    beta_m = ws["beta_m"][:n]
+    beta_m[...] = beta_p
+    K_p, E_p, Pi_p = _complete_integrals(psi_p, beta_p, "p", ws, n)
+    K_m, E_m, Pi_m = _complete_integrals(psi_m, beta_m, "m", ws, n)
+
+    # the elliptic integrals always appear divided by alpha_p or alpha_m
+    np.multiply(K_p, sqrt_a_2, out=K_p)
+    np.multiply(E_p, sqrt_a_2, out=E_p)
+    np.multiply(Pi_p, sqrt_a_2, out=Pi_p)
+    np.multiply(K_m, sqrt_a_1, out=K_m)
+    np.multiply(E_m, sqrt_a_1, out=E_m)
+    np.multiply(Pi_m, sqrt_a_1, out=Pi_m)
+
+    # Q_1 = a_2 E_m - a_1 E_p + c_1 K_p - c_2 K_m
+    Q_1 = np.multiply(a_2, E_m, out=ws["Q_1"][:n])
+    np.subtract(Q_1, np.multiply(a_1, E_p, out=tmp), out=Q_1)
+    np.add(Q_1, np.multiply(c_1, K_p, out=tmp), out=Q_1)
+    np.subtract(Q_1, np.multiply(c_2, K_m, out=tmp), out=Q_1)
+
+    # Q_2 = rho_p (zeta_p K_p + zeta_m K_m) + rho_m (zeta_p Pi_p + zeta_m Pi_m)
+    Q_2 = np.multiply(zeta_p, K_p, out=ws["Q_2"][:n])
+    np.add(Q_2, np.multiply(zeta_m, K_m, out=tmp), out=Q_2)
+    np.multiply(Q_2, rho_p, out=Q_2)
+    np.multiply(zeta_p, Pi_p, out=tmp)
+    np.add(tmp, np.multiply(zeta_m, Pi_m, out=tmp_2), out=tmp)
+    np.add(Q_2, np.multiply(tmp, rho_m, out=tmp), out=Q_2)
+
+    a_34 = np.multiply(a_3, a_4, out=ws["a_34"][:n])
+
+    # A = a_3 c_2 zeta_m E_m + a_4 c_1 zeta_p E_p - a_3 a_4 (zeta_m K_m + zeta_p K_p)
+    A = np.multiply(a_3, c_2, out=ws["A"][:n])
+    np.multiply(A, zeta_m, out=A)
+    np.multiply(A, E_m, out=A)
+    np.multiply(a_4, c_1, out=tmp)
+    np.multiply(tmp, zeta_p, out=tmp)
+    np.add(A, np.multiply(tmp, E_p, out=tmp), out=A)
+    np.multiply(zeta_m, K_m, out=tmp)
+    np.add(tmp, np.multiply(zeta_p, K_p, out=tmp_2), out=tmp)
+    np.subtract(A, np.multiply(tmp, a_34, out=tmp), out=A)
+
+    # B = (b_1^2 + rho^2 b_3) a_4 E_p - (b_2^2 + rho^2 b_4) a_3 E_m
+    #     + a_3 a_4 (b_2 K_m - b_1 K_p)
+    B = np.multiply(rho_squared, b_3, out=ws["B"][:n])
+    np.add(B, np.square(b_1, out=tmp), out=B)
+    np.multiply(B, a_4, out=B)
+    np.multiply(B, E_p, out=B)
+    np.multiply(rho_squared, b_4, out=tmp)
+    np.add(tmp, np.square(b_2, out=tmp_2), out=tmp)
+    np.multiply(tmp, a_3, out=tmp)
+    np.subtract(B, np.multiply(tmp, E_m, out=tmp), out=B)
+    np.multiply(b_2, K_m, out=tmp)
+    np.subtract(tmp, np.multiply(b_1, K_p, out=tmp_2), out=tmp)
+    np.add(B, np.multiply(tmp, a_34, out=tmp), out=B)
+
+    # D = c_4 a_3 E_m - c_3 a_4 E_p - a_3 a_4 (K_m - K_p)
+    D = np.multiply(c_4, a_3, out=ws["D"][:n])
+    np.multiply(D, E_m, out=D)
+    np.multiply(c_3, a_4, out=tmp)
+    np.subtract(D, np.multiply(tmp, E_p, out=tmp), out=D)
+    np.subtract(K_m, K_p, out=tmp)
+    np.subtract(D, np.multiply(tmp, a_34, out=tmp), out=D)
+
+    # common factor M^2 mu_0 f_H / (4 pi^2 a_1 a_2 a_3 a_4)
+    factor = ws["factor"][:n]
+    np.multiply(a_34, a_1, out=factor)
+    np.multiply(factor, a_2, out=factor)
+    np.multiply(factor, 4.0 * np.pi**2, out=factor)
+    np.divide(
+        params["magnetization"] ** 2 * params["magnetic_permeability"],
+        factor,
+        out=factor,
+    )
+    np.multiply(factor, f_H, out=factor)
+
+    # F_rho = (rho^2 Q_2 A + rho_p Q_1 B) / (rho^3 rho_p)
+    F_rho = np.multiply(rho_squared, Q_2, out=ws["F_rho"][:n])
+    np.multiply(F_rho, A, out=F_rho)
+    np.add(F_rho, np.multiply(np.multiply(rho_p, Q_1, out=tmp), B, out=tmp), out=F_rho)
+    np.multiply(rho_squared, rho, out=tmp)
+    np.multiply(tmp, rho_p, out=tmp)
+    np.divide(F_rho, tmp, out=F_rho)
+    np.multiply(F_rho, factor, out=F_rho)
+    np.less(rho, AXIS_LIMIT * R, out=ws["mask"][:n])
+    np.copyto(F_rho, 0.0, where=ws["mask"][:n])
+
+    # F_z = -Q_1 A / rho^2 + Q_2 D / rho_p
+    F_z = np.multiply(Q_1, A, out=ws["F_z"][:n])
+    np.divide(F_z, rho_squared, out=F_z)
+    np.negative(F_z, out=F_z)
+    np.multiply(Q_2, D, out=tmp)
+    np.add(F_z, np.divide(tmp, rho_p, out=tmp), out=F_z)
+    np.multiply(F_z, factor, out=F_z)
+
+    _transform_vector_backward(F_rho, F_z, phi, params, out, ws, n)
+
+
+def _evaluate_batch(kernel, x, y, z, args, out, workspace):
+    # evaluate a kernel chunk by chunk into out
+    x, y, z = np.broadcast_arrays(x, y, z)
+    if out is None:
+        out = np.empty((3,) + x.shape)
+    if workspace is None:
+        workspace = Workspace()
+
+    if x.size == 0:
+        return out
+    x, y, z = x.reshape(-1), y.reshape(-1), z.reshape(-1)
+    out_flat = [component.reshape(-1) for component in out]
+    for component, target in zip(out_flat, out):
+        if not np.shares_memory(component, target):
+            raise ValueError("out must be contiguous.")
+
+    chunk_size = workspace.chunk_size
+    for start in range(0, len(x), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        kernel(
+            x[chunk],
+            y[chunk],
+            z[chunk],
+            *args,
+            [component[chunk] for component in out_flat],
+            workspace,
+        )
+    return out
+
+
+def evaluate_magnetic_field_batch(
+    x, y, z, magnetic_parameters, out=None, workspace=None
+):
+    """
+    Evaluate the magnetic field H for a batch of points.
+
+    Equivalent to evaluate_magnetic_field, but the points are processed in
+    chunks and all intermediate arrays live in a reusable Workspace, so peak
+    memory is bounded by the workspace and repeated calls do not allocate.
+    The components are written into out, an array of shape (3,) + shape of the
+    points (any floating point type), which is allocated if not given.
+    """
+    return _evaluate_batch(
+        _field_kernel, x, y, z, (magnetic_parameters,), out, workspace
+    )
+
+
+def evaluate_magnetic_force_batch(
+    x, y, z, magnetic_parameters, magnetic_volume=None, out=None, workspace=None
+):
+    """
+    Evaluate the magnetic force for a batch of points.
+
+    Equivalent to evaluate_magnetic_force with the memory behaviour of
+    evaluate_magnetic_field_batch.
+    """
+    return _evaluate_batch(
+        _force_kernel,
+        x,
+        y,
+        z,
+        (magnetic_parameters, magnetic_volume),
+        out,
+        workspace,
+    )
@@ -0,0 +1,370 @@
+import argparse
+import functools
+import json
+import multiprocessing
+import platform
+import sys
+import time
+
+import numpy as np
+import scipy
+
+from magnetism.batch_evaluation import (
+    Workspace,
+    evaluate_magnetic_field_batch,
+    evaluate_magnetic_force_batch,
+)
+from magnetism.coordinate_transformation import (
+    transform_coordinates_forward,
+    transform_vector_backward,
+)
+from magnetism.elliptic_integrals import EllipticE, EllipticK, EllipticPi
+from magnetism.field_map import QUANTITIES
+from magnetism.magnetic_field import evaluate_magnetic_field
+from magnetism.magnetic_force import evaluate_magnetic_force
+from magnetism.mesh_evaluation import _evaluate_nodes
+from magnetism.thread_pool import ThreadPoolEvaluator
+
+# magnet of the benchmarks in the base units of the tests (mm, A/mm)
+BENCHMARK_PARAMETERS = {
+    "radius_magnet": 2.5,
+    "length": 5.0,
+    "x_position": 0.0,
+    "y_position": 0.0,
+    "z_position": 0.0,
+    "magnetic_permeability": 1.25663706212,
+    "magnetization": 1e3,
+    "dynamic_viscosity_fluid": 0.001,
+    "radius_particle": 100e-6,
+    "rotation_x": 0,
+    "rotation_y": 0,
+    "magnetisation_model": "constant",
+}
+
+ROTATIONS = {
+    "aligned": (0, 0),
+    "rotated": (40, -25),
+}
+
+POINT_MIXES = ["near_axis", "near_edge", "far_field", "uniform"]
+
+DEFAULT_SIZES = [1, 100, 10_000, 100_000]
+
+# the vectorised reference kernels hold dozens of full-size temporaries,
+# larger batches are only run through the batch kernels
+REFERENCE_MAX_SIZE = 1_000_000
+
+
+def generate_points(mix, n, magnetic_parameters, rng):
+    """
+    Generate n benchmark points of a given mix around the magnet.
+
+    The mixes are "near_axis" (within 5 % of the radius from the axis),
+    "near_edge" (within 5 % of the rim of an end face), "far_field" (5 to 50
+    radii away) and "uniform" (in a box reaching two magnet lengths from the centre). The
+    points are generated in the frame of the magnet and returned in the lab
+    frame.
+    """
+    R = magnetic_parameters["radius_magnet"]
+    half_length = 0.5 * magnetic_parameters["length"]
+    phi = rng.uniform(-np.pi, np.pi, n)
+
+    if mix == "near_axis":
+        rho = rng.uniform(0, 0.05 * R, n)
+        z = rng.uniform(-2 * half_length, 2 * half_length, n)
+    elif mix == "near_edge":
+        rho = R * (1 + rng.uniform(-0.05, 0.05, n))
+        z = (
+            np.sign(rng.uniform(-1, 1, n))
+            * half_length
+            * (1 + rng.uniform(-0.05, 0.05, n))
+        )
+    elif mix == "far_field":
+        distance = R * rng.uniform(5, 50, n)
+        theta = np.arccos(rng.uniform(-1, 1, n))
+        rho = distance * np.sin(theta)
+        z = distance * np.cos(theta)
+    elif mix == "uniform":
+        xi, eta, z = rng.uniform(-4 * half_length, 4 * half_length, (3, n))
+        rho, phi = np.hypot(xi, eta), np.arctan2(eta, xi)
+    else:
+        raise ValueError("Invalid point mix.")
+
+    x, y, z = transform_vector_backward(rho, z, phi, magnetic_parameters)
+    return (
+        x + magnetic_parameters["x_position"],
+        y + magnetic_parameters["y_position"],
+        z + magnetic_parameters["z_position"],
+    )
+
+
+def get_benchmark_targets(magnetic_parameters):
+    """Return the benchmarked functions of the points x, y, z by name."""
+    workspace = Workspace()
+
+    def elliptic_integrals(x, y, z):
+        # parameters in (0, 1) like those of the force kernel
+        rho, _, z = transform_coordinates_forward(x, y, z, magnetic_parameters)
+        m = 4 * rho / ((1 + rho) ** 2 + z**2)
+        return EllipticK(m), EllipticE(m), EllipticPi(0.5 * m, m)
+
+    return {
+        "field": lambda x, y, z: evaluate_magnetic_field(x, y, z, magnetic_parameters),
+        "force": lambda x, y, z: evaluate_magnetic_force(x, y, z, magnetic_parameters),
+        "field_batch": lambda x, y, z: evaluate_magnetic_field_batch(
+            x, y, z, magnetic_parameters, workspace=workspace
+        ),
+        "force_batch": lambda x, y, z: evaluate_magnetic_force_batch(
+            x, y, z, magnetic_parameters, workspace=workspace
+        ),
+        "elliptic_integrals": elliptic_integrals,
+        "coordinate_transformation": lambda x, y, z: transform_coordinates_forward(
+            x, y, z, magnetic_parameters
+        ),
+    }
+
+
+def measure_throughput(function, points, min_time=0.2, repeats=3):
+    """
+    Measure the throughput of function(*points) in points per second.
+
+    The function is called in loops lasting at least min_time seconds and
+    the best of repeats loops is reported.
+    """
+    n = len(points[0])
+    function(*points)
+
+    best = np.inf
+    for _ in range(repeats):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            function(*points)
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = min(best, elapsed / calls)
+
+    return n / best
+
+
+def run_benchmarks(
+    sizes=DEFAULT_SIZES,
+    targets=None,
+    mixes=POINT_MIXES,
+    rotations=tuple(ROTATIONS),
+    min_time=0.2,
+    seed=0,
+):
+    """
+    Run the benchmarks and return the throughput in points per second.
+
+    Results are keyed by "target/mix/rotation/size". Reference kernels are
+    skipped for batches larger than REFERENCE_MAX_SIZE.
+    """
+    rng = np.random.default_rng(seed)
+    results = {}
+    for rotation in rotations:
+        magnetic_parameters = dict(BENCHMARK_PARAMETERS)
+        magnetic_parameters["rotation_x"], magnetic_parameters["rotation_y"] = (
+            ROTATIONS[rotation]
+        )
+        functions = get_benchmark_targets(magnetic_parameters)
+        for mix in mixes:
+            for size in sizes:
+                points = generate_points(mix, size, magnetic_parameters, rng)
+                for target in targets or functions:
+                    if size > REFERENCE_MAX_SIZE and not target.endswith("_batch"):
+                        continue
+                    results[f"{target}/{mix}/{rotation}/{size}"] = measure_throughput(
+                        functions[target], points, min_time
+                    )
+    return results
+
+
+def _evaluate_threads(pool, quantity, x, y, z):
+    return pool.evaluate(quantity, x, y, z, BENCHMARK_PARAMETERS)
+
+
+def _evaluate_processes(pool, tasks, x, y, z):
+    # the tasks hold the same points as x, y, z
+    return np.concatenate(pool.map(_evaluate_nodes, tasks))
+
+
+def measure_parallel_efficiency(
+    workers=(1, 2, 4),
+    quantities=("field", "force"),
+    size=1_000_000,
+    backends=("threads", "processes"),
+    chunk_size=65536,
+    min_time=0.2,
+    seed=0,
+):
+    """
+    Measure the parallel efficiency of the thread and process backends.
+
+    Both evaluate size uniform points in chunks of chunk_size points:
+    "threads" with a ThreadPoolEvaluator and "processes" with a process pool
+    that receives the chunks pickled, as magnetism-evaluate-mesh does. The
+    speedup is relative to the serial batch kernel and the efficiency is
+    the speedup per worker. The time to start a pool is reported separately
+    and not included in the throughput.
+
+    Returns a dictionary keyed by "backend/quantity/workers" with the
+    "throughput" in points/s, the "speedup", the "efficiency" and the
+    "startup" time in s.
+    """
+    rng = np.random.default_rng(seed)
+    points = generate_points("uniform", size, BENCHMARK_PARAMETERS, rng)
+    nodes = np.stack(points, axis=1)
+    results = {}
+    for quantity in quantities:
+        workspace = Workspace(chunk_size)
+        serial = measure_throughput(
+            lambda x, y, z: QUANTITIES[quantity](
+                x, y, z, BENCHMARK_PARAMETERS, workspace=workspace
+            ),
+            points,
+            min_time,
+        )
+        tasks = [
+            (nodes[start : start + chunk_size], BENCHMARK_PARAMETERS, (quantity,))
+            for start in range(0, size, chunk_size)
+        ]
+        for backend in backends:
+            for n_workers in workers:
+                start = time.perf_counter()
+                if backend == "threads":
+                    pool = ThreadPoolEvaluator(n_workers, chunk_size)
+                    function = functools.partial(_evaluate_threads, pool, quantity)
+                elif backend == "processes":
+                    pool = multiprocessing.Pool(n_workers)
+                    function = functools.partial(_evaluate_processes, pool, tasks)
+                else:
+                    raise ValueError("Invalid parallel backend.")
+                startup = time.perf_counter() - start
+                try:
+                    throughput = measure_throughput(function, points, min_time)
+                finally:
+                    # stop the workers of this configuration before the next;
+                    # closing the thread pool shuts its executor down
+                    pool.close()
+                    if backend == "processes":
+                        pool.join()
+                results[f"{backend}/{quantity}/{n_workers}"] = {
+                    "throughput": throughput,
+                    "speedup": throughput / serial,
+                    "efficiency": throughput / serial / n_workers,
+                    "startup": startup,
+                }
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=0.2):
+    """
+    Compare benchmark results to a baseline.
+
+    Returns a list of (key, baseline, current) for every benchmark whose
+    throughput dropped by more than the fraction threshold. Benchmarks
+    missing from either side are ignored.
+    """
+    regressions = []
+    for key, reference in baseline.items():
+        current = results.get(key)
+        if current is not None and current < (1 - threshold) * reference:
+            regressions.append((key, reference, current))
+    return regressions
+
+
+def main(argv=None):
+    """Run the throughput benchmarks and gate them against a baseline."""
+    parser = argparse.ArgumentParser(
+        description="Measure the throughput of the magnetism kernels in points/s."
+    )
+    parser.add_argument("--output", help="write the results as JSON baseline")
+    parser.add_argument("--baseline", help="JSON baseline to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="tolerated relative drop in throughput (default: 0.2)",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="batch sizes, up to 10000000 (default: %(default)s)",
+    )
+    parser.add_argument("--targets", nargs="+", help="subset of kernels to run")
+    parser.add_argument("--mixes", nargs="+", default=POINT_MIXES)
+    parser.add_argument("--rotations", nargs="+", default=list(ROTATIONS))
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        nargs="+",
+        metavar="WORKERS",
+        help="instead, report the parallel efficiency of threads and processes "
+        "with these numbers of workers",
+    )
+    parser.add_argument("--parallel-size", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=65536)
+    args = parser.parse_args(argv)
+
+    if args.parallel:
+        efficiency = measure_parallel_efficiency(
+            args.parallel,
+            size=args.parallel_size,
+            chunk_size=args.chunk_size,
+            min_time=args.min_time,
+        )
+        for key, result in efficiency.items():
+            print(
+                f"{key:<24} {result['throughput']:14.0f} points/s "
+                f"speedup {result['speedup']:5.2f} "
+                f"efficiency {result['efficiency']:6.1%} "
+                f"startup {1e3 * result['startup']:7.1f} ms"
+            )
+        return 0
+
+    results = run_benchmarks(
+        args.sizes, args.targets, args.mixes, args.rotations, args.min_time
+    )
+    for key, throughput in results.items():
+        print(f"{key:<60} {throughput:14.0f} points/s")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(
+                {
+                    "metadata": {
+                        "python": sys.version.split()[0],
+                        "numpy": np.__version__,
+                        "scipy": scipy.__version__,
+                        "machine": platform.machine(),
+                        "processor": platform.processor(),
+                    },
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        for key, reference, current in regressions:
+            print(
+                f"REGRESSION {key}: {current:.0f} points/s, "
+                f"baseline {reference:.0f} points/s ({current / reference - 1:+.0%})"
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+import numpy as np
+
+from magnetism.batch_evaluation import Workspace
+from magnetism.concentration_transport import get_drag_coefficient
+from magnetism.coordinate_transformation import is_inside_magnet
+from magnetism.field_map import QUANTITIES, get_grid_axes
+
+# scalars as (kernel, reduction of the (3, n) kernel values at the points)
+SCALARS = {
+    "force_magnitude": (
+        "force",
+        lambda values, points, p: np.linalg.norm(values, axis=0),
+    ),
+    "field_magnitude": (
+        "field",
+        lambda values, points, p: np.linalg.norm(values, axis=0),
+    ),
+    "radial_velocity": (
+        "force",
+        lambda values, points, p: _get_radial_velocity(values, points, p),
+    ),
+}
+
+# tetrahedra of a grid cell with the corners numbered by their x, y and z
+# offsets as bits; all share the diagonal from corner 0 to corner 7, so the
+# tetrahedra of neighbouring cells meet face to face
+CELL_TETRAHEDRA = np.array(
+    [[0, 1, 3, 7], [0, 1, 5, 7], [0, 2, 3, 7], [0, 2, 6, 7], [0, 4, 5, 7], [0, 4, 6, 7]]
+)
+
+
+def _get_radial_velocity(force, points, magnetic_parameters):
+    # drift velocity towards the centre of the magnet
+    centre = np.array([[magnetic_parameters[f"{axis}_position"]] for axis in "xyz"])
+    towards = centre - points
+    towards /= np.linalg.norm(towards, axis=0)
+    return np.sum(force * towards, axis=0) / get_drag_coefficient(magnetic_parameters)
+
+
+def _get_evaluator(magnetic_parameters, scalar, level):
+    # scalar minus level at points (3, n); the magnet belongs to the zone
+    kernel, reduce = SCALARS[scalar]
+    workspace = Workspace()
+    n_evaluations = [0]
+
+    def evaluate(points):
+        n_evaluations[0] += points.shape[1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = QUANTITIES[kernel](
+                *points, magnetic_parameters, workspace=workspace
+            )
+            values = reduce(values, points, magnetic_parameters) - level
+        inside = is_inside_magnet(*points, magnetic_parameters)
+        return np.where(inside | np.isnan(values), np.inf, values)
+
+    return evaluate, n_evaluations
+
+
+def _refine_crossings(start, end, f_start, f_end, evaluate, tolerance, max_iterations):
+    # Illinois regula falsi on the segments from start to end (3, n), all
+    # segments advance together with one kernel call per iteration; steps
+    # next to an infinite value (inside the magnet) are bisections
+    length = np.linalg.norm(end - start, axis=0)
+    t_low, t_high = np.zeros(len(length)), np.ones(len(length))
+    f_low, f_high = f_start.copy(), f_end.copy()
+    side = np.zeros(len(length), dtype=np.int8)
+    for _ in range(max_iterations):
+        active = np.nonzero((t_high - t_low) * length > tolerance)[0]
+        if not len(active):
+            break
+        low, high = f_low[active], f_high[active]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = (t_low[active] * high - t_high[active] * low) / (high - low)
+        bisect = ~np.isfinite(t) | ~np.isfinite(low) | ~np.isfinite(high)
+        t = np.where(bisect, 0.5 * (t_low[active] + t_high[active]), t)
+        points = start[:, active] + t * (end[:, active] - start[:, active])
+        f = evaluate(points)
+
+        # replace the end with the same sign, halve the value at the other
+        # end if the same end was replaced before
+        is_low = (f >= 0) == (low >= 0)
+        replaced_low, replaced_high = active[is_low], active[~is_low]
+        t_low[replaced_low], f_low[replaced_low] = t[is_low], f[is_low]
+        t_high[replaced_high], f_high[replaced_high] = t[~is_low], f[~is_low]
+        f_high[replaced_low[side[replaced_low] == -1]] *= 0.5
+        f_low[replaced_high[side[replaced_high] == 1]] *= 0.5
+        side[replaced_low], side[replaced_high] = -1, 1
+
+        # a root hit exactly closes the bracket
+        hit = active[f == 0]
+        t_low[hit] = t_high[hit] = np.where(f_low[hit] == 0, t_low[hit], t_high[hit])
+
+    t = 0.5 * (t_low + t_high)
+    return start + t * (end - start)
+
+
+def _get_crossings(edges, points, values, evaluate, tolerance, max_iterations):
+    # unique grid edges (e, 2) with a sign change and their refined crossings
+    keys, index = np.unique(edges, axis=0, return_inverse=True)
+    crossings = _refine_crossings(
+        points[:, keys[:, 0]],
+        points[:, keys[:, 1]],
+        values[keys[:, 0]],
+        values[keys[:, 1]],
+        evaluate,
+        tolerance,
+        max_iterations,
+    )
+    return crossings.T, index.reshape(-1)
+
+
+def _join_segments(segments, n_vertices):
+    # join segments (s, 2) of vertex indices into open and closed polylines
+    neighbours = [[] for _ in range(n_vertices)]
+    for a, b in segments:
+        neighbours[a].append(b)
+        neighbours[b].append(a)
+    visited = np.zeros(n_vertices, dtype=bool)
+    lines = []
+    # open lines start at vertices with one neighbour, closed ones anywhere
+    starts = [v for v in range(n_vertices) if len(neighbours[v]) == 1]
+    starts += list(range(n_vertices))
+    for start in starts:
+        if visited[start] or not neighbours[start]:
+            continue
+        line = [start]
+        visited[start] = True
+        previous, current = None, start
+        while True:
+            following = [v for v in neighbours[current] if v != previous]
+            if not following or (following[0] == start and len(line) > 2):
+                if following:
+                    line.append(start)
+                break
+            if visited[following[0]]:
+                break
+            previous, current = current, following[0]
+            visited[current] = True
+            line.append(current)
+        lines.append(line)
+    return lines
+
+
+def find_iso_contours(
+    grid,
+    magnetic_parameters,
+    level,
+    scalar="force_magnitude",
+    tolerance=None,
+    max_iterations=60,
+):
+    """
+    Find the contours where a scalar equals a level in a planar slice.
+
+    The slice is a grid as for field_map.get_grid_axes with a single node
+    along one axis. The scalar (one of SCALARS: "force_magnitude",
+    "field_magnitude" or "radial_velocity", the drift velocity towards the
+    centre of the magnet) is evaluated at the nodes of the coarse grid,
+    the magnet counts as above every level. The contours are bracketed by
+    marching squares (saddles are resolved with the mean of the corners)
+    and their crossings of the grid edges are refined together with
+    Illinois regula falsi steps on the exact kernels until they are known
+    to tolerance (default 1e-6 magnet radii). The grid only has to resolve
+    the shape of the contours, not their position.
+
+    Returns a dictionary with the "lines", a list of arrays of shape
+    (m, 3) (closed lines end with their first point), and the number of
+    kernel "evaluations".
+    """
+    axes = get_grid_axes(grid)
+    plane = [d for d in range(3) if len(axes[d]) > 1]
+    if len(plane) != 2:
+        raise ValueError("The grid must be a planar slice.")
+    tolerance = (
+        1e-6 * magnetic_parameters["radius_magnet"] if tolerance is None else tolerance
+    )
+    evaluate, n_evaluations = _get_evaluator(magnetic_parameters, scalar, level)
+
+    shape = tuple(len(axis) for axis in axes)
+    points = np.stack([c.ravel() for c in np.meshgrid(*axes, indexing="ij")])
+    values = evaluate(points)
+    above = values >= 0
+    index = np.arange(points.shape[1]).reshape([shape[d] for d in plane])
+
+    # corners of the cells counter-clockwise and the edges between them
+    corners = np.stack(
+        [
+            index[:-1, :-1].ravel(),
+            index[1:, :-1].ravel(),
+            index[1:, 1:].ravel(),
+            index[:-1, 1:].ravel(),
+        ],
+        axis=1,
+    )
+    cell_edges = np.stack([corners, np.roll(corners, -1, axis=1)], axis=2)
+    crossed = above[cell_edges[..., 0]] != above[cell_edges[..., 1]]
+    n_crossed = crossed.sum(axis=1)
+
+    # two crossed edges give one segment, four (a saddle) give two that cut
+    # off the corners whose sign differs from the centre
+    segments = []
+    cells = np.nonzero(n_crossed == 2)[0]
+    local = np.nonzero(crossed[cells])[1].reshape(-1, 2)
+    segments.append(cell_edges[cells[:, None], local])
+    saddles = np.nonzero(n_crossed == 4)[0]
+    with np.errstate(invalid="ignore"):
+        centre_above = np.mean(values[corners[saddles]], axis=1) >= 0
+    first_cut = np.where(centre_above == above[corners[saddles, 0]], 1, 0)
+    for offset in (0, 2):
+        cut = (first_cut + offset) % 4
+        local = np.stack([(cut + 3) % 4, cut], axis=1)
+        segments.append(cell_edges[saddles[:, None], local])
+    segments = np.concatenate(segments)
+    if not len(segments):
+        return {"lines": [], "evaluations": n_evaluations[0]}
+
+    edges = np.sort(segments.reshape(-1, 2), axis=1)
+    vertices, vertex_index = _get_crossings(
+        edges, points, values, evaluate, tolerance, max_iterations
+    )
+    lines = _join_segments(vertex_index.reshape(-1, 2), len(vertices))
+    return {
+        "lines": [vertices[line] for line in lines],
+        "evaluations": n_evaluations[0],
+    }
+
+
+def find_iso_surface(
+    grid,
+    magnetic_parameters,
+    level,
+    scalar="force_magnitude",
+    tolerance=None,
+    max_iterations=60,
+):
+    """
+    Find the surface where a scalar equals a level in a box.
+
+    The box is a grid as for field_map.get_grid_axes with at least two
+    nodes along every axis. The surface is bracketed by marching tetrahedra
+    (six per grid cell) on the coarse grid and its crossings of the edges
+    are refined as in find_iso_contours.
+
+    Returns a dictionary with the "vertices" (n, 3), the triangular "faces"
+    (m, 3) as vertex indices, oriented with their normals pointing out of
+    the zone above the level, and the number of kernel "evaluations".
+    """
+    axes = get_grid_axes(grid)
+    shape = tuple(len(axis) for axis in axes)
+    if min(shape) < 2:
+        raise ValueError("The grid must have at least two nodes along every axis.")
+    tolerance = (
+        1e-6 * magnetic_parameters["radius_magnet"] if tolerance is None else tolerance
+    )
+    evaluate, n_evaluations = _get_evaluator(magnetic_parameters, scalar, level)
+
+    points = np.stack([c.ravel() for c in np.meshgrid(*axes, indexing="ij")])
+    values = evaluate(points)
+    above = values >= 0
+    index = np.arange(points.shape[1]).reshape(shape)
+    corners = np.stack(
+        [
+            index[
+                (corner & 1) : shape[0] - 1 + (corner & 1),
+                (corner >> 1 & 1) : shape[1] - 1 + (corner >> 1 & 1),
+                (corner >> 2 & 1) : shape[2] - 1 + (corner >> 2 & 1),
+            ].ravel()
+            for corner in range(8)
+        ],
+        axis=1,
+    )
+    tetrahedra = corners[:, CELL_TETRAHEDRA].reshape(-1, 4)
+    tetrahedra_above = above[tetrahedra]
+    n_above = tetrahedra_above.sum(axis=1)
+
+    # one corner apart from the others: one triangle around it
+    others = np.array([[1, 2, 3], [0, 2, 3], [0, 1, 3], [0, 1, 2]])
+    single = np.nonzero((n_above == 1) | (n_above == 3))[0]
+    odd = np.argmax(tetrahedra_above[single] == (n_above[single, None] == 1), axis=1)
+    apex = tetrahedra[single, odd]
+    base = np.take_along_axis(tetrahedra[single], others[odd], axis=1)
+    triangle_edges = [np.stack([np.stack([apex, b], axis=1) for b in base.T], axis=1)]
+
+    # two corners above and two below: a quadrilateral of two triangles
+    pairs = np.nonzero(n_above == 2)[0]
+    order = np.argsort(~tetrahedra_above[pairs], axis=1, kind="stable")
+    a_1, a_2, b_1, b_2 = np.take_along_axis(tetrahedra[pairs], order, axis=1).T
+    quad = [(a_1, b_1), (a_1, b_2), (a_2, b_2), (a_2, b_1)]
+    for i, j, k in [(0, 1, 2), (0, 2, 3)]:
+        triangle_edges.append(
+            np.stack([np.stack(quad[m], axis=1) for m in (i, j, k)], axis=1)
+        )
+    triangle_edges = np.concatenate(triangle_edges)
+    if not len(triangle_edges):
+        return {
+            "vertices": np.empty((0, 3)),
+            "faces": np.empty((0, 3), dtype=np.int64),
+            "evaluations": n_evaluations[0],
+        }
+
+    edges = np.sort(triangle_edges.reshape(-1, 2), axis=1)
+    vertices, vertex_index = _get_crossings(
+        edges, points, values, evaluate, tolerance, max_iterations
+    )
+    faces = vertex_index.reshape(-1, 3)
+
+    # orient the normals from the nodes above the level to those below
+    ends = points[:, triangle_edges].transpose(1, 2, 3, 0)
+    ends_above = above[triangle_edges]
+    outwards = np.where(ends_above[..., None], -1.0, 1.0) * ends
+    outwards = outwards.sum(axis=(1, 2))
+    normal = np.cross(
+        vertices[faces[:, 1]] - vertices[faces[:, 0]],
+        vertices[faces[:, 2]] - vertices[faces[:, 0]],
+    )
+    flip = np.sum(normal * outwards, axis=1) < 0
+    faces[flip] = faces[flip][:, ::-1]
+    return {"vertices": vertices, "faces": faces, "evaluations": n_evaluations[0]}
+
+
+def write_surface_vtk(path, vertices, faces):
+    """Write a triangle mesh as a legacy ASCII VTK file, e.g. for ParaView."""
+    with open(path, "w") as file:
+        file.write("# vtk DataFile Version 3.0\nmagnetism surface\nASCII\n")
+        file.write(f"DATASET POLYDATA\nPOINTS {len(vertices)} double\n")
+        np.savetxt(file, vertices, fmt="%.17g")
+        file.write(f"POLYGONS {len(faces)} {4 * len(faces)}\n")
+        np.savetxt(file, np.column_stack([np.full(len(faces), 3), faces]), fmt="%d")
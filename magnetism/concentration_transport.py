@@ -0,0 +1,347 @@
+import inspect
+
+import numpy as np
+import scipy.sparse as sparse
+import scipy.sparse.linalg as sparse_linalg
+
+from magnetism.batch_evaluation import Workspace
+from magnetism.coordinate_transformation import is_inside_magnet
+from magnetism.field_map import QUANTITIES, get_grid_axes
+
+BOLTZMANN_CONSTANT = 1.380649e-14  # g mm^2 / (s^2 K)
+
+FACES = ("x_min", "x_max", "y_min", "y_max", "z_min", "z_max")
+
+SOLVERS = {"bicgstab": sparse_linalg.bicgstab, "gmres": sparse_linalg.gmres}
+
+# SciPy < 1.12 names the relative tolerance of the solvers tol
+TOLERANCE_KEYWORD = (
+    "rtol" if "rtol" in inspect.signature(sparse_linalg.bicgstab).parameters else "tol"
+)
+
+
+def get_drag_coefficient(magnetic_parameters):
+    """Return the Stokes drag coefficient 6 pi eta a of a particle."""
+    return (
+        6
+        * np.pi
+        * magnetic_parameters["dynamic_viscosity_fluid"]
+        * magnetic_parameters["radius_particle"]
+    )
+
+
+def get_stokes_einstein_diffusion(
+    magnetic_parameters, temperature=293.15, boltzmann_constant=BOLTZMANN_CONSTANT
+):
+    """Return the Brownian diffusion coefficient k_B T / (6 pi eta a)."""
+    return boltzmann_constant * temperature / get_drag_coefficient(magnetic_parameters)
+
+
+def _bernoulli(x):
+    # B(x) = x / (exp(x) - 1), with B(0) = 1
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        return np.where(np.abs(x) < 1e-10, 1 - 0.5 * x, x / np.expm1(x))
+
+
+def _get_cell_widths(axis):
+    # widths of the control volumes around the nodes, halved at the ends
+    if len(axis) == 1:
+        return np.ones(1)
+    h = axis[1] - axis[0]
+    widths = np.full(len(axis), h)
+    widths[[0, -1]] = 0.5 * h
+    return widths
+
+
+def assemble_transport(
+    grid,
+    magnetic_parameters,
+    diffusion_coefficient=None,
+    flow_velocity=None,
+    workspace=None,
+):
+    """
+    Assemble the advection-diffusion operator of the particle concentration.
+
+    The grid is given as for field_map.get_grid_axes; an axis with a single
+    node is not resolved, which gives a 2D problem per unit depth. The
+    magnetic force is evaluated once at all nodes with the batch kernels and
+    divided by the Stokes drag to give the drift velocity, to which an
+    optional flow_velocity (shape (3,) or (3, nx, ny, nz)) is added. The
+    diffusion coefficient defaults to Stokes-Einstein at room temperature.
+
+    Each node has a control volume; the flux through the face between two
+    neighbours is the Scharfetter-Gummel flux with the mean velocity of the
+    nodes, which is exact for constant drift and stays stable at large cell
+    Peclet numbers. Nodes inside the magnet, and on its edges where the
+    force is singular, have no drift and do not contribute to the face
+    velocities.
+
+    Returns a dictionary with the "axes", the nodes "inside" the magnet, the
+    node "velocity" (3, nx, ny, nz), the "volumes" of the control volumes,
+    the "diffusion_coefficient" and the sparse "operator" K of the net
+    inflow into each control volume, i.e. volumes * dc/dt = K c for the
+    flattened concentration c.
+    """
+    if diffusion_coefficient is None:
+        diffusion_coefficient = get_stokes_einstein_diffusion(magnetic_parameters)
+    axes = get_grid_axes(grid)
+    shape = tuple(len(axis) for axis in axes)
+    n = int(np.prod(shape))
+
+    points = [coordinate.ravel() for coordinate in np.meshgrid(*axes, indexing="ij")]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        force = QUANTITIES["force"](
+            *points, magnetic_parameters, workspace=workspace or Workspace()
+        )
+    # nodes on the edges of the magnet, where the force is singular, are
+    # treated as part of the magnet
+    inside = is_inside_magnet(*points, magnetic_parameters)
+    inside |= ~np.all(np.isfinite(force), axis=0)
+    velocity = force / get_drag_coefficient(magnetic_parameters)
+    velocity[:, inside] = 0
+    if flow_velocity is not None:
+        velocity += np.asarray(flow_velocity, dtype=np.float64).reshape(3, -1)
+
+    widths = [_get_cell_widths(axis) for axis in axes]
+    volumes = np.einsum("i,j,k->ijk", *widths).ravel()
+    outside = (~inside).astype(np.float64)
+    index = np.arange(n).reshape(shape)
+    rows, columns, values = [], [], []
+    for d in range(3):
+        if shape[d] == 1:
+            continue
+        h = axes[d][1] - axes[d][0]
+        i = np.take(index, np.arange(shape[d] - 1), axis=d).ravel()
+        j = np.take(index, np.arange(1, shape[d]), axis=d).ravel()
+
+        # face velocity from the nodes outside the magnet
+        weight = outside[i] + outside[j]
+        with np.errstate(invalid="ignore"):
+            v = (outside[i] * velocity[d, i] + outside[j] * velocity[d, j]) / weight
+        v = np.where(weight > 0, v, 0.0)
+
+        # area of the face between the control volumes of i and j
+        area = np.ones(len(i))
+        for other in range(3):
+            if other != d:
+                area *= widths[other][np.unravel_index(i, shape)[other]]
+
+        # flux from i to j: D / h (B(-Pe) c_i - B(Pe) c_j)
+        peclet = v * h / diffusion_coefficient
+        a = area * diffusion_coefficient / h * _bernoulli(-peclet)
+        b = area * diffusion_coefficient / h * _bernoulli(peclet)
+        rows.extend([i, i, j, j])
+        columns.extend([i, j, i, j])
+        values.extend([-a, b, a, -b])
+
+    operator = sparse.csr_matrix(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+        shape=(n, n),
+    )
+    return {
+        "axes": axes,
+        "inside": inside.reshape(shape),
+        "velocity": velocity.reshape((3,) + shape),
+        "volumes": volumes,
+        "diffusion_coefficient": diffusion_coefficient,
+        "operator": operator,
+    }
+
+
+def _get_fixed_values(transport, boundary, absorbing_magnet):
+    # concentration of the fixed nodes (NaN for unknowns)
+    shape = transport["inside"].shape
+    fixed = np.full(shape, np.nan)
+    boundary = dict.fromkeys(FACES, 1.0) if boundary is None else boundary
+    for face, value in boundary.items():
+        if face not in FACES:
+            raise ValueError(f"Invalid boundary face {face}, expected one of {FACES}.")
+        d = "xyz".index(face[0])
+        if value is None or shape[d] == 1:
+            continue
+        index = [slice(None)] * 3
+        index[d] = 0 if face.endswith("min") else -1
+        fixed[tuple(index)] = value
+    if absorbing_magnet:
+        fixed[transport["inside"]] = 0.0
+    return fixed.ravel()
+
+
+def _solve(matrix, rhs, x0, preconditioner, solver, tolerance, max_iterations):
+    iterations = 0
+
+    def count(_):
+        nonlocal iterations
+        iterations += 1
+
+    options = {"x0": x0, "atol": 0.0, "maxiter": max_iterations, "M": preconditioner}
+    options["callback"] = count
+    if solver == "gmres":
+        options["callback_type"] = "pr_norm"
+    options[TOLERANCE_KEYWORD] = tolerance
+    x, info = SOLVERS[solver](matrix, rhs, **options)
+    return x, iterations, info == 0
+
+
+def _get_preconditioner(matrix, preconditioner, drop_tolerance):
+    if preconditioner is None:
+        return None
+    if preconditioner == "jacobi":
+        inverse_diagonal = 1 / matrix.diagonal()
+        return sparse_linalg.LinearOperator(
+            matrix.shape, lambda x: inverse_diagonal * x
+        )
+    if preconditioner == "ilu":
+        ilu = sparse_linalg.spilu(
+            matrix.tocsc(), drop_tol=drop_tolerance, fill_factor=10
+        )
+        return sparse_linalg.LinearOperator(matrix.shape, ilu.solve)
+    raise ValueError("Invalid preconditioner.")
+
+
+def _get_capture_rate(transport, concentration):
+    inflow = transport["operator"] @ concentration
+    return float(inflow[transport["inside"].ravel()].sum())
+
+
+def solve_steady_concentration(
+    transport,
+    boundary=None,
+    absorbing_magnet=True,
+    solver="gmres",
+    preconditioner="jacobi",
+    tolerance=1e-10,
+    max_iterations=1000,
+    drop_tolerance=1e-4,
+):
+    """
+    Solve for the steady particle concentration.
+
+    transport is the result of assemble_transport. boundary maps the faces
+    of the grid ("x_min", "x_max", ..., "z_max") to a fixed concentration
+    or to None for no flux; unlisted faces have no flux and by default all
+    faces are at the concentration 1. With absorbing_magnet, the magnet
+    captures every particle that reaches it (zero concentration inside).
+    The fixed nodes are eliminated and the remaining system is solved with
+    the given Krylov solver ("gmres" or "bicgstab") and preconditioner
+    ("jacobi", "ilu" with the given drop_tolerance, or None). The Jacobi
+    preconditioner is the fastest on large 3D grids, where the incomplete
+    LU factorization takes longer than the iterations it saves; BiCGSTAB
+    can break down on drift-dominated problems.
+
+    Returns a dictionary with the "concentration" (nx, ny, nz), the
+    "capture_rate" of particles per time into the magnet (per unit depth in
+    2D) and the solver "iterations" and whether it "converged".
+    """
+    fixed = _get_fixed_values(transport, boundary, absorbing_magnet)
+    known = ~np.isnan(fixed)
+    if known.all() or not known.any():
+        raise ValueError(
+            "The steady problem needs both unknown and fixed nodes, "
+            "e.g. a boundary with a fixed concentration or an absorbing magnet."
+        )
+    operator = transport["operator"]
+    matrix = operator[~known][:, ~known]
+    rhs = -(operator[~known][:, known] @ fixed[known])
+
+    concentration = fixed.copy()
+    concentration[~known], iterations, converged = _solve(
+        matrix,
+        rhs,
+        None,
+        _get_preconditioner(matrix, preconditioner, drop_tolerance),
+        solver,
+        tolerance,
+        max_iterations,
+    )
+    return {
+        "concentration": concentration.reshape(transport["inside"].shape),
+        "capture_rate": _get_capture_rate(transport, concentration),
+        "iterations": iterations,
+        "converged": converged,
+    }
+
+
+def solve_transient_concentration(
+    transport,
+    times,
+    initial_concentration=0.0,
+    time_step=None,
+    boundary=None,
+    absorbing_magnet=True,
+    solver="gmres",
+    preconditioner="jacobi",
+    tolerance=1e-10,
+    max_iterations=1000,
+    drop_tolerance=1e-4,
+):
+    """
+    Solve for the particle concentration over time.
+
+    The concentration starts from initial_concentration (scalar or array of
+    the grid shape) at time 0 and is integrated with the implicit Euler
+    method up to the increasing output times, with steps of at most
+    time_step (by default a hundredth of the last time). Each step warm
+    starts the Krylov solver from the previous concentration and reuses the
+    preconditioner of the step size. The other arguments are as for
+    solve_steady_concentration.
+
+    Returns a dictionary with the "times", the "concentration" (n_times, nx,
+    ny, nz), the "capture_rate" and the number of particles "captured" by
+    the magnet since time 0 at the output times, the total solver
+    "iterations" and whether all steps "converged".
+    """
+    times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+    if np.any(np.diff(times) <= 0) or times[0] < 0:
+        raise ValueError("The output times must be increasing and not negative.")
+    time_step = times[-1] / 100 if time_step is None else time_step
+    shape = transport["inside"].shape
+    fixed = _get_fixed_values(transport, boundary, absorbing_magnet)
+    known = ~np.isnan(fixed)
+    operator = transport["operator"]
+    operator_unknown = operator[~known][:, ~known]
+    source = operator[~known][:, known] @ fixed[known]
+    volumes = sparse.diags(transport["volumes"][~known])
+
+    concentration = np.broadcast_to(initial_concentration, shape).ravel().copy()
+    concentration[known] = fixed[known]
+    result = {
+        "times": times,
+        "concentration": np.empty((len(times),) + shape),
+        "capture_rate": np.empty(len(times)),
+        "captured": np.empty(len(times)),
+        "iterations": 0,
+        "converged": True,
+    }
+    time = 0.0
+    captured = 0.0
+    dt = None
+    for n, output_time in enumerate(times):
+        n_steps = int(np.ceil((output_time - time) / time_step - 1e-9))
+        if n_steps > 0:
+            # equal steps up to the output time, refactorized when dt changes
+            if dt != (output_time - time) / n_steps:
+                dt = (output_time - time) / n_steps
+                matrix = (volumes - dt * operator_unknown).tocsr()
+                inverse = _get_preconditioner(matrix, preconditioner, drop_tolerance)
+            for _ in range(n_steps):
+                unknown = concentration[~known]
+                rhs = volumes @ unknown + dt * source
+                concentration[~known], iterations, converged = _solve(
+                    matrix,
+                    rhs,
+                    unknown,
+                    inverse,
+                    solver,
+                    tolerance,
+                    max_iterations,
+                )
+                result["iterations"] += iterations
+                result["converged"] &= converged
+                captured += dt * _get_capture_rate(transport, concentration)
+        time = output_time
+        result["concentration"][n] = concentration.reshape(shape)
+        result["capture_rate"][n] = _get_capture_rate(transport, concentration)
+        result["captured"][n] = captured
+    return result
@@ -1,16 +1,19 @@
-import matplotlib.path as mpath
 import numpy as np
 
+from magnetism.instrumentation import count_clamps, instrumented, is_enabled
+from magnetism.precision import as_dtype
 
-def transform_coordinates_forward(X, Y, Z, params):
+
+@instrumented("coordinate_transformation.forward")
+def transform_coordinates_forward(X, Y, Z, params, dtype=None):
     # convert rotation angles to radians
-    gamma = params["rotation_x"] * np.pi / 180
-    beta = params["rotation_y"] * np.pi / 180
+    gamma = as_dtype(params["rotation_x"] * np.pi / 180, dtype)
+    beta = as_dtype(params["rotation_y"] * np.pi / 180, dtype)
 
     # translate coordinates
-    x_translated = X - params["x_position"]
-    y_translated = Y - params["y_position"]
-    z_translated = Z - params["z_position"]
+    x_translated = as_dtype(X, dtype) - as_dtype(params["x_position"], dtype)
+    y_translated = as_dtype(Y, dtype) - as_dtype(params["y_position"], dtype)
+    z_translated = as_dtype(Z, dtype) - as_dtype(params["z_position"], dtype)
 
     # rotate coordinates
     xi = (
@@ -30,20 +33,25 @@ def transform_coordinates_forward(X, Y, Z, params):
     phi = np.arctan2(eta, xi)
     z = zeta
 
-    if np.abs(rho) < 1e-9:
-        rho = 1e-9
+    # avoid the singularity on the axis of the magnet
+    if is_enabled():
+        count_clamps("coordinate_transformation.rho", rho < 1e-9)
+    rho = np.maximum(rho, 1e-9)
 
     return rho, phi, z
 
 
-def transform_vector_backward(rho_component, z_component, phi, params):
+@instrumented("coordinate_transformation.backward")
+def transform_vector_backward(
+    rho_component, z_component, phi, params, phi_component=0, dtype=None
+):
     # convert rotation angles to radians
-    gamma = params["rotation_x"] * np.pi / 180
-    beta = params["rotation_y"] * np.pi / 180
+    gamma = as_dtype(params["rotation_x"] * np.pi / 180, dtype)
+    beta = as_dtype(params["rotation_y"] * np.pi / 180, dtype)
 
     # transform to cartesian coordinates
-    xi = rho_component * np.cos(phi)
-    eta = rho_component * np.sin(phi)
+    xi = rho_component * np.cos(phi) - phi_component * np.sin(phi)
+    eta = rho_component * np.sin(phi) + phi_component * np.cos(phi)
     zeta = z_component
 
     # rotate coordinates
@@ -62,6 +70,23 @@ def transform_vector_backward(rho_component, z_component, phi, params):
     return X_component, Y_component, Z_component
 
 
+def get_rotation_matrix(params):
+    """Return the matrix rotating vectors from the magnet frame to the global frame."""
+    gamma = params["rotation_x"] * np.pi / 180
+    beta = params["rotation_y"] * np.pi / 180
+    return np.array(
+        [
+            [np.cos(beta), 0, -np.sin(beta)],
+            [np.sin(beta) * np.sin(gamma), np.cos(gamma), np.sin(gamma) * np.cos(beta)],
+            [
+                np.sin(beta) * np.cos(gamma),
+                -np.sin(gamma),
+                np.cos(beta) * np.cos(gamma),
+            ],
+        ]
+    )
+
+
 def transform_coordinates_backward_magnet_y(xi, eta, zeta, params):
     # convert rotation angles to radians
     gamma = params["rotation_x"] * np.pi / 180
@@ -107,6 +132,9 @@ def transform_coordinates_backward_magnet_x(xi, eta, zeta, params):
 
 
 def get_rectangle_path_xz(magnetic_parameters, radius, length):
+    # matplotlib is only needed for plotting, keep it out of the physics imports
+    import matplotlib.path as mpath
+
     verts = [
         transform_coordinates_backward_magnet_y(
             -radius, 0, -0.5 * length, magnetic_parameters
@@ -139,6 +167,9 @@ def get_rectangle_path_xz(magnetic_parameters, radius, length):
 
 
 def get_rectangle_path_yz(magnetic_parameters, radius, length):
+    # matplotlib is only needed for plotting, keep it out of the physics imports
+    import matplotlib.path as mpath
+
     verts = [
         transform_coordinates_backward_magnet_x(
             0, -radius, -0.5 * length, magnetic_parameters
@@ -168,3 +199,13 @@ def get_rectangle_path_yz(magnetic_parameters, radius, length):
 
     path = Path(verts, codes)
     return path
+
+
+def is_inside_magnet(X, Y, Z, params):
+    """Return whether the points lie inside the cylindrical or ring magnet."""
+    rho, _, z = transform_coordinates_forward(X, Y, Z, params)
+    return (
+        (rho >= params.get("radius_inner", 0.0))
+        & (rho < params["radius_magnet"])
+        & (np.abs(z) < 0.5 * params["length"])
+    )
@@ -1,35 +1,76 @@
+import numpy as np
 from scipy.special import elliprd as CarlsonRD
 from scipy.special import elliprf as CarlsonRF
 from scipy.special import elliprj as CarlsonRJ
 
+from magnetism.instrumentation import count_clamps, instrumented
 
+
+@instrumented("elliptic_integrals.K")
 def EllipticK(m):
     """
     Computes the complete elliptic integral of the first kind.
     """
     # Remove singularity at m = 1
-    if m == 1:
-        m = 1 - 1e-9
+    singular = m == 1
+    count_clamps("elliptic_integrals.m", singular)
+    m = np.where(singular, 1 - 1e-9, m)
     return CarlsonRF(0, 1 - m, 1)
 
 
-def EllipticE(m):
+@instrumented("elliptic_integrals.E")
+def EllipticE(m, K=None):
     """
     Computes the complete elliptic integral of the second kind.
+
+    K, the integral of the first kind at the same m, is reused if given.
     """
     # Remove singularity at m = 1
-    if m == 1:
-        m = 1 - 1e-9
-    return CarlsonRF(0, 1 - m, 1) - (1 / 3) * m * CarlsonRD(0, 1 - m, 1)
+    singular = m == 1
+    count_clamps("elliptic_integrals.m", singular)
+    m = np.where(singular, 1 - 1e-9, m)
+    if K is None:
+        K = CarlsonRF(0, 1 - m, 1)
+    return K - (1 / 3) * m * CarlsonRD(0, 1 - m, 1)
 
 
-def EllipticPi(n, m):
+@instrumented("elliptic_integrals.Pi")
+def EllipticPi(n, m, K=None):
     """
     Computes the complete elliptic integral of the third kind.
+
+    K, the integral of the first kind at the same m, is reused if given.
     """
     # Remove singularity at m = 1 and n = 1
-    if m == 1:
-        m = 1 - 1e-9
-    if n == 1:
-        n = 1 - 1e-9
-    return CarlsonRF(0, 1 - m, 1) + (1 / 3) * n * CarlsonRJ(0, 1 - m, 1, 1 - n)
+    singular = m == 1
+    count_clamps("elliptic_integrals.m", singular)
+    m = np.where(singular, 1 - 1e-9, m)
+    singular = n == 1
+    count_clamps("elliptic_integrals.n", singular)
+    n = np.where(singular, 1 - 1e-9, n)
+    if K is None:
+        K = CarlsonRF(0, 1 - m, 1)
+    return K + (1 / 3) * n * CarlsonRJ(0, 1 - m, 1, 1 - n)
+
+
+@instrumented("elliptic_integrals.carlson")
+def EllipticCarlson(n, m):
+    """
+    Computes the Carlson integrals R_F, R_D and R_J of parameter m and
+    characteristic n.
+
+    K = R_F, E = R_F - m R_D / 3 and Pi = R_F + n R_J / 3, so all three
+    complete elliptic integrals follow from one evaluation of each, with
+    the singularities removed as in EllipticK, EllipticE and EllipticPi.
+    """
+    singular = m == 1
+    count_clamps("elliptic_integrals.m", singular)
+    m = np.where(singular, 1 - 1e-9, m)
+    singular = n == 1
+    count_clamps("elliptic_integrals.n", singular)
+    n = np.where(singular, 1 - 1e-9, n)
+    return (
+        CarlsonRF(0, 1 - m, 1),
+        CarlsonRD(0, 1 - m, 1),
+        CarlsonRJ(0, 1 - m, 1, 1 - n),
+    )
@@ -0,0 +1,153 @@
+import argparse
+import json
+import multiprocessing
+import time
+
+import numpy as np
+
+from magnetism.batch_evaluation import (
+    Workspace,
+    evaluate_magnetic_field_batch,
+    evaluate_magnetic_force_batch,
+)
+
+QUANTITIES = {
+    "field": evaluate_magnetic_field_batch,
+    "force": evaluate_magnetic_force_batch,
+}
+
+# workspace of the current (worker) process, reused for all of its chunks
+_workspace = None
+
+
+def get_grid_axes(grid):
+    """
+    Return the x, y and z axes of a regular grid.
+
+    The grid is given as {"x": [start, stop, num], "y": ..., "z": ...} with
+    the arguments of np.linspace; use num = 1 for planar slices.
+    """
+    return [
+        np.linspace(grid[axis][0], grid[axis][1], int(grid[axis][2])) for axis in "xyz"
+    ]
+
+
+def get_grid_points(axes, start, stop):
+    """Return the coordinates of the flat grid indices start to stop."""
+    shape = tuple(len(axis) for axis in axes)
+    i, j, k = np.unravel_index(np.arange(start, stop), shape)
+    return axes[0][i], axes[1][j], axes[2][k]
+
+
+def _evaluate_chunk(task):
+    global _workspace
+    axes, magnetic_parameters, quantities, start, stop, chunk_size = task
+    if _workspace is None or _workspace.chunk_size != chunk_size:
+        _workspace = Workspace(chunk_size)
+
+    x, y, z = get_grid_points(axes, start, stop)
+    return start, [
+        QUANTITIES[quantity](x, y, z, magnetic_parameters, workspace=_workspace)
+        for quantity in quantities
+    ]
+
+
+def evaluate_grid(
+    axes,
+    magnetic_parameters,
+    quantities=("field", "force"),
+    workers=1,
+    chunk_size=65536,
+):
+    """
+    Evaluate field and/or force on a regular grid.
+
+    The flattened grid is split into chunks of chunk_size points that are
+    evaluated by the given number of worker processes. Returns a dictionary
+    mapping each quantity to an array of shape (3, nx, ny, nz).
+    """
+    shape = tuple(len(axis) for axis in axes)
+    n_points = int(np.prod(shape))
+    results = {quantity: np.empty((3, n_points)) for quantity in quantities}
+
+    tasks = [
+        (
+            axes,
+            magnetic_parameters,
+            quantities,
+            start,
+            min(start + chunk_size, n_points),
+            chunk_size,
+        )
+        for start in range(0, n_points, chunk_size)
+    ]
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            chunks = pool.imap_unordered(_evaluate_chunk, tasks)
+            for start, values in chunks:
+                for quantity, value in zip(quantities, values):
+                    results[quantity][:, start : start + value.shape[1]] = value
+    else:
+        for task in tasks:
+            start, values = _evaluate_chunk(task)
+            for quantity, value in zip(quantities, values):
+                results[quantity][:, start : start + value.shape[1]] = value
+
+    return {
+        quantity: result.reshape((3,) + shape) for quantity, result in results.items()
+    }
+
+
+def main(argv=None):
+    """Generate field and force maps from a JSON configuration file."""
+    parser = argparse.ArgumentParser(
+        description="Evaluate the magnetic field and force of a cylindrical magnet "
+        "on a regular grid.",
+    )
+    parser.add_argument(
+        "config",
+        help='JSON file with "magnetic_parameters" and "grid" '
+        '({"x": [start, stop, num], "y": ..., "z": ...})',
+    )
+    parser.add_argument("output", help="output .npz file")
+    parser.add_argument(
+        "--quantity",
+        choices=sorted(QUANTITIES),
+        action="append",
+        help="quantity to evaluate, may be repeated (default: from the "
+        "configuration or both)",
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=65536)
+    args = parser.parse_args(argv)
+
+    with open(args.config) as file:
+        config = json.load(file)
+    magnetic_parameters = config["magnetic_parameters"]
+    quantities = args.quantity or config.get("quantities", ["field", "force"])
+    axes = get_grid_axes(config["grid"])
+
+    start = time.perf_counter()
+    results = evaluate_grid(
+        axes, magnetic_parameters, quantities, args.workers, args.chunk_size
+    )
+    elapsed = time.perf_counter() - start
+
+    np.savez(
+        args.output,
+        x=axes[0],
+        y=axes[1],
+        z=axes[2],
+        magnetic_parameters=json.dumps(magnetic_parameters),
+        **results,
+    )
+
+    n_points = int(np.prod([len(axis) for axis in axes]))
+    print(
+        f"Evaluated {', '.join(quantities)} at {n_points} points in {elapsed:.3f} s "
+        f"with {args.workers} worker(s): {n_points / elapsed:.0f} points/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
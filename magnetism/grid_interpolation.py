@@ -0,0 +1,221 @@
+import json
+
+import numpy as np
+
+from magnetism.coordinate_transformation import (
+    is_inside_magnet,
+    transform_coordinates_forward,
+)
+from magnetism.field_map import QUANTITIES
+from magnetism.ring_magnet import (
+    evaluate_ring_magnetic_field,
+    evaluate_ring_magnetic_force,
+)
+
+RING_QUANTITIES = {
+    "field": evaluate_ring_magnetic_field,
+    "force": evaluate_ring_magnetic_force,
+}
+
+
+def _evaluate_exact(quantity, coordinates, magnetic_parameters):
+    # the batch kernels of solid magnets, the ring kernels of ring magnets
+    if magnetic_parameters.get("radius_inner", 0.0) > 0:
+        return np.array(
+            RING_QUANTITIES[quantity](*coordinates, magnetic_parameters)
+        ).reshape(3, -1)
+    return QUANTITIES[quantity](*coordinates, magnetic_parameters)
+
+
+def _get_cubic_weights(t):
+    # Catmull-Rom weights of the nodes i - 1, i, i + 1 and i + 2 at t in [0, 1]
+    t_squared = t**2
+    t_cubed = t_squared * t
+    return (
+        0.5 * (-t + 2 * t_squared - t_cubed),
+        0.5 * (2 - 5 * t_squared + 3 * t_cubed),
+        0.5 * (t + 4 * t_squared - 3 * t_cubed),
+        0.5 * (t_cubed - t_squared),
+    )
+
+
+class GridInterpolator:
+    """
+    Tricubic interpolation of a field or force grid.
+
+    axes are the x, y and z axes of a regular grid (equally spaced, an axis
+    with a single node gives a planar slice) and values has the shape
+    (3, nx, ny, nz) of the maps of magnetism.field_map. The values are only
+    indexed, so they can be a memory-mapped array such as
+    np.load("force.npy", mmap_mode="r").
+
+    The interpolant is the cubic Hermite spline whose derivatives are the
+    central differences of the grid (Catmull-Rom), evaluated from the 4x4x4
+    surrounding nodes. With magnetic_parameters and quantity given, points
+    inside the magnet are NaN and points whose stencil may reach into the
+    magnet are evaluated with the exact kernel. Points outside the grid are
+    NaN, clipped to the grid or raise a ValueError depending on
+    out_of_bounds ("nan", "clip" or "raise").
+    """
+
+    def __init__(
+        self,
+        axes,
+        values,
+        magnetic_parameters=None,
+        quantity=None,
+        out_of_bounds="nan",
+        chunk_size=8192,
+    ):
+        if out_of_bounds not in ("nan", "clip", "raise"):
+            raise ValueError("Invalid out_of_bounds mode.")
+        self.axes = [np.asarray(axis, dtype=np.float64) for axis in axes]
+        self.shape = tuple(len(axis) for axis in self.axes)
+        if values.shape != (3,) + self.shape:
+            raise ValueError("values must have the shape (3, nx, ny, nz) of the axes.")
+        for axis in self.axes:
+            if len(axis) > 1 and not np.allclose(
+                axis, np.linspace(axis[0], axis[-1], len(axis))
+            ):
+                raise ValueError("The grid axes must be equally spaced.")
+
+        self.values = values.reshape(3, -1)
+        self.magnetic_parameters = magnetic_parameters
+        self.quantity = quantity
+        self.out_of_bounds = out_of_bounds
+        self.chunk_size = int(chunk_size)
+        self.spacing = np.array(
+            [axis[1] - axis[0] if len(axis) > 1 else 1.0 for axis in self.axes]
+        )
+        self.strides = np.array([self.shape[1] * self.shape[2], self.shape[2], 1])
+
+    def __call__(self, x, y, z):
+        """Interpolate at the points x, y, z; returns shape (3,) + shape."""
+        x, y, z = np.broadcast_arrays(
+            *(np.asarray(c, dtype=np.float64) for c in (x, y, z))
+        )
+        shape = x.shape
+        coordinates = np.stack([x.ravel(), y.ravel(), z.ravel()])
+        result = np.empty((3, coordinates.shape[1]))
+        for start in range(0, coordinates.shape[1], self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            result[:, chunk] = self._evaluate_chunk(coordinates[:, chunk])
+        return result.reshape((3,) + shape)
+
+    def _evaluate_chunk(self, coordinates):
+        lower = np.array([axis[0] for axis in self.axes])
+        upper = np.array([axis[-1] for axis in self.axes])
+        outside = np.any(
+            (coordinates < lower[:, None] - 1e-12 * self.spacing[:, None])
+            | (coordinates > upper[:, None] + 1e-12 * self.spacing[:, None]),
+            axis=0,
+        )
+        if self.out_of_bounds == "raise" and outside.any():
+            raise ValueError("Query points outside of the grid.")
+        coordinates = np.clip(coordinates, lower[:, None], upper[:, None])
+
+        # indices and cubic weights of the stencil along each axis, clipped
+        # to the grid at its boundaries
+        n = coordinates.shape[1]
+        stencils = []
+        for a, n_nodes in enumerate(self.shape):
+            if n_nodes == 1:
+                stencils.append([(0, 1.0)])
+                continue
+            u = (coordinates[a] - lower[a]) / self.spacing[a]
+            i = np.clip(np.floor(u).astype(np.int64), 0, n_nodes - 2)
+            weights = _get_cubic_weights(u - i)
+            stencils.append(
+                [
+                    (np.clip(i + offset, 0, n_nodes - 1) * self.strides[a], weight)
+                    for offset, weight in zip(range(-1, 3), weights)
+                ]
+            )
+
+        result = np.zeros((3, n))
+        for i, w_x in stencils[0]:
+            for j, w_y in stencils[1]:
+                index_xy = i + j
+                weight_xy = w_x * w_y
+                for k, w_z in stencils[2]:
+                    index = index_xy + k
+                    weight = weight_xy * w_z
+                    for c in range(3):
+                        result[c] += weight * self.values[c][index]
+
+        if self.magnetic_parameters is not None:
+            self._correct_near_magnet(coordinates, result)
+        if self.out_of_bounds == "nan":
+            result[:, outside] = np.nan
+        return result
+
+    def _correct_near_magnet(self, coordinates, result):
+        # the stencil reaches up to two nodes beyond the enclosing cell; the
+        # bore of a ring magnet is interpolated away from its inner wall
+        reach = 2 * np.linalg.norm(self.spacing[np.array(self.shape) > 1])
+        rho, _, z = transform_coordinates_forward(
+            *coordinates, self.magnetic_parameters
+        )
+        R = self.magnetic_parameters["radius_magnet"]
+        R_inner = self.magnetic_parameters.get("radius_inner", 0.0)
+        half_length = 0.5 * self.magnetic_parameters["length"]
+        inside = is_inside_magnet(*coordinates, self.magnetic_parameters)
+        near = (
+            (rho < R + reach)
+            & (rho > R_inner - reach)
+            & (np.abs(z) < half_length + reach)
+            & ~inside
+        )
+        if self.quantity is not None and near.any():
+            result[:, near] = _evaluate_exact(
+                self.quantity, coordinates[:, near], self.magnetic_parameters
+            )
+        result[:, inside] = np.nan
+
+    def measure_error(self, x, y, z):
+        """
+        Measure the interpolation error against the exact kernel.
+
+        The error of each point is the norm of the deviation relative to the
+        norm of the exact value; points that interpolate to NaN or where the
+        exact value vanishes (e.g. at symmetry points) are skipped. Returns a
+        dictionary with the maximum, the 99th percentile and the median of
+        the relative error, NaN without any measured point, and the number
+        of measured "points".
+        """
+        if self.magnetic_parameters is None or self.quantity is None:
+            raise ValueError("The error needs magnetic_parameters and quantity.")
+        x, y, z = (np.asarray(c, dtype=np.float64).ravel() for c in (x, y, z))
+        interpolated = self(x, y, z)
+        valid = ~np.any(np.isnan(interpolated), axis=0)
+        exact = _evaluate_exact(
+            self.quantity,
+            np.stack([x[valid], y[valid], z[valid]]),
+            self.magnetic_parameters,
+        )
+        magnitude = np.linalg.norm(exact, axis=0)
+        measured = magnitude > 0
+        error = (
+            np.linalg.norm(interpolated[:, valid] - exact, axis=0)[measured]
+            / magnitude[measured]
+        )
+        if not len(error):
+            return {"max": np.nan, "p99": np.nan, "median": np.nan, "points": 0}
+        return {
+            "max": float(error.max()),
+            "p99": float(np.percentile(error, 99)),
+            "median": float(np.median(error)),
+            "points": len(error),
+        }
+
+
+def load_grid_interpolator(path, quantity="force", **kwargs):
+    """Create the interpolator of a quantity of a map from magnetism-field-map."""
+    data = np.load(path)
+    return GridInterpolator(
+        [data["x"], data["y"], data["z"]],
+        data[quantity],
+        json.loads(str(data["magnetic_parameters"])),
+        quantity,
+        **kwargs,
+    )
@@ -0,0 +1,108 @@
+import functools
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+# profile collecting the counters, None while the instrumentation is disabled
+_profile = None
+
+
+class Profile:
+    """
+    Counters of an instrumented run.
+
+    For every stage the number of calls, the total time and the own time
+    (total time minus the time spent in instrumented stages called from it)
+    are accumulated. The own time of "magnetic_field" and "magnetic_force" is
+    the algebra of the kernels and the Python overhead. clamps counts the
+    values replaced by the singular-point substitutions.
+    """
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.total_time = defaultdict(float)
+        self.own_time = defaultdict(float)
+        self.clamps = defaultdict(int)
+        self._child_time = []
+
+
+def is_enabled():
+    """Return whether the instrumentation is collecting counters."""
+    return _profile is not None
+
+
+@contextmanager
+def profile():
+    """
+    Collect call counts, timings and clamp counts within a with-block.
+
+        with profile() as counters:
+            evaluate_magnetic_force(x, y, z, magnetic_parameters)
+        print(report(counters))
+
+    Profiles are not thread-safe; nested blocks collect into the innermost.
+    """
+    global _profile
+    previous = _profile
+    _profile = Profile()
+    try:
+        yield _profile
+    finally:
+        _profile = previous
+
+
+def instrumented(stage):
+    """
+    Decorate a function to count its calls and time them as a stage.
+
+    While no profile is active the wrapper only checks a global and calls
+    through.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            counters = _profile
+            if counters is None:
+                return function(*args, **kwargs)
+
+            counters._child_time.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                child_time = counters._child_time.pop()
+                counters.calls[stage] += 1
+                counters.total_time[stage] += elapsed
+                counters.own_time[stage] += elapsed - child_time
+                if counters._child_time:
+                    counters._child_time[-1] += elapsed
+
+        return wrapper
+
+    return decorator
+
+
+def count_clamps(name, mask):
+    """Add the number of True entries of mask to the clamp counter name."""
+    if _profile is not None:
+        _profile.clamps[name] += int(np.count_nonzero(mask))
+
+
+def report(counters):
+    """Format the counters of a profile as a table, slowest stage first."""
+    lines = [f"{'stage':<40} {'calls':>9} {'total [s]':>11} {'own [s]':>11}"]
+    for stage in sorted(counters.own_time, key=counters.own_time.get, reverse=True):
+        lines.append(
+            f"{stage:<40} {counters.calls[stage]:>9d} "
+            f"{counters.total_time[stage]:>11.6f} {counters.own_time[stage]:>11.6f}"
+        )
+    if counters.clamps:
+        lines.append("")
+        lines.append(f"{'clamp':<40} {'count':>9}")
+        for name in sorted(counters.clamps):
+            lines.append(f"{name:<40} {counters.clamps[name]:>9d}")
+    return "\n".join(lines)
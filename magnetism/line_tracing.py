@@ -0,0 +1,221 @@
+import numpy as np
+
+from magnetism.batch_evaluation import Workspace
+from magnetism.coordinate_transformation import (
+    is_inside_magnet,
+    transform_coordinates_forward,
+)
+from magnetism.field_map import QUANTITIES
+
+
+def _get_default_bounds(magnetic_parameters):
+    # cube around the magnet, three times its larger dimension in each direction
+    extent = 3 * max(
+        magnetic_parameters["radius_magnet"], magnetic_parameters["length"]
+    )
+    centre = np.array(
+        [magnetic_parameters[f"{axis}_position"] for axis in "xyz"], dtype=np.float64
+    )
+    return np.stack([centre - extent, centre + extent], axis=1)
+
+
+def _clip_to_bounds(start, end, bounds):
+    # point where the segments from start (inside) to end leave the box
+    delta = end - start
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(
+            delta > 0,
+            (bounds[:, 1] - start) / delta,
+            np.where(delta < 0, (bounds[:, 0] - start) / delta, np.inf),
+        )
+    return start + np.clip(fraction.min(axis=1), 0, 1)[:, None] * delta
+
+
+def _get_surface_distance(points, magnetic_parameters):
+    # distance of points outside the magnet to its surface
+    rho, _, z = transform_coordinates_forward(*points.T, magnetic_parameters)
+    return np.hypot(
+        np.maximum(rho - magnetic_parameters["radius_magnet"], 0),
+        np.maximum(np.abs(z) - 0.5 * magnetic_parameters["length"], 0),
+    )
+
+
+def _find_surface(start, end, magnetic_parameters, iterations=30):
+    # bisect the segments from start (outside) to end (inside the magnet)
+    outside, inside = start.copy(), end.copy()
+    for _ in range(iterations):
+        middle = 0.5 * (outside + inside)
+        middle_inside = is_inside_magnet(*middle.T, magnetic_parameters)
+        inside[middle_inside] = middle[middle_inside]
+        outside[~middle_inside] = middle[~middle_inside]
+    return outside
+
+
+def trace_lines(
+    seeds,
+    magnetic_parameters,
+    quantity="field",
+    direction=1,
+    bounds=None,
+    tolerance=1e-4,
+    initial_step=None,
+    max_step=None,
+    max_steps=500,
+    surface_distance=1e-3,
+):
+    """
+    Trace field or force lines from many seed points at once.
+
+    seeds is an array of shape (n, 3). The lines follow the direction of the
+    field or force (direction=1), against it (direction=-1) or both ways
+    (direction=0, the backward part is prepended). All lines advance together
+    with the embedded Runge-Kutta 3(2) pair of Bogacki and Shampine, each
+    with its own step size that keeps the local position error below
+    tolerance times the magnet radius; every stage is one batched kernel
+    call for all active lines.
+
+    A line stops at the surface of the magnet (or closer to it than
+    surface_distance times the magnet radius), at the boundary of bounds
+    ([[x_min, x_max], [y_min, y_max], [z_min, z_max]], by default a cube of
+    three magnet dimensions around the magnet), where the quantity vanishes
+    or after max_steps steps. Returns a dictionary with the polylines
+    ("lines", a list of arrays of shape (m, 3)), the reason each line
+    stopped ("stop_reasons": "surface", "boundary", "null" or "max_steps")
+    and the number of batched kernel calls ("evaluations").
+    """
+    seeds = np.atleast_2d(np.asarray(seeds, dtype=np.float64))
+    if direction == 0:
+        forward = trace_lines(
+            seeds,
+            magnetic_parameters,
+            quantity,
+            1,
+            bounds,
+            tolerance,
+            initial_step,
+            max_step,
+            max_steps,
+            surface_distance,
+        )
+        backward = trace_lines(
+            seeds,
+            magnetic_parameters,
+            quantity,
+            -1,
+            bounds,
+            tolerance,
+            initial_step,
+            max_step,
+            max_steps,
+            surface_distance,
+        )
+        return {
+            "lines": [
+                np.concatenate([b[:0:-1], f])
+                for b, f in zip(backward["lines"], forward["lines"])
+            ],
+            "stop_reasons": list(
+                zip(backward["stop_reasons"], forward["stop_reasons"])
+            ),
+            "evaluations": forward["evaluations"] + backward["evaluations"],
+        }
+
+    R = magnetic_parameters["radius_magnet"]
+    bounds = (
+        _get_default_bounds(magnetic_parameters)
+        if bounds is None
+        else np.asarray(bounds, dtype=np.float64)
+    )
+    max_step = 0.5 * R if max_step is None else max_step
+    initial_step = 0.05 * R if initial_step is None else initial_step
+    atol = tolerance * R
+    workspace = Workspace()
+    n_evaluations = 0
+
+    def get_tangent(points):
+        nonlocal n_evaluations
+        n_evaluations += 1
+        values = QUANTITIES[quantity](
+            *points.T, magnetic_parameters, workspace=workspace
+        )
+        norm = np.linalg.norm(values, axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return direction * (values / norm).T
+
+    n = len(seeds)
+    path = np.empty((max_steps + 2, n, 3))
+    path[0] = seeds
+    length = np.ones(n, dtype=np.int64)
+    reasons = np.full(n, "max_steps", dtype=object)
+
+    inside = is_inside_magnet(*seeds.T, magnetic_parameters)
+    outside = np.any((seeds < bounds[:, 0]) | (seeds > bounds[:, 1]), axis=1)
+    reasons[inside] = "surface"
+    reasons[outside] = "boundary"
+    active = np.nonzero(~inside & ~outside)[0]
+
+    position = seeds.copy()
+    step = np.full(n, float(initial_step))
+    k_1 = np.zeros((n, 3))
+    if len(active):
+        k_1[active] = get_tangent(position[active])
+    for _ in range(max_steps):
+        stalled = ~np.all(np.isfinite(k_1[active]), axis=1)
+        reasons[active[stalled]] = "null"
+        active = active[~stalled]
+        if not len(active):
+            break
+
+        y, h, k1 = position[active], step[active, None], k_1[active]
+        k2 = get_tangent(y + 0.5 * h * k1)
+        k3 = get_tangent(y + 0.75 * h * k2)
+        y3 = y + h * (2 / 9 * k1 + 1 / 3 * k2 + 4 / 9 * k3)
+        k4 = get_tangent(y3)
+        y2 = y + h * (7 / 24 * k1 + 1 / 4 * k2 + 1 / 3 * k3 + 1 / 8 * k4)
+        error = np.linalg.norm(y3 - y2, axis=1)
+        error = np.where(np.isfinite(error), error, np.inf)
+
+        # adapt the step sizes, rejected steps are repeated with the new size
+        with np.errstate(divide="ignore"):
+            factor = 0.9 * (atol / error) ** (1 / 3)
+        step[active] = np.clip(h[:, 0] * np.clip(factor, 0.2, 5.0), 1e-6 * R, max_step)
+        accepted = error <= atol
+        lines, y, y3, k4 = active[accepted], y[accepted], y3[accepted], k4[accepted]
+
+        # stop at the boundary and at the surface of the magnet
+        left = np.any((y3 < bounds[:, 0]) | (y3 > bounds[:, 1]), axis=1)
+        y3[left] = _clip_to_bounds(y[left], y3[left], bounds)
+        entered = is_inside_magnet(*y3.T, magnetic_parameters)
+        y3[entered] = _find_surface(y[entered], y3[entered], magnetic_parameters)
+        entered |= _get_surface_distance(y3, magnetic_parameters) < surface_distance * R
+
+        path[length[lines], lines] = y3
+        length[lines] += 1
+        position[lines] = y3
+        k_1[lines] = k4
+        reasons[lines[left]] = "boundary"
+        reasons[lines[entered]] = "surface"
+        finished = np.zeros(n, dtype=bool)
+        finished[lines[left | entered]] = True
+        active = active[~finished[active]]
+
+    return {
+        "lines": [path[: length[i], i].copy() for i in range(n)],
+        "stop_reasons": list(reasons),
+        "evaluations": n_evaluations,
+    }
+
+
+def write_lines_vtk(path, lines):
+    """Write polylines as a legacy ASCII VTK file, e.g. for ParaView."""
+    points = np.concatenate(lines)
+    with open(path, "w") as file:
+        file.write("# vtk DataFile Version 3.0\nmagnetism lines\nASCII\n")
+        file.write(f"DATASET POLYDATA\nPOINTS {len(points)} double\n")
+        np.savetxt(file, points, fmt="%.17g")
+        file.write(f"LINES {len(lines)} {len(points) + len(lines)}\n")
+        start = 0
+        for line in lines:
+            indices = np.arange(start, start + len(line))
+            file.write(" ".join(map(str, [len(line), *indices])) + "\n")
+            start += len(line)
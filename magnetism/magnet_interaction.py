@@ -0,0 +1,181 @@
+import numpy as np
+
+from magnetism.batch_evaluation import Workspace
+from magnetism.coordinate_transformation import get_rotation_matrix
+from magnetism.field_map import QUANTITIES
+from magnetism.magnetic_field import get_magnetization_components
+from magnetism.region_averaging import CHUNK_POINTS, get_gauss_rule
+
+# charged surfaces of a cylinder: top and bottom end face and mantle
+TOP, BOTTOM, MANTLE = 0, 1, 2
+
+
+def _get_targets(target_parameters):
+    # per target: rotation (n, 3, 3), centre (n, 3) and the columns radius,
+    # length, axial and transverse magnetization and angle of the latter
+    rotation = np.array([get_rotation_matrix(p) for p in target_parameters])
+    centre = np.array(
+        [[p[f"{axis}_position"] for axis in "xyz"] for p in target_parameters],
+        dtype=np.float64,
+    )
+    shape = np.array(
+        [
+            [p["radius_magnet"], p["length"], *get_magnetization_components(p)]
+            for p in target_parameters
+        ]
+    )
+    return rotation, centre, shape
+
+
+def _get_surface_points(surface, reference, shape):
+    # points in the magnet frame (c, q, 3) and surface charge times surface
+    # element (c, q) of reference coordinates (c, q, 2) on [0, 1]^2
+    R, L, M_axial, M_transverse, phi_M = (column[:, None] for column in shape.T)
+    u, v = reference[..., 0], reference[..., 1]
+    surface = surface[:, None]
+    on_end = surface != MANTLE
+    theta = 2 * np.pi * np.where(on_end, v, u)
+    radius = np.where(on_end, R * u, R)
+    z = np.where(on_end, np.where(surface == TOP, 0.5, -0.5), v - 0.5) * L
+    charge = np.where(
+        on_end,
+        np.where(surface == TOP, M_axial, -M_axial) * 2 * np.pi * R**2 * u,
+        M_transverse * np.cos(theta - phi_M) * 2 * np.pi * R * L,
+    )
+    points = np.stack([radius * np.cos(theta), radius * np.sin(theta), z], axis=-1)
+    return points, charge
+
+
+def evaluate_magnet_interaction(
+    magnetic_parameters,
+    target_parameters,
+    order=6,
+    rtol=1e-6,
+    atol=0.0,
+    max_level=8,
+):
+    """
+    Calculate the force and torque of a magnet on another cylindrical magnet.
+
+    The field H of the source magnet (magnetic_parameters) acts on the
+    surface charge M . n of the target magnet, a cylinder with its own
+    radius, length, magnetization (also "magnetization_direction"),
+    position and rotation: F = mu_0 int sigma H dA and the torque about the
+    centre of the target T = mu_0 int r x sigma H dA. The end faces (in
+    polar coordinates) and, for a transverse magnetization, the mantle are
+    integrated with tensor Gauss-Legendre rules of the given order on cells
+    that are split into four until the difference between a cell and its
+    children is below its share of max(rtol * size, atol), where size is
+    |F| + |T| / l with the radius l of the sphere around the target. Close
+    magnets thus refine only the facing parts of the surfaces.
+
+    target_parameters is a dictionary or a list of dictionaries, e.g. the
+    poses of a sweep; the cells of all targets are evaluated together in
+    batched kernel calls. Returns a dictionary with the "force" and
+    "torque" (shape (3,), or (n, 3) for a list), the "error" estimate of
+    |F| + |T| / l, whether the tolerance was met ("converged") and the
+    number of field "evaluations".
+    """
+    single = isinstance(target_parameters, dict)
+    targets = [target_parameters] if single else list(target_parameters)
+    rotation, centre, shape = _get_targets(targets)
+    length_scale = np.hypot(shape[:, 0], 0.5 * shape[:, 1])
+    mu_0 = magnetic_parameters["magnetic_permeability"]
+    nodes, weights = get_gauss_rule(order, 2)
+    children = np.array([[0.0, 0.0], [0.0, 0.5], [0.5, 0.0], [0.5, 0.5]])
+    workspace = Workspace()
+    n_evaluations = 0
+
+    def integrate_cells(target, surface, lower, size):
+        # force and torque (c, 6) of the cells of the given targets and
+        # surfaces with the lower corners lower (c, 2) and edge length size
+        nonlocal n_evaluations
+        cells_per_chunk = max(1, CHUNK_POINTS // len(nodes))
+        estimates = []
+        for start in range(0, len(lower), cells_per_chunk):
+            chunk = slice(start, start + cells_per_chunk)
+            reference = lower[chunk, None, :] + size * nodes[None, :, :]
+            points, charge = _get_surface_points(
+                surface[chunk], reference, shape[target[chunk]]
+            )
+            offset = np.einsum("cij,cqj->cqi", rotation[target[chunk]], points)
+            x, y, z = (centre[target[chunk], None, :] + offset).reshape(-1, 3).T
+            H = QUANTITIES["field"](x, y, z, magnetic_parameters, workspace=workspace)
+            n_evaluations += len(x)
+            dF = mu_0 * charge[..., None] * H.T.reshape(offset.shape)
+            force = np.einsum("cqi,q->ci", dF, weights)
+            torque = np.einsum("cqi,q->ci", np.cross(offset, dF), weights)
+            estimates.append(size**2 * np.concatenate([force, torque], axis=1))
+        return np.concatenate(estimates)
+
+    # the charged surfaces of all targets as initial cells
+    target, surface = [], []
+    for index, (_, _, M_axial, M_transverse, _) in enumerate(shape):
+        charged = [TOP, BOTTOM] * bool(M_axial) + [MANTLE] * bool(M_transverse)
+        target.extend([index] * len(charged))
+        surface.extend(charged)
+    target = np.array(target, dtype=np.int64)
+    surface = np.array(surface, dtype=np.int64)
+    lower = np.zeros((len(target), 2))
+    size = 1.0
+
+    n = len(targets)
+    integral = np.zeros((n, 6))
+    error = np.zeros(n)
+    converged = np.ones(n, dtype=bool)
+    estimate = integrate_cells(target, surface, lower, size) if len(target) else None
+    for level in range(max_level + 1):
+        if not len(target):
+            break
+        child_target = np.repeat(target, 4)
+        child_surface = np.repeat(surface, 4)
+        child_lower = (lower[:, None, :] + size * children).reshape(-1, 2)
+        child_estimate = integrate_cells(
+            child_target, child_surface, child_lower, 0.5 * size
+        )
+        refined = child_estimate.reshape(len(target), 4, 6).sum(axis=1)
+        difference = refined - estimate
+        cell_error = (
+            np.linalg.norm(difference[:, :3], axis=1)
+            + np.linalg.norm(difference[:, 3:], axis=1) / length_scale[target]
+        )
+
+        # a cell is accepted if its error is below its share of the tolerance
+        total = integral + np.stack(
+            [np.bincount(target, refined[:, i], minlength=n) for i in range(6)],
+            axis=1,
+        )
+        magnitude = (
+            np.linalg.norm(total[:, :3], axis=1)
+            + np.linalg.norm(total[:, 3:], axis=1) / length_scale
+        )
+        allowed = np.maximum(rtol * magnitude, atol)[target] * size**2
+        accepted = cell_error <= allowed
+        if level == max_level:
+            converged &= np.bincount(target, ~accepted, minlength=n) == 0
+            accepted[:] = True
+        np.add.at(integral, target[accepted], refined[accepted])
+        np.add.at(error, target[accepted], cell_error[accepted])
+
+        split = np.repeat(~accepted, 4)
+        target = child_target[split]
+        surface = child_surface[split]
+        lower = child_lower[split]
+        estimate = child_estimate[split]
+        size *= 0.5
+
+    result = {
+        "force": integral[:, :3],
+        "torque": integral[:, 3:],
+        "error": error,
+        "converged": converged,
+        "evaluations": n_evaluations,
+    }
+    if single:
+        result.update(
+            force=result["force"][0],
+            torque=result["torque"][0],
+            error=result["error"][0],
+            converged=bool(result["converged"][0]),
+        )
+    return result
@@ -1,60 +1,124 @@
+import functools
+
 import numpy as np
 
 from magnetism.coordinate_transformation import (
     transform_coordinates_forward,
     transform_vector_backward,
 )
-from magnetism.elliptic_integrals import EllipticE, EllipticK, EllipticPi
+from magnetism.elliptic_integrals import (
+    EllipticCarlson,
+    EllipticE,
+    EllipticK,
+    EllipticPi,
+)
+from magnetism.instrumentation import count_clamps, instrumented
+from magnetism.precision import as_dtype, evaluate_in_chunks
+
+# below this parameter n = 1 - gamma**2, i.e. close to the axis, P_phi is
+# evaluated by its series, balancing cancellation and truncation errors
+SERIES_LIMIT = 1e-3
 
 
-def P_1(k):
+def P_1(k, K=None, E=None):
     """
     Evaluate auxiliary function P_1.
 
     For Reference see Eq. (4) in Caciagli et al. (2018)
+    K = EllipticK(1 - k**2) and E = EllipticE(1 - k**2) are reused if given.
     """
     k_squared = k**2
-    K = EllipticK(1 - k_squared)
-    E = EllipticE(1 - k_squared)
+    if K is None:
+        K = EllipticK(1 - k_squared)
+    if E is None:
+        E = EllipticE(1 - k_squared, K)
     return K - (2 / (1 - k_squared)) * (K - E)
 
 
-def P_2(k, gamma):
+def P_2(k, gamma, K=None, P=None):
     """
     Evaluate auxiliary function P_2.
 
     For Reference see Eq. (4) in Caciagli et al. (2018)
+    K = EllipticK(1 - k**2) and P = EllipticPi(1 - gamma**2, 1 - k**2) are
+    reused if given.
     """
     k_squared = k**2
     gamma_squared = gamma**2
-    K = EllipticK(1 - k_squared)
-    P = EllipticPi(1 - gamma_squared, 1 - k_squared)
+    if K is None:
+        K = EllipticK(1 - k_squared)
+    if P is None:
+        P = EllipticPi(1 - gamma_squared, 1 - k_squared, K)
     return -(gamma / (1 - gamma_squared)) * (P - K) - (1 / (1 - gamma_squared)) * (
         gamma_squared * P - K
     )
 
 
-def evaluate_magnetic_field(x, y, z, magnetic_parameters):
+def P_phi(k, gamma, R_D=None, R_J=None):
     """
-    Calculate magnetic field H of a cylindrical magnet.
+    Evaluate the auxiliary function of the transverse magnetization.
 
-    The magnetic field is calculated according to the following reference:
-    Caciagli, A., Baars, R. J., Philipse, A. P., & Kuipers, B. W. M. (2018). Exact expression for the magnetic field of a finite cylinder with arbitrary uniform magnetization. Journal of Magnetism and Magnetic Materials, 456, 423-432. https://doi.org/10.1016/j.jmmm.2018.02.003
+    P_phi is the integral of sin^2 cos^2 / ((1 - n sin^2) sqrt(1 - m sin^2))
+    over [0, pi / 2] with m = 1 - k**2 and n = 1 - gamma**2, i.e.
+    (K - E) / (n m) + (1 - n) (K - Pi) / n**2. It is evaluated with the
+    Carlson integrals R_D and R_J of EllipticCarlson, which are reused if
+    given, and close to the axis, where they cancel, by a series in m and n.
     """
+    m = 1 - k**2
+    n = 1 - gamma**2
+    if R_D is None or R_J is None:
+        _, R_D, R_J = EllipticCarlson(n, m)
+    series = (np.pi / 16) * (
+        1 + 0.5 * (n + 0.5 * m) + (5 / 16) * (n**2 + 0.5 * n * m + 0.375 * m**2)
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        closed = (R_D - (1 - n) * R_J) / (3 * n)
+    return np.where(n < SERIES_LIMIT, series, closed)
 
-    # transform coordinates to cylindrical coordinates
-    rho, phi, z = transform_coordinates_forward(x, y, z, magnetic_parameters)
 
-    R = magnetic_parameters["radius_magnet"]
-    half_length = 0.5 * magnetic_parameters["length"]
+def get_magnetization_components(magnetic_parameters):
+    """
+    Return the axial and transverse magnetization and the angle of the latter.
+
+    The direction of the magnetization is the vector "magnetization_direction"
+    in the frame of the magnet, whose axis is z, e.g. [1, 0, 0] for a
+    diametrically magnetized magnet. Without it the magnet is magnetized
+    along its axis.
+    """
+    M = magnetic_parameters["magnetization"]
+    direction = magnetic_parameters.get("magnetization_direction")
+    if direction is None:
+        return M, 0.0, 0.0
+    d_x, d_y, d_z = np.asarray(direction, dtype=np.float64) / np.linalg.norm(direction)
+    return M * d_z, M * np.hypot(d_x, d_y), np.arctan2(d_y, d_x)
+
+
+def evaluate_magnetic_field_cylindrical(
+    rho, z, R, half_length, magnetization, transverse=False
+):
+    """
+    Evaluate H_rho and H_z of a cylinder in its own cylindrical coordinates.
+
+    The cylinder of radius R and length 2 * half_length is centred at the
+    origin and magnetized along z. All arguments broadcast, so several
+    radii can be evaluated in one pass. Inside the cylinder the
+    magnetization is not yet subtracted from H_z, see
+    evaluate_magnetic_field.
+
+    With transverse=True, H_phi of the same cylinder magnetized along
+    phi = 0 is returned as well, divided by sin(phi). Together with H_rho
+    and H_z it gives the transverse field, see evaluate_magnetic_field.
+    """
 
     # calculate auxiliary variables
     rho_p = R + rho
-    if np.abs(rho_p) < 1e-9:
-        rho_p = 1e-9
+    singular = np.abs(rho_p) < 1e-9
+    count_clamps("magnetic_field.rho_p", singular)
+    rho_p = np.where(singular, 1e-9, rho_p)
     rho_m = R - rho
-    if np.abs(rho_m) < 1e-9:
-        rho_m = 1e-9
+    singular = np.abs(rho_m) < 1e-9
+    count_clamps("magnetic_field.rho_m", singular)
+    rho_m = np.where(singular, 1e-9, rho_m)
     zeta_p = half_length + z
     zeta_m = half_length - z
     alpha_p = 1 / (np.sqrt(zeta_p**2 + rho_p**2))
@@ -62,29 +126,121 @@ def evaluate_magnetic_field(x, y, z, magnetic_parameters):
     beta_p = zeta_p * alpha_p
     beta_m = -zeta_m * alpha_m
     gamma = (rho - R) / (rho + R)
-    if np.abs(gamma) < 1e-9:
-        gamma = 1e-9
+    singular = np.abs(gamma) < 1e-9
+    count_clamps("magnetic_field.gamma", singular)
+    gamma = np.where(singular, 1e-9, gamma)
     k_p = np.sqrt((zeta_p**2 + rho_m**2) / (zeta_p**2 + rho_p**2))
     k_m = np.sqrt((zeta_m**2 + rho_m**2) / (zeta_m**2 + rho_p**2))
 
     # calculate magnetic field components
     # see Eq. (3) in Caciagli et al. (2018)
+    # all auxiliary functions share the Carlson integrals of each end face
+    m_p, m_m, n = 1 - k_p**2, 1 - k_m**2, 1 - gamma**2
+    RF_p, RD_p, RJ_p = EllipticCarlson(n, m_p)
+    RF_m, RD_m, RJ_m = EllipticCarlson(n, m_m)
+    K_p, K_m = RF_p, RF_m
+    E_p = K_p - (1 / 3) * m_p * RD_p
+    E_m = K_m - (1 / 3) * m_m * RD_m
+    Pi_p = K_p + (1 / 3) * n * RJ_p
+    Pi_m = K_m + (1 / 3) * n * RJ_m
     H_rho = (
         R
-        * (magnetic_parameters["magnetization"] / np.pi)
-        * (alpha_p * P_1(k_p) - alpha_m * P_1(k_m))
+        * (magnetization / np.pi)
+        * (alpha_p * P_1(k_p, K_p, E_p) - alpha_m * P_1(k_m, K_m, E_m))
     )
     H_z = (
         R
-        * (magnetic_parameters["magnetization"] / (np.pi * rho_p))
-        * (beta_p * P_2(k_p, gamma) - beta_m * P_2(k_m, gamma))
+        * (magnetization / (np.pi * rho_p))
+        * (beta_p * P_2(k_p, gamma, K_p, Pi_p) - beta_m * P_2(k_m, gamma, K_m, Pi_m))
     )
+    if not transverse:
+        return H_rho, H_z
+
+    # H_phi = -M sin(phi) psi_rho / rho with the Newtonian potential psi of
+    # the cylinder, psi_rho follows from its lateral surface
+    H_phi = (
+        4
+        * R**2
+        * (magnetization / (np.pi * rho_p**2))
+        * (
+            beta_p * P_phi(k_p, gamma, RD_p, RJ_p)
+            - beta_m * P_phi(k_m, gamma, RD_m, RJ_m)
+        )
+    )
+    return H_rho, H_z, H_phi
+
+
+@instrumented("magnetic_field")
+def evaluate_magnetic_field(x, y, z, magnetic_parameters, dtype=None):
+    """
+    Calculate magnetic field H of a cylindrical magnet.
+
+    The magnetic field is calculated according to the following reference:
+    Caciagli, A., Baars, R. J., Philipse, A. P., & Kuipers, B. W. M. (2018). Exact expression for the magnetic field of a finite cylinder with arbitrary uniform magnetization. Journal of Magnetism and Magnetic Materials, 456, 423-432. https://doi.org/10.1016/j.jmmm.2018.02.003
+
+    The magnet is magnetized along its axis or along the optional
+    "magnetization_direction", see get_magnetization_components. With
+    dtype=np.float32 the points are stored and transformed and the field is
+    returned in single precision (a float32 storage mode): the algebra in
+    between runs in double precision on chunks of precision.CHUNK_POINTS
+    points, so large batches take half the memory of the float64 path.
+    """
+    if dtype is None:
+        return _evaluate_magnetic_field(x, y, z, magnetic_parameters)
+    return evaluate_in_chunks(
+        functools.partial(
+            _evaluate_magnetic_field,
+            magnetic_parameters=magnetic_parameters,
+            dtype=dtype,
+        ),
+        x,
+        y,
+        z,
+        dtype,
+    )
+
+
+def _evaluate_magnetic_field(x, y, z, magnetic_parameters, dtype=None):
+    # transform coordinates to cylindrical coordinates
+    rho, phi, z = transform_coordinates_forward(x, y, z, magnetic_parameters, dtype)
+
+    # the contributions of both end faces cancel in the far field and k
+    # approaches 1 on the axis, so the field is evaluated in double precision
+    if dtype is not None:
+        rho, z = rho.astype(np.float64), z.astype(np.float64)
+
+    R = magnetic_parameters["radius_magnet"]
+    half_length = 0.5 * magnetic_parameters["length"]
+    M_axial, M_transverse, phi_M = get_magnetization_components(magnetic_parameters)
+    inside = (rho < R) & (np.abs(z) < half_length)
+    if M_transverse == 0:
+        H_rho, H_z = evaluate_magnetic_field_cylindrical(
+            rho, z, R, half_length, M_axial
+        )
+        H_phi = 0
+    else:
+        # H = Hess(psi) M: the axial field and psi_rho / rho give all second
+        # derivatives of psi, with psi_rho_rho + psi_rho / rho + psi_z_z = 0
+        # outside the magnet
+        h_rho, h_z, h_phi = evaluate_magnetic_field_cylindrical(
+            rho, z, R, half_length, 1.0, transverse=True
+        )
+        cos_phi, sin_phi = np.cos(phi - phi_M), np.sin(phi - phi_M)
+        H_rho = M_axial * h_rho + M_transverse * cos_phi * (h_phi - h_z)
+        H_phi = M_transverse * sin_phi * h_phi
+        H_z = M_axial * h_z + M_transverse * cos_phi * h_rho
 
     # inside the magnet: subtract the magnetization M
-    if rho < R and np.abs(z) < half_length:
-        H_z = H_z - magnetic_parameters["magnetization"]
+    H_z = np.where(inside, H_z - M_axial, H_z)
 
     # transform magnetic field components back to cartesian coordinates
-    H_x, H_y, H_z = transform_vector_backward(H_rho, H_z, phi, magnetic_parameters)
+    H_x, H_y, H_z = transform_vector_backward(
+        as_dtype(H_rho, dtype),
+        as_dtype(H_z, dtype),
+        phi,
+        magnetic_parameters,
+        phi_component=as_dtype(H_phi, dtype),
+        dtype=dtype,
+    )
 
     return H_x, H_y, H_z
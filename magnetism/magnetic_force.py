@@ -1,3 +1,5 @@
+import functools
+
 import numpy as np
 
 from magnetism.coordinate_transformation import (
@@ -5,27 +7,81 @@ from magnetism.coordinate_transformation import (
     transform_vector_backward,
 )
 from magnetism.elliptic_integrals import EllipticE, EllipticK, EllipticPi
-from magnetism.magnetic_field import evaluate_magnetic_field
+from magnetism.instrumentation import instrumented
+from magnetism.magnetic_field import (
+    evaluate_magnetic_field,
+    evaluate_magnetic_field_cylindrical,
+    get_magnetization_components,
+)
 from magnetism.magnetisation_model import evaluate_magnetisation_model
+from magnetism.precision import as_dtype, evaluate_in_chunks
+
+# radial step of the field derivatives relative to the radius of the magnet,
+# balances the truncation and rounding errors of central differences
+DERIVATIVE_STEP = 6e-6
 
+# below this distance from the axis relative to the radius of the magnet the
+# radial force, which vanishes linearly at the axis, is set to zero; the
+# closed form cancels catastrophically there
+AXIS_LIMIT = 1e-7
 
-def evaluate_magnetic_force(x, y, z, magnetic_parameters, magnetic_volume=None):
+
+@instrumented("magnetic_force")
+def evaluate_magnetic_force(
+    x, y, z, magnetic_parameters, magnetic_volume=None, dtype=None
+):
     """
     Evaluate the magnetic force at a given point in space.
+
+    With dtype=np.float32 the points are stored and transformed and the
+    force is returned in single precision, the algebra runs in double
+    precision on chunks, see evaluate_magnetic_field. Magnets with a
+    transverse magnetization are evaluated by
+    evaluate_magnetic_force_transverse.
     """
-    # transform the coordinates
-    rho, phi, z = transform_coordinates_forward(x, y, z, magnetic_parameters)
+    if dtype is None:
+        return _evaluate_magnetic_force(x, y, z, magnetic_parameters, magnetic_volume)
+    return evaluate_in_chunks(
+        functools.partial(
+            _evaluate_magnetic_force,
+            magnetic_parameters=magnetic_parameters,
+            magnetic_volume=magnetic_volume,
+            dtype=dtype,
+        ),
+        x,
+        y,
+        z,
+        dtype,
+    )
 
-    # extract the magnetic parameters
-    R = magnetic_parameters["radius_magnet"]
-    half_length = 0.5 * magnetic_parameters["length"]
 
-    H_x, H_y, H_z = evaluate_magnetic_field(x, y, z, magnetic_parameters)
+def _evaluate_magnetic_force(
+    x, y, z, magnetic_parameters, magnetic_volume=None, dtype=None
+):
+    if get_magnetization_components(magnetic_parameters)[1] != 0:
+        return evaluate_magnetic_force_transverse(
+            x, y, z, magnetic_parameters, magnetic_volume, dtype
+        )
+
+    # evaluate the field at the point before z is replaced by the magnet frame
+    H_x, H_y, H_z = evaluate_magnetic_field(x, y, z, magnetic_parameters, dtype)
     H_magnitude = np.sqrt(H_x**2 + H_y**2 + H_z**2)
     f_H = evaluate_magnetisation_model(
         magnetic_parameters, H_magnitude, magnetic_volume
     )
 
+    # transform the coordinates
+    rho, phi, z = transform_coordinates_forward(x, y, z, magnetic_parameters, dtype)
+
+    # extract the magnetic parameters
+    R = magnetic_parameters["radius_magnet"]
+    half_length = 0.5 * magnetic_parameters["length"]
+
+    # the force is a small difference of large terms away from the magnet,
+    # so it is evaluated in double precision
+    if dtype is not None:
+        rho, z = rho.astype(np.float64), z.astype(np.float64)
+
     # calculate the auxiliary variables
     rho_p = R + rho
     rho_m = R - rho
@@ -55,19 +111,27 @@ def evaluate_magnetic_force(x, y, z, magnetic_parameters, magnetic_volume=None):
 
     beta = (4 * rho * R) / (rho_p**2)
 
+    # evaluate each elliptic integral only once
+    K_p = EllipticK(psi_p)
+    K_m = EllipticK(psi_m)
+    E_p = EllipticE(psi_p)
+    E_m = EllipticE(psi_m)
+    Pi_p = EllipticPi(beta, psi_p)
+    Pi_m = EllipticPi(beta, psi_m)
+
     # calculate the auxiliary functions
     Q_1 = (
-        a_2 * EllipticE(psi_m) / alpha_p
-        - a_1 * EllipticE(psi_p) / alpha_m
-        + c_1 * EllipticK(psi_p) / alpha_m
-        - c_2 * EllipticK(psi_m) / alpha_p
+        a_2 * E_m / alpha_p
+        - a_1 * E_p / alpha_m
+        + c_1 * K_p / alpha_m
+        - c_2 * K_m / alpha_p
     )
 
     Q_2 = (
-        rho_p * zeta_p * EllipticK(psi_p) / alpha_m
-        + rho_p * zeta_m * EllipticK(psi_m) / alpha_p
-        + rho_m * zeta_p * EllipticPi(beta, psi_p) / alpha_m
-        + rho_m * zeta_m * EllipticPi(beta, psi_m) / alpha_p
+        rho_p * zeta_p * K_p / alpha_m
+        + rho_p * zeta_m * K_m / alpha_p
+        + rho_m * zeta_p * Pi_p / alpha_m
+        + rho_m * zeta_m * Pi_m / alpha_p
     )
 
     # calculate the magnetic force in cylindrical coordinates
@@ -79,21 +143,22 @@ def evaluate_magnetic_force(x, y, z, magnetic_parameters, magnetic_volume=None):
             rho**2
             * Q_2
             * (
-                a_3 * c_2 * zeta_m * EllipticE(psi_m) / alpha_p
-                + a_4 * c_1 * zeta_p * EllipticE(psi_p) / alpha_m
-                - a_3 * a_4 * zeta_m * EllipticK(psi_m) / alpha_p
-                - a_3 * a_4 * zeta_p * EllipticK(psi_p) / alpha_m
+                a_3 * c_2 * zeta_m * E_m / alpha_p
+                + a_4 * c_1 * zeta_p * E_p / alpha_m
+                - a_3 * a_4 * zeta_m * K_m / alpha_p
+                - a_3 * a_4 * zeta_p * K_p / alpha_m
             )
             + rho_p
             * Q_1
             * (
-                (b_1**2 + rho**2 * b_3) * a_4 * EllipticE(psi_p) / alpha_m
-                - (b_2**2 + rho**2 * b_4) * a_3 * EllipticE(psi_m) / alpha_p
-                + a_3 * a_4 * b_2 * EllipticK(psi_m) / alpha_p
-                - a_3 * a_4 * b_1 * EllipticK(psi_p) / alpha_m
+                (b_1**2 + rho**2 * b_3) * a_4 * E_p / alpha_m
+                - (b_2**2 + rho**2 * b_4) * a_3 * E_m / alpha_p
+                + a_3 * a_4 * b_2 * K_m / alpha_p
+                - a_3 * a_4 * b_1 * K_p / alpha_m
             )
         )
     ) / (4.0 * np.pi**2 * rho**3 * rho_p * a_4 * a_2 * a_3 * a_1)
+    F_rho = np.where(rho < AXIS_LIMIT * R, 0.0, F_rho)
 
     F_z = (
         magnetic_parameters["magnetization"] ** 2
@@ -102,22 +167,106 @@ def evaluate_magnetic_force(x, y, z, magnetic_parameters, magnetic_volume=None):
         * (
             (Q_1 / rho**2)
             * (
-                a_3 * a_4 * zeta_m * EllipticK(psi_m) / alpha_p
-                + a_3 * a_4 * zeta_p * EllipticK(psi_p) / alpha_m
-                - c_2 * zeta_m * a_3 * EllipticE(psi_m) / alpha_p
-                - c_1 * zeta_p * a_4 * EllipticE(psi_p) / alpha_m
+                a_3 * a_4 * zeta_m * K_m / alpha_p
+                + a_3 * a_4 * zeta_p * K_p / alpha_m
+                - c_2 * zeta_m * a_3 * E_m / alpha_p
+                - c_1 * zeta_p * a_4 * E_p / alpha_m
             )
             + (Q_2 / rho_p)
             * (
-                c_4 * a_3 * EllipticE(psi_m) / alpha_p
-                - c_3 * a_4 * EllipticE(psi_p) / alpha_m
-                - a_3 * a_4 * EllipticK(psi_m) / alpha_p
-                + a_3 * a_4 * EllipticK(psi_p) / alpha_m
+                c_4 * a_3 * E_m / alpha_p
+                - c_3 * a_4 * E_p / alpha_m
+                - a_3 * a_4 * K_m / alpha_p
+                + a_3 * a_4 * K_p / alpha_m
             )
         )
     ) / (4.0 * np.pi**2 * a_4 * a_2 * a_3 * a_1)
 
     # transform the magnetic force back to cartesian coordinates
-    F_x, F_y, F_z = transform_vector_backward(F_rho, F_z, phi, magnetic_parameters)
+    F_x, F_y, F_z = transform_vector_backward(
+        as_dtype(F_rho, dtype),
+        as_dtype(F_z, dtype),
+        phi,
+        magnetic_parameters,
+        dtype=dtype,
+    )
 
     return F_x, F_y, F_z
+
+
+def evaluate_magnetic_force_transverse(
+    x, y, z, magnetic_parameters, magnetic_volume=None, dtype=None
+):
+    """
+    Evaluate the magnetic force of a magnet with any magnetization direction.
+
+    The force mu_0 f_H grad(|H|^2) / 2 uses the radial derivatives of the
+    axial and transverse field terms of evaluate_magnetic_field_cylindrical
+    from central differences; the field and its two radial neighbours are
+    evaluated in one pass. The axial derivatives follow from the field
+    being curl- and divergence-free outside the magnet, the azimuthal ones
+    from its dependence on cos(phi) and sin(phi).
+    """
+    rho, phi, z = transform_coordinates_forward(x, y, z, magnetic_parameters, dtype)
+    if dtype is not None:
+        rho, z = rho.astype(np.float64), z.astype(np.float64)
+
+    R = magnetic_parameters["radius_magnet"]
+    half_length = 0.5 * magnetic_parameters["length"]
+    M_axial, M_transverse, phi_M = get_magnetization_components(magnetic_parameters)
+    h = DERIVATIVE_STEP * R
+
+    # field terms at rho and rho +- h, mirrored at the axis where rho < h
+    offsets = np.array([0.0, h, -h]).reshape((3,) + (1,) * np.ndim(rho))
+    rho_offset = rho + offsets
+    h_rho, h_z, h_phi = evaluate_magnetic_field_cylindrical(
+        np.abs(rho_offset), z, R, half_length, 1.0, transverse=True
+    )
+    h_rho = np.sign(rho_offset) * h_rho
+    dh_rho = (h_rho[1] - h_rho[2]) / (2 * h)
+    dh_z = (h_z[1] - h_z[2]) / (2 * h)
+    dh_phi = (h_phi[1] - h_phi[2]) / (2 * h)
+    h_rho, h_z, h_phi = h_rho[0], h_z[0], h_phi[0]
+    h_rho_over_rho = np.where(rho > h, h_rho / rho, dh_rho)
+
+    # the field, see evaluate_magnetic_field, and its derivatives
+    cos_phi, sin_phi = np.cos(phi - phi_M), np.sin(phi - phi_M)
+    H_rho = M_axial * h_rho + M_transverse * cos_phi * (h_phi - h_z)
+    H_phi = M_transverse * sin_phi * h_phi
+    H_z = M_axial * h_z + M_transverse * cos_phi * h_rho
+
+    # curl H = 0 and div H = 0 give the axial derivatives of the terms
+    dz_h_rho = dh_z
+    dz_h_z = -(dh_rho + h_rho_over_rho)
+    dz_h_phi = -h_rho_over_rho
+
+    gradient_rho = 2 * (
+        H_rho * (M_axial * dh_rho + M_transverse * cos_phi * (dh_phi - dh_z))
+        + H_phi * M_transverse * sin_phi * dh_phi
+        + H_z * (M_axial * dh_z + M_transverse * cos_phi * dh_rho)
+    )
+    gradient_z = 2 * (
+        H_rho * (M_axial * dz_h_rho + M_transverse * cos_phi * (dz_h_phi - dz_h_z))
+        + H_phi * M_transverse * sin_phi * dz_h_phi
+        + H_z * (M_axial * dz_h_z + M_transverse * cos_phi * dz_h_rho)
+    )
+    gradient_phi = (2 * M_transverse / rho) * (
+        -H_rho * sin_phi * (h_phi - h_z)
+        + H_phi * cos_phi * h_phi
+        - H_z * sin_phi * h_rho
+    )
+
+    f_H = evaluate_magnetisation_model(
+        magnetic_parameters,
+        np.sqrt(H_rho**2 + H_phi**2 + H_z**2),
+        magnetic_volume,
+    )
+    scale = 0.5 * magnetic_parameters["magnetic_permeability"] * f_H
+    return transform_vector_backward(
+        as_dtype(scale * gradient_rho, dtype),
+        as_dtype(scale * gradient_z, dtype),
+        phi,
+        magnetic_parameters,
+        phi_component=as_dtype(scale * gradient_phi, dtype),
+        dtype=dtype,
+    )
@@ -1,5 +1,13 @@
 import numpy as np
 
+from magnetism.coordinate_transformation import (
+    transform_coordinates_forward,
+    transform_vector_backward,
+)
+from magnetism.magnetic_field import get_magnetization_components
+from magnetism.magnetic_force import evaluate_magnetic_force
+from magnetism.magnetisation_model import evaluate_magnetisation_model
+
 
 def evaluate_magnetic_force_inf(x, y, z, magnetic_parameters):
     """Evaluate the magnetic force for an infinite magnet.
@@ -36,3 +44,193 @@ def evaluate_magnetic_force_inf(x, y, z, magnetic_parameters):
     )
 
     return F_x, 0, F_z
+
+
+def _get_transverse_magnetization(magnetic_parameters):
+    # transverse magnetization and its angle phi_M from xi; without a
+    # "magnetization_direction" the magnet is magnetized along xi, and an
+    # axial component adds no field to an infinitely long magnet
+    if magnetic_parameters.get("magnetization_direction") is None:
+        return magnetic_parameters["magnetization"], 0.0
+    _, M_transverse, phi_M = get_magnetization_components(magnetic_parameters)
+    return M_transverse, phi_M
+
+
+def evaluate_magnetic_field_inf(x, y, z, magnetic_parameters):
+    """Evaluate the magnetic field H of an infinitely long cylindrical magnet.
+
+    The cylinder extends infinitely along the axis of the magnet given by the
+    position and rotation in magnetic_parameters and is magnetised
+    perpendicular to it, along the local xi direction or the transverse part
+    of "magnetization_direction". Outside the magnet the field is that of a
+    line dipole, inside it is the uniform demagnetising field -M/2, see
+    Furlani and Ng (2006).
+    """
+    # transform coordinates to cylindrical coordinates
+    rho, phi, _ = transform_coordinates_forward(x, y, z, magnetic_parameters)
+
+    R = magnetic_parameters["radius_magnet"]
+    M, phi_M = _get_transverse_magnetization(magnetic_parameters)
+
+    # field in the plane of the magnetization, at the angle phi - phi_M from
+    # it: M R^2 / (2 rho^2) (cos 2 phi, sin 2 phi) outside and -M / 2 (1, 0)
+    # inside the magnet
+    inside = rho < R
+    amplitude = np.where(inside, -0.5 * M, 0.5 * M * R**2 / rho**2)
+    H_rho = amplitude * np.cos(phi - phi_M)
+    H_phi = np.where(inside, -amplitude, amplitude) * np.sin(phi - phi_M)
+
+    return transform_vector_backward(
+        H_rho, 0.0 * H_rho, phi, magnetic_parameters, phi_component=H_phi
+    )
+
+
+def evaluate_magnetic_force_inf_3d(x, y, z, magnetic_parameters, magnetic_volume=None):
+    """Evaluate the magnetic force for an infinite magnet in three dimensions.
+
+    Unlike evaluate_magnetic_force_inf this takes the full position and
+    rotation of the magnet into account and accepts arrays of points. The
+    magnet is the one of evaluate_magnetic_field_inf; a magnet rotated by
+    rotation_x = 90 reproduces evaluate_magnetic_force_inf.
+    """
+    # transform coordinates to cylindrical coordinates
+    rho, phi, _ = transform_coordinates_forward(x, y, z, magnetic_parameters)
+
+    R = magnetic_parameters["radius_magnet"]
+    M, _ = _get_transverse_magnetization(magnetic_parameters)
+
+    # the magnitude of H only depends on the distance to the axis
+    inside = rho < R
+    H_magnitude = np.where(inside, 0.5 * M, 0.5 * M * R**2 / rho**2)
+    f_H = evaluate_magnetisation_model(
+        magnetic_parameters, H_magnitude, magnetic_volume
+    )
+
+    # the force is radial and vanishes in the uniform field inside the magnet
+    F_rho = np.where(
+        inside,
+        0.0,
+        -f_H
+        * magnetic_parameters["magnetic_permeability"]
+        * M**2
+        * R**4
+        / (2 * rho**5),
+    )
+
+    return transform_vector_backward(F_rho, 0.0 * F_rho, phi, magnetic_parameters)
+
+
+def get_infinite_length_region(
+    magnetic_parameters,
+    tolerance=1e-2,
+    radial_extent=5.0,
+    resolution=32,
+    magnetic_volume=None,
+):
+    """Tabulate where the infinite-length force matches the finite-length force.
+
+    Both models are evaluated on a probe grid in the frame of the magnet,
+    spanning rho from radius_magnet to radial_extent * radius_magnet and z
+    from the mid-plane to the end face, parallel and perpendicular to the
+    magnetization. The finite-length magnet is magnetized along xi like the
+    infinite-length one. A probe node is valid if the relative deviation of
+    the infinite-length force from evaluate_magnetic_force is within
+    tolerance in both directions. Returns the probe coordinates rho and z and
+    the boolean array valid of shape (len(rho), len(z)).
+    """
+    R = magnetic_parameters["radius_magnet"]
+    half_length = 0.5 * magnetic_parameters["length"]
+
+    # probe the magnet in its own frame
+    probe_parameters = {
+        **magnetic_parameters,
+        "x_position": 0.0,
+        "y_position": 0.0,
+        "z_position": 0.0,
+        "rotation_x": 0,
+        "rotation_y": 0,
+        "magnetization_direction": [1.0, 0.0, 0.0],
+    }
+    rho_probe = R * np.geomspace(1.0 + 1e-3, radial_extent, resolution)
+    z_probe = np.linspace(0.0, half_length, resolution)
+    rho_grid, z_grid = np.meshgrid(rho_probe, z_probe, indexing="ij")
+
+    valid = np.ones(rho_grid.shape, dtype=bool)
+    for x_grid, y_grid in [(rho_grid, 0.0 * rho_grid), (0.0 * rho_grid, rho_grid)]:
+        F_finite = np.array(
+            evaluate_magnetic_force(
+                x_grid, y_grid, z_grid, probe_parameters, magnetic_volume
+            )
+        )
+        F_infinite = np.array(
+            evaluate_magnetic_force_inf_3d(
+                x_grid, y_grid, z_grid, probe_parameters, magnetic_volume
+            )
+        )
+        deviation = np.sqrt(np.sum((F_infinite - F_finite) ** 2, axis=0))
+        magnitude = np.sqrt(np.sum(F_finite**2, axis=0))
+        valid &= deviation <= tolerance * magnitude
+
+    return rho_probe, z_probe, valid
+
+
+def evaluate_magnetic_force_auto(
+    x, y, z, magnetic_parameters, tolerance=1e-2, magnetic_volume=None, region=None
+):
+    """Evaluate the magnetic force with the cheapest sufficiently accurate model.
+
+    For a transversely magnetized magnet the infinite-length model is used
+    wherever all probe nodes of get_infinite_length_region surrounding a
+    point are valid, everywhere else and for magnets with an axial
+    magnetization the force is evaluated with evaluate_magnetic_force. Pass
+    a precomputed region to avoid probing the magnet on every call.
+    """
+    if get_magnetization_components(magnetic_parameters)[0] != 0:
+        return evaluate_magnetic_force(x, y, z, magnetic_parameters, magnetic_volume)
+
+    if region is None:
+        region = get_infinite_length_region(
+            magnetic_parameters, tolerance, magnetic_volume=magnetic_volume
+        )
+    rho_probe, z_probe, valid = region
+
+    x, y, z = np.broadcast_arrays(x, y, z)
+    shape = x.shape
+    x, y, z = x.ravel(), y.ravel(), z.ravel()
+
+    # locate the points in the probe grid, points outside of it are not valid
+    rho, _, z_local = transform_coordinates_forward(x, y, z, magnetic_parameters)
+    z_local = np.abs(z_local)
+    i = np.searchsorted(rho_probe, rho)
+    j = np.searchsorted(z_probe, z_local)
+    in_region = (
+        (i > 0) & (i < len(rho_probe)) & (j < len(z_probe)) & (rho >= rho_probe[0])
+    )
+    i = np.clip(i, 1, len(rho_probe) - 1)
+    j = np.clip(j, 1, len(z_probe) - 1)
+    use_infinite = (
+        in_region
+        & valid[i - 1, j - 1]
+        & valid[i, j - 1]
+        & valid[i - 1, j]
+        & valid[i, j]
+    )
+
+    F = np.empty((3, x.size))
+    F[:, use_infinite] = evaluate_magnetic_force_inf_3d(
+        x[use_infinite],
+        y[use_infinite],
+        z[use_infinite],
+        magnetic_parameters,
+        magnetic_volume,
+    )
+    F[:, ~use_infinite] = evaluate_magnetic_force(
+        x[~use_infinite],
+        y[~use_infinite],
+        z[~use_infinite],
+        magnetic_parameters,
+        magnetic_volume,
+    )
+
+    F_x, F_y, F_z = F.reshape((3,) + shape)
+    return F_x[()], F_y[()], F_z[()]
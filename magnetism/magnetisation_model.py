@@ -1,6 +1,9 @@
 import numpy as np
 
+from magnetism.instrumentation import instrumented
 
+
+@instrumented("magnetisation_model")
 def evaluate_magnetisation_model(magnetic_parameters, H_magnitude, magnetic_volume):
     """Choose the magnetisation model."""
     if magnetic_parameters["magnetisation_model"] == "linear_saturation":
@@ -32,14 +35,13 @@ def evaluate_mag_model_linear_sat(magnetic_parameters, H_magnitude, magnetic_vol
             (4 / 3) * np.pi * np.power(magnetic_parameters["radius_particle"], 3)
         )
 
-    if (
-        H_magnitude
-        < (1.0 / 3.0) * magnetic_parameters["particle_saturation_magnetization"]
-    ):
-        f_H_volumetric = 3.0
-    else:
-        f_H_volumetric = (
-            magnetic_parameters["particle_saturation_magnetization"] / H_magnitude
-        )
+    # below a third of the saturation magnetisation the particle is linear
+    M_saturation = magnetic_parameters["particle_saturation_magnetization"]
+    H_saturation = (1.0 / 3.0) * M_saturation
+    f_H_volumetric = np.where(
+        H_magnitude < H_saturation,
+        3.0,
+        M_saturation / np.maximum(H_magnitude, H_saturation),
+    )
 
     return f_H_volumetric * magnetic_volume
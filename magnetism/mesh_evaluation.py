@@ -0,0 +1,261 @@
+import argparse
+import collections
+import itertools
+import json
+import multiprocessing
+import time
+
+import numpy as np
+
+from magnetism.batch_evaluation import Workspace
+from magnetism.field_map import QUANTITIES
+
+# workspace of the current (worker) process, reused for all of its chunks
+_workspace = None
+
+
+def get_mesh_format(path):
+    """Return the format of a node file from its extension."""
+    if path.endswith(".npy"):
+        return "npy"
+    if path.endswith(".csv"):
+        return "csv"
+    if path.endswith((".txt", ".xyz")):
+        return "txt"
+    if path.endswith(".vtk"):
+        return "vtk"
+    return "raw"
+
+
+def _read_array_chunks(nodes, chunk_size):
+    for start in range(0, len(nodes), chunk_size):
+        yield np.array(nodes[start : start + chunk_size], dtype=np.float64)
+
+
+def _count_text_nodes(path, delimiter):
+    with open(path) as file:
+        lines = (line for line in file if line.strip())
+        first = next(lines, None)
+        if first is None:
+            return 0, False
+        try:
+            float(first.split(delimiter)[0])
+            has_header = False
+        except ValueError:
+            has_header = True
+        return sum(1 for _ in lines) + (not has_header), has_header
+
+
+def _read_text_chunks(path, delimiter, has_header, chunk_size):
+    with open(path) as file:
+        lines = (line for line in file if line.strip())
+        if has_header:
+            next(lines)
+        while chunk := list(itertools.islice(lines, chunk_size)):
+            yield np.loadtxt(chunk, delimiter=delimiter, usecols=(0, 1, 2), ndmin=2)
+
+
+def _read_vtk_header(path):
+    # header of a legacy VTK file up to its POINTS line
+    with open(path, "rb") as file:
+        encoding = None
+        while line := file.readline():
+            words = line.decode("ascii", "replace").split()
+            if words and words[0].upper() in ("ASCII", "BINARY"):
+                encoding = words[0].upper()
+            if words and words[0].upper() == "POINTS":
+                dtype = {"float": ">f4", "double": ">f8"}[words[2].lower()]
+                return int(words[1]), dtype, encoding, file.tell()
+    raise ValueError("No POINTS section in the VTK file.")
+
+
+def _read_vtk_ascii_chunks(path, offset, n_nodes, chunk_size):
+    with open(path, "rb") as file:
+        file.seek(offset)
+        values = []
+        remaining = 3 * n_nodes
+        for line in file:
+            if remaining <= 0:
+                break
+            words = line.split()[:remaining]
+            values.extend(map(float, words))
+            remaining -= len(words)
+            while len(values) >= 3 * chunk_size:
+                yield np.array(values[: 3 * chunk_size]).reshape(-1, 3)
+                del values[: 3 * chunk_size]
+        if values:
+            yield np.array(values).reshape(-1, 3)
+
+
+def read_mesh_nodes(path, chunk_size=65536, mesh_format=None, dtype="<f8"):
+    """
+    Read the node coordinates of a mesh in chunks.
+
+    Supported formats are "npy" (array of shape (n, 3)), "raw" (binary x, y,
+    z triples of the given dtype), "csv" and "txt" (comma or whitespace
+    separated point lists whose first three columns are x, y, z, with an
+    optional header line) and "vtk" (the POINTS of a legacy ASCII or BINARY
+    VTK file). Binary formats are memory-mapped. Returns the number of nodes
+    and a generator of chunks of shape (chunk_size, 3).
+    """
+    mesh_format = mesh_format or get_mesh_format(path)
+    if mesh_format == "npy":
+        nodes = np.load(path, mmap_mode="r")
+        if nodes.ndim != 2 or nodes.shape[1] != 3:
+            raise ValueError("The nodes must be an array of shape (n, 3).")
+        return len(nodes), _read_array_chunks(nodes, chunk_size)
+    if mesh_format == "raw":
+        nodes = np.memmap(path, dtype=dtype, mode="r").reshape(-1, 3)
+        return len(nodes), _read_array_chunks(nodes, chunk_size)
+    if mesh_format in ("csv", "txt"):
+        delimiter = "," if mesh_format == "csv" else None
+        n_nodes, has_header = _count_text_nodes(path, delimiter)
+        return n_nodes, _read_text_chunks(path, delimiter, has_header, chunk_size)
+    if mesh_format == "vtk":
+        n_nodes, vtk_dtype, encoding, offset = _read_vtk_header(path)
+        if encoding == "BINARY":
+            nodes = np.memmap(
+                path, dtype=vtk_dtype, mode="r", offset=offset, shape=(n_nodes, 3)
+            )
+            return n_nodes, _read_array_chunks(nodes, chunk_size)
+        return n_nodes, _read_vtk_ascii_chunks(path, offset, n_nodes, chunk_size)
+    raise ValueError("Invalid mesh format.")
+
+
+class _ResultWriter:
+    # writes chunks of per-node results sequentially to .npy, .csv or raw
+
+    def __init__(self, path, n_nodes, columns):
+        self.format = get_mesh_format(path)
+        self.file = open(path, "w" if self.format == "csv" else "wb")
+        if self.format == "npy":
+            np.lib.format.write_array_header_1_0(
+                self.file,
+                {
+                    "descr": np.lib.format.dtype_to_descr(np.dtype("<f8")),
+                    "fortran_order": False,
+                    "shape": (n_nodes, len(columns)),
+                },
+            )
+        elif self.format == "csv":
+            self.file.write(",".join(columns) + "\n")
+
+    def write(self, values):
+        if self.format == "csv":
+            np.savetxt(self.file, values, delimiter=",", fmt="%.17g")
+        else:
+            self.file.write(np.ascontiguousarray(values, dtype="<f8").tobytes())
+
+    def close(self):
+        self.file.close()
+
+
+def _evaluate_nodes(task):
+    global _workspace
+    nodes, magnetic_parameters, quantities = task
+    if _workspace is None:
+        _workspace = Workspace()
+
+    x, y, z = nodes.T
+    return np.concatenate(
+        [
+            QUANTITIES[quantity](x, y, z, magnetic_parameters, workspace=_workspace)
+            for quantity in quantities
+        ]
+    ).T
+
+
+def evaluate_mesh(
+    input_path,
+    output_path,
+    magnetic_parameters,
+    quantities=("force",),
+    chunk_size=65536,
+    workers=1,
+    mesh_format=None,
+    dtype="<f8",
+):
+    """
+    Evaluate field and/or force on the nodes of a mesh file.
+
+    The nodes are streamed in chunks of chunk_size (see read_mesh_nodes),
+    evaluated by the given number of worker processes and written in node
+    order to output_path (.npy, .csv or raw float64). The output has one row
+    per node with the x, y and z components of each quantity, e.g.
+    force_x, force_y, force_z, field_x, field_y, field_z. At most two chunks
+    per worker are in flight, so memory does not grow with the mesh. Returns
+    the number of nodes.
+    """
+    n_nodes, chunks = read_mesh_nodes(input_path, chunk_size, mesh_format, dtype)
+    columns = [f"{quantity}_{axis}" for quantity in quantities for axis in "xyz"]
+    writer = _ResultWriter(output_path, n_nodes, columns)
+    tasks = ((chunk, magnetic_parameters, quantities) for chunk in chunks)
+    try:
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                in_flight = collections.deque()
+                for task in tasks:
+                    in_flight.append(pool.apply_async(_evaluate_nodes, (task,)))
+                    if len(in_flight) >= 2 * workers:
+                        writer.write(in_flight.popleft().get())
+                while in_flight:
+                    writer.write(in_flight.popleft().get())
+        else:
+            for task in tasks:
+                writer.write(_evaluate_nodes(task))
+    finally:
+        writer.close()
+    return n_nodes
+
+
+def main(argv=None):
+    """Evaluate field and force on the nodes of a mesh file."""
+    parser = argparse.ArgumentParser(
+        description="Evaluate the magnetic field and force of a cylindrical magnet "
+        "on the nodes of a mesh.",
+    )
+    parser.add_argument("config", help='JSON file with "magnetic_parameters"')
+    parser.add_argument("nodes", help="node file (.npy, .csv, .txt, .vtk or raw)")
+    parser.add_argument("output", help="output file (.npy, .csv or raw float64)")
+    parser.add_argument(
+        "--quantity",
+        choices=sorted(QUANTITIES),
+        action="append",
+        help="quantity to evaluate, may be repeated (default: force)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["npy", "raw", "csv", "txt", "vtk"],
+        help="format of the node file (default: from the extension)",
+    )
+    parser.add_argument(
+        "--dtype", default="<f8", help="dtype of raw node files (default: <f8)"
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=65536)
+    args = parser.parse_args(argv)
+
+    with open(args.config) as file:
+        magnetic_parameters = json.load(file)["magnetic_parameters"]
+    quantities = args.quantity or ["force"]
+
+    start = time.perf_counter()
+    n_nodes = evaluate_mesh(
+        args.nodes,
+        args.output,
+        magnetic_parameters,
+        quantities,
+        args.chunk_size,
+        args.workers,
+        args.format,
+        args.dtype,
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"Evaluated {', '.join(quantities)} at {n_nodes} nodes in {elapsed:.3f} s "
+        f"with {args.workers} worker(s): {n_nodes / elapsed:.0f} nodes/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import itertools
+
+import numpy as np
+
+from magnetism.batch_evaluation import (
+    Workspace,
+    evaluate_magnetic_field_batch,
+    evaluate_magnetic_force_batch,
+)
+from magnetism.concentration_transport import get_drag_coefficient
+from magnetism.coordinate_transformation import is_inside_magnet
+from magnetism.magnetisation_model import evaluate_magnetisation_model
+
+# offsets of the neighbouring cells in one half of the shell around a cell;
+# with the cell itself they cover every pair of particles exactly once
+HALF_SHELL = [
+    offset for offset in itertools.product((-1, 0, 1), repeat=3) if offset > (0, 0, 0)
+]
+
+# particles and pairs processed at once, bounds the temporary memory
+CHUNK_PARTICLES = 65536
+CHUNK_PAIRS = 1 << 20
+
+
+def _expand_ranges(start, count):
+    # indices start[k], ..., start[k] + count[k] - 1 for all k, concatenated
+    offsets = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    return np.repeat(start, count) + offsets
+
+
+def build_neighbor_list(points, cutoff):
+    """
+    Return the pairs of points closer than cutoff.
+
+    The points (shape (3, n)) are sorted into cubic cells of edge cutoff,
+    so only the particles of a cell and of its 13 neighbours in one half of
+    the surrounding shell are compared, with a cost linear in the number of
+    particles at a given density. Returns an integer array of shape (2, p)
+    with each pair (i, j), i != j, once.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    n = points.shape[1]
+    if n == 0:
+        return np.empty((2, 0), dtype=np.int64)
+
+    # cell indices with a margin of one empty cell on every side
+    cells = np.floor((points - points.min(axis=1, keepdims=True)) / cutoff)
+    dims = cells.max(axis=1) + 3
+    if np.prod(dims) > 2**62:
+        raise ValueError("The cutoff is too small for the extent of the points.")
+    cells = cells.astype(np.int64) + 1
+    dims = dims.astype(np.int64)
+    strides = np.array([dims[1] * dims[2], dims[2], 1])
+    keys = strides @ cells
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    cell_keys, cell_starts, cell_counts = np.unique(
+        keys, return_index=True, return_counts=True
+    )
+
+    x, y, z = (np.ascontiguousarray(c) for c in points[:, order])
+    pairs = []
+    for first in range(0, n, CHUNK_PARTICLES):
+        particles = np.arange(first, min(first + CHUNK_PARTICLES, n))
+        own = np.searchsorted(cell_keys, keys[particles])
+        for offset in [(0, 0, 0)] + HALF_SHELL:
+            if offset == (0, 0, 0):
+                # the partners after a particle in its own cell
+                start = particles + 1
+                count = cell_starts[own] + cell_counts[own] - start
+            else:
+                target = keys[particles] + strides @ offset
+                cell = np.minimum(
+                    np.searchsorted(cell_keys, target), len(cell_keys) - 1
+                )
+                found = cell_keys[cell] == target
+                start = np.where(found, cell_starts[cell], 0)
+                count = np.where(found, cell_counts[cell], 0)
+            j = _expand_ranges(start, count)
+            distance = np.square(np.repeat(x[particles], count) - x[j])
+            distance += np.square(np.repeat(y[particles], count) - y[j])
+            distance += np.square(np.repeat(z[particles], count) - z[j])
+            close = distance < cutoff**2
+            i = np.repeat(particles, count)[close]
+            pairs.append(np.stack([order[i], order[j[close]]]))
+    return np.concatenate(pairs, axis=1)
+
+
+def evaluate_induced_moments(field, magnetic_parameters, magnetic_volume=None):
+    """
+    Return the moments m = f_H H (shape (3, n)) of particles in the field H.
+
+    f_H is given by the magnetisation model of the magnetic parameters,
+    consistent with the force mu_0 f_H grad(|H|^2) / 2 of the magnet.
+    """
+    H_magnitude = np.linalg.norm(field, axis=0)
+    f_H = evaluate_magnetisation_model(
+        magnetic_parameters, H_magnitude, magnetic_volume
+    )
+    return f_H * field
+
+
+def evaluate_dipole_forces(
+    points, moments, pairs, magnetic_permeability, contact_distance=0.0, cutoff=np.inf
+):
+    """
+    Sum the dipole-dipole forces of the pairs on every particle.
+
+    The force of the dipole m_j on the dipole m_i at the distance r = r_i -
+    r_j is 3 mu_0 / (4 pi |r|^4) ((m_i . e) m_j + (m_j . e) m_i + (m_i .
+    m_j - 5 (m_i . e) (m_j . e)) e) with e = r / |r|, and the opposite force
+    acts on m_j. Distances below contact_distance are evaluated at it, pairs
+    further apart than cutoff are skipped. Returns the forces of shape
+    (3, n).
+    """
+    n = points.shape[1]
+    forces = np.zeros((3, n))
+    for first in range(0, pairs.shape[1], CHUNK_PAIRS):
+        i, j = pairs[:, first : first + CHUNK_PAIRS]
+        r = [p[i] - p[j] for p in points]
+        distance = np.sqrt(r[0] ** 2 + r[1] ** 2 + r[2] ** 2)
+        within = distance < cutoff
+        if not np.all(within):
+            i, j, distance = i[within], j[within], distance[within]
+            r = [component[within] for component in r]
+        e = [component / distance for component in r]
+        m_i = [m[i] for m in moments]
+        m_j = [m[j] for m in moments]
+        m_i_e = m_i[0] * e[0] + m_i[1] * e[1] + m_i[2] * e[2]
+        m_j_e = m_j[0] * e[0] + m_j[1] * e[1] + m_j[2] * e[2]
+        m_i_m_j = m_i[0] * m_j[0] + m_i[1] * m_j[1] + m_i[2] * m_j[2]
+        factor = (3 * magnetic_permeability / (4 * np.pi)) / np.maximum(
+            distance, contact_distance
+        ) ** 4
+        m_i_m_j -= 5 * m_i_e * m_j_e
+        m_i_m_j *= factor
+        m_i_e *= factor
+        m_j_e *= factor
+        for component in range(3):
+            force = m_i_e * m_j[component]
+            force += m_j_e * m_i[component]
+            force += m_i_m_j * e[component]
+            forces[component] += np.bincount(i, force, minlength=n)
+            forces[component] -= np.bincount(j, force, minlength=n)
+    return forces
+
+
+class ParticleInteractions:
+    """
+    Forces on particles from the magnet and from each other.
+
+    Every particle is magnetized by the field of the magnet at its position
+    (see evaluate_induced_moments); the field and the force of the magnet
+    are one batch kernel call each, the dipole-dipole forces are summed over
+    the pairs closer than cutoff (default ten particle radii, beyond which
+    they have decayed below 0.2 % of their value at contact). The
+    magnetization of particles by their neighbours is neglected.
+
+    The neighbour list is built with cutoff + skin (default a quarter of the
+    cutoff) and reused for later calls with the same number of particles
+    until a particle has moved by more than half the skin, so it is only
+    rebuilt every few steps of a trajectory.
+    """
+
+    def __init__(
+        self, magnetic_parameters, cutoff=None, skin=None, magnetic_volume=None
+    ):
+        self.magnetic_parameters = magnetic_parameters
+        radius = magnetic_parameters["radius_particle"]
+        self.cutoff = 10 * radius if cutoff is None else cutoff
+        self.skin = 0.25 * self.cutoff if skin is None else skin
+        self.magnetic_volume = magnetic_volume
+        self.workspace = Workspace()
+        self.pairs = None
+        self._reference = None
+        self.rebuilds = 0
+
+    def get_pairs(self, points):
+        """Return the pairs within cutoff + skin, rebuilt if necessary."""
+        if (
+            self._reference is None
+            or self._reference.shape != points.shape
+            or points.shape[1] == 0
+            or np.max(np.sum((points - self._reference) ** 2, axis=0))
+            > (0.5 * self.skin) ** 2
+        ):
+            self.pairs = build_neighbor_list(points, self.cutoff + self.skin)
+            self._reference = points.copy()
+            self.rebuilds += 1
+        return self.pairs
+
+    def evaluate(self, points):
+        """
+        Evaluate the forces on particles at points of shape (3, n).
+
+        Returns a dictionary with the total "force", its parts
+        "magnet_force" and "interaction_force" and the induced "moment",
+        all of shape (3, n).
+        """
+        points = np.asarray(points, dtype=np.float64)
+        p = self.magnetic_parameters
+        field = evaluate_magnetic_field_batch(*points, p, workspace=self.workspace)
+        magnet_force = evaluate_magnetic_force_batch(
+            *points, p, self.magnetic_volume, workspace=self.workspace
+        )
+        moment = evaluate_induced_moments(field, p, self.magnetic_volume)
+        interaction_force = evaluate_dipole_forces(
+            points,
+            moment,
+            self.get_pairs(points),
+            p["magnetic_permeability"],
+            2 * p["radius_particle"],
+            self.cutoff,
+        )
+        return {
+            "force": magnet_force + interaction_force,
+            "magnet_force": magnet_force,
+            "interaction_force": interaction_force,
+            "moment": moment,
+        }
+
+
+def step_particles(interactions, points, time_step, n_steps, callback=None):
+    """
+    Move particles with their magnetic drift velocity F / (6 pi eta a).
+
+    The overdamped trajectories of all particles (shape (3, n)) advance
+    together with explicit Euler steps, the forces of each step from
+    interactions.evaluate. Particles that enter the magnet are captured and
+    stay in place, the stepping ends early once all are captured.
+    callback(step, points, captured) is called after every step.
+
+    Returns a dictionary with the final "points" and the "captured" mask.
+    """
+    p = interactions.magnetic_parameters
+    points = np.array(points, dtype=np.float64)
+    mobility = time_step / get_drag_coefficient(p)
+    captured = is_inside_magnet(*points, p)
+    for step in range(n_steps):
+        active = np.nonzero(~captured)[0]
+        if not len(active):
+            break
+        force = interactions.evaluate(points[:, active])["force"]
+        points[:, active] += mobility * force
+        captured[active] = is_inside_magnet(*points[:, active], p)
+        if callback is not None:
+            callback(step, points, captured)
+    return {"points": points, "captured": captured}
@@ -0,0 +1,212 @@
+import multiprocessing
+
+import numpy as np
+import scipy.optimize
+
+from magnetism.batch_evaluation import Workspace
+from magnetism.coordinate_transformation import is_inside_magnet
+from magnetism.field_map import QUANTITIES
+
+# objectives to maximize as functions of the force (3, n) at the target
+# points and the unit direction of interest
+OBJECTIVES = {
+    "mean_force": lambda force, direction: np.mean(np.linalg.norm(force, axis=0)),
+    "min_force": lambda force, direction: np.min(np.linalg.norm(force, axis=0)),
+    "mean_directed_force": lambda force, direction: np.mean(direction @ force),
+    "min_directed_force": lambda force, direction: np.min(direction @ force),
+}
+
+# target points and workspace of the current (worker) process
+_points = None
+_workspace = None
+
+
+def _initialize_worker(points):
+    global _points, _workspace
+    _points = points
+    _workspace = Workspace()
+
+
+def _evaluate_candidate(task):
+    # objective of one magnet configuration at all target points; points
+    # inside the magnet are occupied by it and feel no force
+    magnetic_parameters, objective, direction = task
+    force = QUANTITIES["force"](*_points, magnetic_parameters, workspace=_workspace)
+    force[:, is_inside_magnet(*_points, magnetic_parameters)] = 0
+    return float(OBJECTIVES[objective](force, direction))
+
+
+class PlacementObjective:
+    """
+    Batched objective of magnet configurations over a set of target points.
+
+    The configurations vary the magnetic parameters named in bounds
+    ({"x_position": (low, high), "rotation_y": ..., "radius_magnet": ...})
+    around magnetic_parameters. Each configuration is evaluated with one
+    batch kernel call for all target points (shape (3, n) or (n, 3)); the
+    objective is one of OBJECTIVES, where direction is the unit vector of
+    the directed force objectives. Candidates are given in coordinates
+    scaled to [0, 1] per parameter, evaluated by the given number of worker
+    processes and cached, so repeated configurations are never evaluated
+    twice. Use as a context manager or call close to stop the workers.
+    """
+
+    def __init__(
+        self,
+        magnetic_parameters,
+        bounds,
+        points,
+        objective="mean_force",
+        direction=None,
+        workers=1,
+    ):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Invalid objective, expected one of {list(OBJECTIVES)}.")
+        points = np.asarray(points, dtype=np.float64)
+        self.points = points if points.shape[0] == 3 else points.T
+        self.magnetic_parameters = magnetic_parameters
+        self.names = list(bounds)
+        self.bounds = np.array([bounds[name] for name in self.names], dtype=np.float64)
+        self.objective = objective
+        self.direction = None
+        if "directed" in objective:
+            if direction is None or not np.linalg.norm(direction) > 0:
+                raise ValueError(f"The objective {objective} needs a direction.")
+            self.direction = np.asarray(direction, dtype=np.float64)
+            self.direction /= np.linalg.norm(self.direction)
+        self.cache = {}
+        self.evaluations = 0
+        self.cache_hits = 0
+        self._pool = None
+        if workers > 1:
+            self._pool = multiprocessing.Pool(
+                workers, _initialize_worker, (self.points,)
+            )
+
+    def get_parameters(self, candidate):
+        """Return the magnetic parameters of a scaled candidate."""
+        low, high = self.bounds.T
+        values = low + np.clip(candidate, 0, 1) * (high - low)
+        parameters = dict(self.magnetic_parameters)
+        parameters.update(zip(self.names, values.tolist()))
+        return parameters
+
+    def evaluate(self, candidates):
+        """Return the objective of scaled candidates of shape (m, d)."""
+        candidates = np.atleast_2d(np.asarray(candidates, dtype=np.float64))
+        keys = [tuple(np.round(candidate, 12)) for candidate in candidates]
+        new = list(dict.fromkeys(key for key in keys if key not in self.cache))
+        self.cache_hits += len(keys) - len(new)
+        tasks = [
+            (self.get_parameters(np.array(key)), self.objective, self.direction)
+            for key in new
+        ]
+        if self._pool is not None:
+            values = self._pool.map(_evaluate_candidate, tasks)
+        else:
+            if _points is not self.points:
+                _initialize_worker(self.points)
+            values = [_evaluate_candidate(task) for task in tasks]
+        self.evaluations += len(tasks)
+        self.cache.update(zip(new, values))
+        return np.array([self.cache[key] for key in keys])
+
+    def evaluate_gradient(self, candidate, step=1e-6):
+        """
+        Return the objective and its gradient at a scaled candidate.
+
+        The gradient uses central differences whose 2 d neighbours are
+        evaluated in one batch with the candidate, one-sided at the bounds.
+        """
+        candidate = np.asarray(candidate, dtype=np.float64)
+        d = len(candidate)
+        upper = np.minimum(candidate + step, 1.0)
+        lower = np.maximum(candidate - step, 0.0)
+        neighbours = np.repeat(candidate[None, :], 2 * d, axis=0)
+        neighbours[np.arange(d), np.arange(d)] = upper
+        neighbours[d + np.arange(d), np.arange(d)] = lower
+        values = self.evaluate(np.vstack([candidate, neighbours]))
+        gradient = (values[1 : d + 1] - values[d + 1 :]) / (upper - lower)
+        return values[0], gradient
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def optimize_placement(
+    objective,
+    method="population",
+    x0=None,
+    maxiter=100,
+    popsize=15,
+    tol=1e-6,
+    seed=None,
+):
+    """
+    Maximize a PlacementObjective.
+
+    The "population" method is differential evolution, which evaluates each
+    generation of popsize * d candidates in one batch; the "gradient"
+    method is L-BFGS-B from x0 (scaled candidate, default the centre of the
+    bounds) with batched central difference gradients. A common design
+    study runs the population search first and refines its result with the
+    gradient search.
+
+    Returns a dictionary with the best "parameters", its scaled
+    "candidate" and objective "value", the numbers of "iterations", of
+    evaluated configurations ("evaluations", cumulative for the objective)
+    and of "cache_hits", and the "message" of the optimizer.
+    """
+    d = len(objective.names)
+    if method == "population":
+        result = scipy.optimize.differential_evolution(
+            lambda candidates: -objective.evaluate(candidates.T),
+            [(0.0, 1.0)] * d,
+            maxiter=maxiter,
+            popsize=popsize,
+            tol=tol,
+            seed=seed,
+            polish=False,
+            updating="deferred",
+            vectorized=True,
+            x0=x0,
+        )
+    elif method == "gradient":
+        x0 = np.full(d, 0.5) if x0 is None else np.asarray(x0, dtype=np.float64)
+        # forces are tiny in the base units, scale the objective to order one
+        # for the absolute tolerances of L-BFGS-B
+        scale = abs(objective.evaluate(x0)[0]) or 1.0
+
+        def negative(candidate):
+            value, gradient = objective.evaluate_gradient(candidate)
+            return -value / scale, -gradient / scale
+
+        result = scipy.optimize.minimize(
+            negative,
+            x0,
+            jac=True,
+            method="L-BFGS-B",
+            bounds=[(0.0, 1.0)] * d,
+            options={"maxiter": maxiter, "ftol": tol},
+        )
+    else:
+        raise ValueError("Invalid optimization method.")
+
+    return {
+        "parameters": objective.get_parameters(result.x),
+        "candidate": result.x,
+        "value": objective.evaluate(result.x)[0],
+        "iterations": int(result.nit),
+        "evaluations": objective.evaluations,
+        "cache_hits": objective.cache_hits,
+        "message": str(result.message),
+    }
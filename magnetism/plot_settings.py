@@ -40,7 +40,3 @@ def set_params(params_rc=None):
     if params_rc is None:
         params_rc = {}
     plt.rcParams.update({**params_rc_default, **params_rc})
-
-
-# Set default Matplotlib parameters
-set_params()
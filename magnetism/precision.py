@@ -0,0 +1,66 @@
+import numpy as np
+
+# points per kernel call in reduced precision, bounds the float64 temporaries
+CHUNK_POINTS = 65536
+
+
+def as_dtype(value, dtype=None):
+    """
+    Convert a value to the floating point type of the evaluation.
+
+    Without a dtype the value is returned unchanged, so the default double
+    precision path does not pay for any conversion.
+    """
+    if dtype is None:
+        return value
+    return np.asarray(value, dtype=dtype)
+
+
+def evaluate_in_chunks(function, x, y, z, dtype, chunk_size=CHUNK_POINTS):
+    """
+    Evaluate function(x, y, z) -> (3 components) in chunks into dtype arrays.
+
+    The points are converted to dtype first and the results are stored in
+    dtype, so only the temporaries of one chunk exist in the precision the
+    function computes in.
+    """
+    x, y, z = np.broadcast_arrays(*(as_dtype(c, dtype) for c in (x, y, z)))
+    shape = x.shape
+    x, y, z = (c.ravel() for c in (x, y, z))
+    result = np.empty((3, x.size), dtype=dtype)
+    for start in range(0, x.size, chunk_size):
+        chunk = slice(start, start + chunk_size)
+        result[:, chunk] = function(x[chunk], y[chunk], z[chunk])
+    return tuple(result.reshape((3,) + shape))
+
+
+def evaluate_precision_error(x, y, z, magnetic_parameters, dtype=np.float32):
+    """
+    Measure the error of a reduced precision evaluation against float64.
+
+    Field and force are evaluated at the given points in both precisions. The
+    error of each point is the norm of the deviation relative to the norm of
+    the float64 result. Returns a dictionary with the maximum and the 99th
+    percentile of the relative error for "field" and "force".
+    """
+    from magnetism.magnetic_field import evaluate_magnetic_field
+    from magnetism.magnetic_force import evaluate_magnetic_force
+
+    x, y, z = (np.asarray(c, dtype=np.float64).ravel() for c in (x, y, z))
+
+    errors = {}
+    for quantity, evaluate in [
+        ("field", evaluate_magnetic_field),
+        ("force", evaluate_magnetic_force),
+    ]:
+        reference = np.array(evaluate(x, y, z, magnetic_parameters))
+        reduced = np.array(evaluate(x, y, z, magnetic_parameters, dtype=dtype))
+        deviation = np.sqrt(np.sum((reduced - reference) ** 2, axis=0))
+        magnitude = np.sqrt(np.sum(reference**2, axis=0))
+        relative_error = deviation / magnitude
+        errors[quantity] = {
+            "max": np.max(relative_error),
+            "p99": np.percentile(relative_error, 99),
+        }
+
+    return errors
@@ -0,0 +1,303 @@
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import os
+import socket
+import time
+
+import numpy as np
+
+from magnetism.field_map import QUANTITIES
+
+DEFAULT_LATENCY_WINDOW = 0.002  # s
+
+DEFAULT_MAX_BATCH_POINTS = 65536
+
+# upper bound of the JSON size of one point, sizes the request lines accepted
+BYTES_PER_POINT = 96
+
+
+class QueryService:
+    """
+    Local service answering field and force queries in micro-batches.
+
+    Requests arriving within latency_window seconds of the first pending
+    request of a quantity are evaluated together in one call of the batch
+    kernel; a batch is evaluated early once it holds max_batch_points
+    points. Clients exchange newline-delimited JSON over a Unix socket or a
+    local TCP port:
+
+        {"id": 1, "quantity": "field", "points": [[x, y, z], ...]}
+        -> {"id": 1, "values": [[H_x, H_y, H_z], ...]}
+
+        {"id": 2, "command": "statistics"} -> {"id": 2, "statistics": {...}}
+
+    A request line may hold up to max_batch_points points (at least 64 KiB);
+    longer lines are answered with an error.
+    """
+
+    def __init__(
+        self,
+        magnetic_parameters,
+        latency_window=DEFAULT_LATENCY_WINDOW,
+        max_batch_points=DEFAULT_MAX_BATCH_POINTS,
+    ):
+        self.magnetic_parameters = magnetic_parameters
+        self.latency_window = latency_window
+        self.max_batch_points = max_batch_points
+        self.line_limit = max(2**16, BYTES_PER_POINT * max_batch_points)
+        self._pending = {quantity: [] for quantity in QUANTITIES}
+        self._pending_points = dict.fromkeys(QUANTITIES, 0)
+        self._timers = {}
+        self._batch_requests = collections.deque(maxlen=10000)
+        self._batch_points = collections.deque(maxlen=10000)
+        self._latencies = collections.deque(maxlen=10000)
+        self._n_requests = 0
+        self._n_points = 0
+
+    async def evaluate(self, quantity, points):
+        """Queue points of shape (n, 3) and wait for their values (n, 3)."""
+        if quantity not in QUANTITIES:
+            raise ValueError("Invalid quantity.")
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[quantity].append((points, future, time.perf_counter()))
+        self._pending_points[quantity] += len(points)
+
+        if self._pending_points[quantity] >= self.max_batch_points:
+            self._flush(quantity)
+        elif quantity not in self._timers:
+            self._timers[quantity] = asyncio.get_running_loop().call_later(
+                self.latency_window, self._flush, quantity
+            )
+        return await future
+
+    def _flush(self, quantity):
+        timer = self._timers.pop(quantity, None)
+        if timer is not None:
+            timer.cancel()
+        requests = self._pending[quantity]
+        self._pending[quantity] = []
+        self._pending_points[quantity] = 0
+        if not requests:
+            return
+
+        points = np.concatenate([request[0] for request in requests])
+        try:
+            values = QUANTITIES[quantity](*points.T, self.magnetic_parameters).T
+        except Exception as error:
+            for _, future, _ in requests:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        finished = time.perf_counter()
+        start = 0
+        for request_points, future, queued in requests:
+            stop = start + len(request_points)
+            if not future.done():
+                future.set_result(values[start:stop])
+            self._latencies.append(finished - queued)
+            start = stop
+        self._batch_requests.append(len(requests))
+        self._batch_points.append(len(points))
+        self._n_requests += len(requests)
+        self._n_points += len(points)
+
+    def get_statistics(self):
+        """
+        Return request, batch-size and latency statistics.
+
+        Batch sizes and latencies (from queueing a request to its result, in
+        seconds) cover the last 10000 batches and requests.
+        """
+        statistics = {
+            "requests": self._n_requests,
+            "points": self._n_points,
+            "batches": len(self._batch_points),
+        }
+        if self._batch_points:
+            latencies = np.array(self._latencies)
+            statistics.update(
+                {
+                    "mean_batch_requests": float(np.mean(self._batch_requests)),
+                    "mean_batch_points": float(np.mean(self._batch_points)),
+                    "max_batch_points": int(np.max(self._batch_points)),
+                    "latency_p50": float(np.percentile(latencies, 50)),
+                    "latency_p99": float(np.percentile(latencies, 99)),
+                    "latency_max": float(latencies.max()),
+                }
+            )
+        return statistics
+
+    async def _answer(self, message, writer, lock):
+        response = {"id": message.get("id")}
+        try:
+            if message.get("command") == "statistics":
+                response["statistics"] = self.get_statistics()
+            else:
+                values = await self.evaluate(message["quantity"], message["points"])
+                response["values"] = values.tolist()
+        except (KeyError, TypeError, ValueError) as error:
+            response["error"] = f"{type(error).__name__}: {error}"
+        except Exception as error:
+            # e.g. a failing kernel; the client is waiting for a reply
+            logging.exception("The request %s failed.", response["id"])
+            response["error"] = f"{type(error).__name__}: {error}"
+        await self._send(response, writer, lock)
+
+    @staticmethod
+    async def _send(response, writer, lock):
+        # replies of concurrent requests must not interleave
+        async with lock:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+
+    @staticmethod
+    async def _read_line(reader):
+        # the next line, None for a line beyond the limit of the reader, which
+        # is skipped, or b"" at the end of the stream
+        try:
+            return await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as error:
+            return error.partial
+        except asyncio.LimitOverrunError:
+            pass
+        while True:
+            try:
+                await reader.readuntil(b"\n")
+                return None
+            except asyncio.LimitOverrunError as error:
+                await reader.readexactly(error.consumed)
+            except asyncio.IncompleteReadError:
+                return None
+
+    async def handle_client(self, reader, writer):
+        """Answer the requests of one connection, several may be in flight."""
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while (line := await self._read_line(reader)) != b"":
+                if line is None:
+                    error = f"The request exceeds {self.line_limit} bytes."
+                    await self._send({"error": error}, writer, lock)
+                    continue
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError as error:
+                    await self._send({"error": str(error)}, writer, lock)
+                    continue
+                task = asyncio.create_task(self._answer(message, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def start(self, path=None, host="127.0.0.1", port=0):
+        """Start serving on the Unix socket path or on host:port."""
+        if path is not None:
+            return await asyncio.start_unix_server(
+                self.handle_client, path, limit=self.line_limit
+            )
+        return await asyncio.start_server(
+            self.handle_client, host, port, limit=self.line_limit
+        )
+
+
+class QueryClient:
+    """
+    Blocking client of a QueryService.
+
+        with QueryClient(path="/tmp/magnetism.sock") as client:
+            H_x, H_y, H_z = client.evaluate("field", x, y, z)
+    """
+
+    def __init__(self, path=None, host="127.0.0.1", port=None):
+        if path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(path)
+        else:
+            self.socket = socket.create_connection((host, port))
+        self.file = self.socket.makefile("rwb")
+        self._next_id = 0
+
+    def _request(self, message):
+        self._next_id += 1
+        message["id"] = self._next_id
+        self.file.write(json.dumps(message).encode() + b"\n")
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response
+
+    def evaluate(self, quantity, x, y, z):
+        """Evaluate a quantity at the points x, y, z; returns shape (3,) + shape."""
+        x, y, z = np.broadcast_arrays(x, y, z)
+        points = np.stack([x.ravel(), y.ravel(), z.ravel()], axis=1)
+        response = self._request({"quantity": quantity, "points": points.tolist()})
+        return np.array(response["values"]).T.reshape((3,) + x.shape)
+
+    def get_statistics(self):
+        """Return the statistics of the service."""
+        return self._request({"command": "statistics"})["statistics"]
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    """Serve field and force queries for the magnet of a JSON configuration."""
+    parser = argparse.ArgumentParser(
+        description="Answer field and force queries of local clients in "
+        "micro-batches.",
+    )
+    parser.add_argument("config", help='JSON file with "magnetic_parameters"')
+    parser.add_argument("--socket", help="path of the Unix socket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--latency-window",
+        type=float,
+        default=1e3 * DEFAULT_LATENCY_WINDOW,
+        help="time in ms to collect requests into a batch (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-batch-points", type=int, default=DEFAULT_MAX_BATCH_POINTS
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.config) as file:
+        magnetic_parameters = json.load(file)["magnetic_parameters"]
+    service = QueryService(
+        magnetic_parameters, 1e-3 * args.latency_window, args.max_batch_points
+    )
+
+    async def serve():
+        server = await service.start(args.socket, args.host, args.port)
+        print(f"Serving on {args.socket or f'{args.host}:{args.port}'}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print(json.dumps(service.get_statistics(), indent=2))
+    finally:
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
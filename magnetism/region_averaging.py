@@ -0,0 +1,256 @@
+import itertools
+
+import numpy as np
+
+from magnetism.batch_evaluation import Workspace
+from magnetism.coordinate_transformation import is_inside_magnet
+from magnetism.field_map import QUANTITIES
+
+# number of quadrature points evaluated per kernel call
+CHUNK_POINTS = 65536
+
+# integrands as (kernel, reduction of the (3, n) kernel values)
+INTEGRANDS = {
+    "field": ("field", lambda values, p: values),
+    "field_magnitude": ("field", lambda values, p: np.linalg.norm(values, axis=0)),
+    "field_energy": (
+        "field",
+        lambda values, p: 0.5 * p["magnetic_permeability"] * np.sum(values**2, axis=0),
+    ),
+    "force": ("force", lambda values, p: values),
+    "force_magnitude": ("force", lambda values, p: np.linalg.norm(values, axis=0)),
+}
+
+
+def get_gauss_rule(order, d):
+    """Return the tensor Gauss-Legendre nodes (m, d) and weights (m,) on [0, 1]^d."""
+    nodes, weights = np.polynomial.legendre.leggauss(order)
+    nodes, weights = 0.5 * (nodes + 1), 0.5 * weights
+    return (
+        np.array(list(itertools.product(nodes, repeat=d))),
+        np.prod(list(itertools.product(weights, repeat=d)), axis=1),
+    )
+
+
+def _integrate_adaptive(
+    mapping,
+    d,
+    magnetic_parameters,
+    quantity,
+    rtol,
+    atol,
+    order,
+    max_level,
+    max_evaluations,
+    exclude_magnet,
+):
+    # integrate over the image of the unit cube [0, 1]^d under mapping, which
+    # returns the points (3, n) and the Jacobian determinant (n,) of reference
+    # coordinates (n, d); the measure of the excluded magnet is integrated
+    # along as the last component, without taking part in the refinement
+    kernel, reduce = INTEGRANDS[quantity]
+    nodes, weights = get_gauss_rule(order, d)
+    children = np.array(list(itertools.product([0.0, 0.5], repeat=d)))
+    workspace = Workspace()
+    n_evaluations = 0
+
+    def integrate_cells(lower, size):
+        # Gauss rule on each cell (lower (n, d), edge length size), in chunks
+        # of at most CHUNK_POINTS points
+        nonlocal n_evaluations
+        cells_per_chunk = max(1, CHUNK_POINTS // len(nodes))
+        estimates = []
+        for start in range(0, len(lower), cells_per_chunk):
+            cells = lower[start : start + cells_per_chunk]
+            reference = cells[:, None, :] + size * nodes[None, :, :]
+            points, jacobian = mapping(reference.reshape(-1, d))
+            values = reduce(
+                QUANTITIES[kernel](*points, magnetic_parameters, workspace=workspace),
+                magnetic_parameters,
+            )
+            n_evaluations += points.shape[1]
+            inside = np.zeros(points.shape[1], dtype=bool)
+            if exclude_magnet:
+                inside = is_inside_magnet(*points, magnetic_parameters)
+                values = np.where(inside, 0, values)
+            values = np.vstack([np.atleast_2d(values), inside]) * jacobian
+            values = values.reshape(-1, len(cells), len(nodes))
+            estimates.append(size**d * np.einsum("qcn,n->cq", values, weights))
+        return np.concatenate(estimates)
+
+    lower = np.zeros((1, d))
+    size = 1.0
+    estimate = integrate_cells(lower, size)
+    estimate_error = np.full(1, np.inf)
+    integral = 0.0
+    error = 0.0
+    converged = True
+    for level in range(max_level + 1):
+        n_new = len(lower) * 2**d * len(nodes)
+        if n_evaluations + n_new > max_evaluations:
+            # out of budget: keep the remaining cells with the error of
+            # their parents
+            integral = integral + estimate.sum(axis=0)
+            error += estimate_error.sum()
+            converged = False
+            break
+
+        child_lower = (lower[:, None, :] + size * children).reshape(-1, d)
+        child_estimate = integrate_cells(child_lower, 0.5 * size)
+        refined = child_estimate.reshape(len(lower), 2**d, -1).sum(axis=1)
+        cell_error = np.linalg.norm(refined[:, :-1] - estimate[:, :-1], axis=1)
+
+        # a cell is accepted if its error is below its share of the tolerance
+        total = np.linalg.norm((integral + refined.sum(axis=0))[:-1])
+        allowed = max(rtol * total, atol) * size**d
+        accepted = cell_error <= allowed
+        if level == max_level:
+            converged = accepted.all()
+            accepted[:] = True
+        integral = integral + refined[accepted].sum(axis=0)
+        error += cell_error[accepted].sum()
+
+        split = np.repeat(~accepted, 2**d)
+        lower = child_lower[split]
+        estimate = child_estimate[split]
+        estimate_error = np.repeat(cell_error[~accepted] / 2**d, 2**d)
+        size *= 0.5
+        if not len(lower):
+            break
+
+    return integral[:-1], error, n_evaluations, converged, integral[-1]
+
+
+def _summarize(integral, error, n_evaluations, converged, excluded, measure):
+    # measure is that of the whole region, excluded that of the magnet in it
+    integral = integral[0] if len(integral) == 1 else integral
+    measure = measure - excluded
+    return {
+        "integral": integral,
+        "mean": integral / measure,
+        "error": error,
+        "converged": converged,
+        "measure": measure,
+        "evaluations": n_evaluations,
+    }
+
+
+def integrate_box(
+    bounds,
+    magnetic_parameters,
+    quantity="force",
+    rtol=1e-4,
+    atol=0.0,
+    order=4,
+    max_level=8,
+    max_evaluations=2_000_000,
+    exclude_magnet=True,
+):
+    """
+    Integrate a quantity over an axis-aligned box or rectangle.
+
+    bounds are [[x_min, x_max], [y_min, y_max], [z_min, z_max]]; an axis with
+    equal limits gives a planar rectangle. quantity is one of INTEGRANDS:
+    "field" and "force" (vectors), "field_magnitude", "force_magnitude" and
+    "field_energy" (the density mu_0 |H|^2 / 2). The region is integrated
+    with tensor Gauss-Legendre rules of the given order on cells that are
+    halved until the difference between a cell and its children is below its
+    share of max(rtol * |integral|, atol), e.g. around the edges of the
+    magnet. Refinement stops after max_level levels or before exceeding
+    max_evaluations kernel evaluations. The magnet itself is excluded from
+    the region unless exclude_magnet is False.
+
+    Returns a dictionary with the "integral", the "mean" over the region,
+    the "error" estimate, whether the tolerance was met ("converged"), the
+    "measure" (volume or area) of the region and the number of kernel
+    "evaluations". The mean and the measure are those of the region without
+    the part inside an excluded magnet, integrated with the same cells.
+    """
+    bounds = np.asarray(bounds, dtype=np.float64)
+    axes = np.nonzero(bounds[:, 1] > bounds[:, 0])[0]
+    extent = bounds[axes, 1] - bounds[axes, 0]
+    measure = float(np.prod(extent))
+
+    def mapping(reference):
+        points = np.repeat(bounds[:, :1], len(reference), axis=1)
+        points[axes] += (reference * extent).T
+        return points, np.full(len(reference), measure)
+
+    return _summarize(
+        *_integrate_adaptive(
+            mapping,
+            len(axes),
+            magnetic_parameters,
+            quantity,
+            rtol,
+            atol,
+            order,
+            max_level,
+            max_evaluations,
+            exclude_magnet,
+        ),
+        measure,
+    )
+
+
+def integrate_cylinder(
+    center,
+    axis,
+    radius,
+    length,
+    magnetic_parameters,
+    quantity="force",
+    rtol=1e-4,
+    atol=0.0,
+    order=4,
+    max_level=8,
+    max_evaluations=2_000_000,
+    exclude_magnet=True,
+):
+    """
+    Integrate a quantity over a cylinder or disk.
+
+    The cylinder has the given center, axis direction, radius and length; a
+    length of 0 gives a disk, e.g. the cross-section of a channel. The
+    integration and the result are as for integrate_box, in polar
+    coordinates of the cylinder.
+    """
+    center = np.asarray(center, dtype=np.float64)
+    axis = np.asarray(axis, dtype=np.float64)
+    axis = axis / np.linalg.norm(axis)
+    # orthonormal basis of the cross-section
+    helper = np.eye(3)[np.argmin(np.abs(axis))]
+    e_1 = np.cross(axis, helper)
+    e_1 /= np.linalg.norm(e_1)
+    e_2 = np.cross(axis, e_1)
+    d = 3 if length > 0 else 2
+    measure = np.pi * radius**2 * (length if length > 0 else 1.0)
+
+    def mapping(reference):
+        r = radius * reference[:, 0]
+        theta = 2 * np.pi * reference[:, 1]
+        h = length * (reference[:, 2] - 0.5) if d == 3 else 0.0
+        points = (
+            center[:, None]
+            + (r * np.cos(theta)) * e_1[:, None]
+            + (r * np.sin(theta)) * e_2[:, None]
+            + h * axis[:, None]
+        )
+        jacobian = 2 * np.pi * radius * r * (length if d == 3 else 1.0)
+        return points, jacobian
+
+    return _summarize(
+        *_integrate_adaptive(
+            mapping,
+            d,
+            magnetic_parameters,
+            quantity,
+            rtol,
+            atol,
+            order,
+            max_level,
+            max_evaluations,
+            exclude_magnet,
+        ),
+        measure,
+    )
@@ -0,0 +1,102 @@
+import numpy as np
+
+from magnetism.coordinate_transformation import (
+    transform_coordinates_forward,
+    transform_vector_backward,
+)
+from magnetism.instrumentation import instrumented
+from magnetism.magnetic_field import (
+    evaluate_magnetic_field_cylindrical,
+    get_magnetization_components,
+)
+from magnetism.magnetic_force import DERIVATIVE_STEP
+from magnetism.magnetisation_model import evaluate_magnetisation_model
+
+
+def _get_axial_magnetization(magnetic_parameters):
+    # the ring models only support a magnetization along the axis
+    M_axial, M_transverse, _ = get_magnetization_components(magnetic_parameters)
+    if M_transverse != 0:
+        raise ValueError("Ring magnets must be magnetized along their axis.")
+    return M_axial
+
+
+def _evaluate_ring_field_cylindrical(rho, z, magnetic_parameters):
+    # field of the outer minus the inner cylinder, both evaluated in one pass:
+    # the radii are stacked along a new leading axis, so the terms depending
+    # only on z and rho are shared
+    R = np.array(
+        [magnetic_parameters["radius_magnet"], magnetic_parameters["radius_inner"]]
+    ).reshape((2,) + (1,) * np.ndim(rho))
+    H_rho, H_z = evaluate_magnetic_field_cylindrical(
+        rho,
+        z,
+        R,
+        0.5 * magnetic_parameters["length"],
+        _get_axial_magnetization(magnetic_parameters),
+    )
+    return H_rho[0] - H_rho[1], H_z[0] - H_z[1]
+
+
+@instrumented("ring_magnet.field")
+def evaluate_ring_magnetic_field(x, y, z, magnetic_parameters):
+    """
+    Calculate magnetic field H of a ring (hollow cylinder) magnet.
+
+    The ring has the outer radius "radius_magnet" and the inner radius
+    "radius_inner"; its field is the difference of the fields of two coaxial
+    cylinders of the same length and magnetization, which has to be axial
+    ("magnetization_direction" along +-z or not given).
+    """
+    rho, phi, z = transform_coordinates_forward(x, y, z, magnetic_parameters)
+    H_rho, H_z = _evaluate_ring_field_cylindrical(rho, z, magnetic_parameters)
+
+    # inside the ring: subtract the magnetization M
+    inside = (
+        (rho >= magnetic_parameters["radius_inner"])
+        & (rho < magnetic_parameters["radius_magnet"])
+        & (np.abs(z) < 0.5 * magnetic_parameters["length"])
+    )
+    M_axial = _get_axial_magnetization(magnetic_parameters)
+    H_z = np.where(inside, H_z - M_axial, H_z)
+
+    return transform_vector_backward(H_rho, H_z, phi, magnetic_parameters)
+
+
+@instrumented("ring_magnet.force")
+def evaluate_ring_magnetic_force(x, y, z, magnetic_parameters, magnetic_volume=None):
+    """
+    Evaluate the magnetic force of a ring magnet at a given point in space.
+
+    The force mu_0 f_H grad(|H|^2) / 2 uses the radial derivatives of the
+    field from central differences. The field and its two neighbours of both
+    cylinders are evaluated in one pass; the axial derivatives follow from
+    the field being curl- and divergence-free outside the magnet.
+    """
+    rho, phi, z = transform_coordinates_forward(x, y, z, magnetic_parameters)
+    h = DERIVATIVE_STEP * magnetic_parameters["radius_magnet"]
+
+    # the field at rho and rho +- h, mirrored at the axis where rho < h
+    offsets = np.array([0.0, h, -h]).reshape((3,) + (1,) * np.ndim(rho))
+    rho_offset = rho + offsets
+    H_rho, H_z = _evaluate_ring_field_cylindrical(
+        np.abs(rho_offset), z, magnetic_parameters
+    )
+    H_rho = np.sign(rho_offset) * H_rho
+
+    dH_rho = (H_rho[1] - H_rho[2]) / (2 * h)
+    dH_z = (H_z[1] - H_z[2]) / (2 * h)
+    H_rho, H_z = H_rho[0], H_z[0]
+    H_rho_over_rho = np.where(rho > h, H_rho / rho, dH_rho)
+
+    # curl H = 0: dH_rho/dz = dH_z/drho, div H = 0: dH_z/dz from dH_rho/drho
+    gradient_rho = 2 * (H_rho * dH_rho + H_z * dH_z)
+    gradient_z = 2 * (H_rho * dH_z - H_z * (dH_rho + H_rho_over_rho))
+
+    f_H = evaluate_magnetisation_model(
+        magnetic_parameters, np.hypot(H_rho, H_z), magnetic_volume
+    )
+    scale = 0.5 * magnetic_parameters["magnetic_permeability"] * f_H
+    return transform_vector_backward(
+        scale * gradient_rho, scale * gradient_z, phi, magnetic_parameters
+    )
@@ -0,0 +1,367 @@
+import argparse
+import hashlib
+import json
+import os
+import socket
+import time
+
+import numpy as np
+
+from magnetism.batch_evaluation import Workspace
+from magnetism.field_map import QUANTITIES, get_grid_axes, get_grid_points
+
+JOB_MANIFEST = "job.json"
+
+# seconds between refreshes of the lock of a shard that is being evaluated
+HEARTBEAT_INTERVAL = 10.0
+
+
+def _get_hash(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def _get_file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(2**20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json(path, data):
+    # write to a temporary file first, readers never see partial manifests
+    temporary_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as file:
+        json.dump(data, file, indent=2)
+    os.replace(temporary_path, path)
+
+
+def _read_json(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def create_shards(
+    directory,
+    magnetic_parameters,
+    grid=None,
+    points=None,
+    quantities=("field", "force"),
+    shard_size=1_000_000,
+):
+    """
+    Split a map into shards for independent workers.
+
+    The map is either a grid ({"x": [start, stop, num], ...}, see
+    field_map.get_grid_axes) or the path of a .npy file of points of shape
+    (n, 3) on the shared filesystem. directory receives job.json with the
+    magnetic parameters and a hash of everything that determines the result,
+    and one manifest per shard in shards/ with the hash, its index range and
+    its output path. Returns the job manifest.
+    """
+    if (grid is None) == (points is None):
+        raise ValueError("Either grid or points must be given.")
+    if grid is not None:
+        n_points = int(np.prod([int(grid[axis][2]) for axis in "xyz"]))
+    else:
+        points = os.path.abspath(points)
+        n_points = len(np.load(points, mmap_mode="r"))
+
+    job = {
+        "magnetic_parameters": magnetic_parameters,
+        "grid": grid,
+        "points": points,
+        "quantities": list(quantities),
+        "n_points": n_points,
+    }
+    job["parameters_hash"] = _get_hash(job)
+    job["shards"] = []
+
+    os.makedirs(os.path.join(directory, "shards"), exist_ok=True)
+    for index, start in enumerate(range(0, n_points, shard_size)):
+        name = f"shard-{index:05d}"
+        shard = {
+            "parameters_hash": job["parameters_hash"],
+            "index": index,
+            "start": start,
+            "stop": min(start + shard_size, n_points),
+            "output": os.path.join("shards", f"{name}.npz"),
+        }
+        _write_json(os.path.join(directory, "shards", f"{name}.json"), shard)
+        job["shards"].append(os.path.join("shards", f"{name}.json"))
+
+    _write_json(os.path.join(directory, JOB_MANIFEST), job)
+    return job
+
+
+def _get_paths(directory, manifest):
+    stem = os.path.join(directory, manifest[: -len(".json")])
+    return stem + ".lock", stem + ".done"
+
+
+def _is_stale(path, lock_timeout):
+    return time.time() - os.path.getmtime(path) > lock_timeout
+
+
+def _remove_stale_lock(lock_path, lock_timeout):
+    # move an abandoned lock aside before removing it: of several workers
+    # taking it over only one can rename it, and a fresh lock that another
+    # worker created after the staleness check is put back untouched
+    try:
+        if not _is_stale(lock_path, lock_timeout):
+            return
+        stale_path = f"{lock_path}.{socket.gethostname()}.{os.getpid()}.stale"
+        os.rename(lock_path, stale_path)
+    except FileNotFoundError:
+        return
+    if not _is_stale(stale_path, lock_timeout):
+        try:
+            os.link(stale_path, lock_path)
+        except FileExistsError:
+            pass
+    os.remove(stale_path)
+
+
+def claim_shard(directory, lock_timeout=None):
+    """
+    Claim the next unfinished shard of a job.
+
+    A shard is claimed by atomically creating its lock file. Locks older
+    than lock_timeout seconds are considered abandoned by a crashed worker
+    and are taken over, by one worker only; without a timeout they are never
+    taken over. evaluate_shard refreshes the lock every HEARTBEAT_INTERVAL
+    seconds between its chunks, so lock_timeout has to exceed that interval
+    plus the time of one chunk, not the time of a whole shard.
+    Returns the path of the shard manifest or None if no shard is left.
+    """
+    job = _read_json(os.path.join(directory, JOB_MANIFEST))
+    for manifest in job["shards"]:
+        lock_path, done_path = _get_paths(directory, manifest)
+        if os.path.exists(done_path):
+            continue
+        if lock_timeout is not None:
+            _remove_stale_lock(lock_path, lock_timeout)
+        try:
+            descriptor = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            continue
+        with os.fdopen(descriptor, "w") as file:
+            json.dump(
+                {"host": socket.gethostname(), "pid": os.getpid(), "time": time.time()},
+                file,
+            )
+        # the shard may have been finished between the check and the claim
+        if os.path.exists(done_path):
+            os.remove(lock_path)
+            continue
+        return os.path.join(directory, manifest)
+    return None
+
+
+def _refresh_lock(lock_path):
+    # heartbeat of a live worker, see claim_shard
+    try:
+        os.utime(lock_path)
+    except FileNotFoundError:
+        pass
+
+
+def evaluate_shard(directory, manifest_path, chunk_size=65536):
+    """
+    Evaluate a claimed shard, write its output and mark it as done.
+
+    The lock of the shard is refreshed between chunks while it is evaluated.
+    """
+    job = _read_json(os.path.join(directory, JOB_MANIFEST))
+    shard = _read_json(manifest_path)
+    if shard["parameters_hash"] != job["parameters_hash"]:
+        raise ValueError(f"{manifest_path} does not belong to this job.")
+
+    if job["grid"] is not None:
+        axes = get_grid_axes(job["grid"])
+    else:
+        points = np.load(job["points"], mmap_mode="r")
+    lock_path, done_path = _get_paths(
+        directory, os.path.relpath(manifest_path, directory)
+    )
+    heartbeat = time.monotonic()
+    workspace = Workspace(chunk_size)
+    n = shard["stop"] - shard["start"]
+    results = {quantity: np.empty((3, n)) for quantity in job["quantities"]}
+    for start in range(shard["start"], shard["stop"], chunk_size):
+        stop = min(start + chunk_size, shard["stop"])
+        if job["grid"] is not None:
+            x, y, z = get_grid_points(axes, start, stop)
+        else:
+            x, y, z = np.array(points[start:stop], dtype=np.float64).T
+        for quantity, result in results.items():
+            QUANTITIES[quantity](
+                x,
+                y,
+                z,
+                job["magnetic_parameters"],
+                out=result[:, start - shard["start"] : stop - shard["start"]],
+                workspace=workspace,
+            )
+        if time.monotonic() - heartbeat > HEARTBEAT_INTERVAL:
+            _refresh_lock(lock_path)
+            heartbeat = time.monotonic()
+
+    output_path = os.path.join(directory, shard["output"])
+    temporary_path = f"{output_path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as file:
+        np.savez(file, **results)
+    os.replace(temporary_path, output_path)
+
+    _write_json(
+        done_path,
+        {
+            "parameters_hash": job["parameters_hash"],
+            "sha256": _get_file_hash(output_path),
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+        },
+    )
+    # the lock may have been taken over after a lock timeout
+    try:
+        os.remove(lock_path)
+    except FileNotFoundError:
+        pass
+
+
+def run_worker(directory, max_shards=None, lock_timeout=None, chunk_size=65536):
+    """Claim and evaluate shards until none is left; returns their number."""
+    n_shards = 0
+    while max_shards is None or n_shards < max_shards:
+        manifest_path = claim_shard(directory, lock_timeout)
+        if manifest_path is None:
+            break
+        evaluate_shard(directory, manifest_path, chunk_size)
+        n_shards += 1
+    return n_shards
+
+
+def get_job_status(directory):
+    """Return the numbers of done, claimed and open shards of a job."""
+    job = _read_json(os.path.join(directory, JOB_MANIFEST))
+    status = {"done": 0, "claimed": 0, "open": 0}
+    for manifest in job["shards"]:
+        lock_path, done_path = _get_paths(directory, manifest)
+        if os.path.exists(done_path):
+            status["done"] += 1
+        elif os.path.exists(lock_path):
+            status["claimed"] += 1
+        else:
+            status["open"] += 1
+    return status
+
+
+def merge_shards(directory, output_path):
+    """
+    Verify all shards of a job and merge them into one map.
+
+    Every shard must be done for this job and its output must match the
+    checksum and size recorded by its worker, otherwise a ValueError lists
+    the offending shards. The merged .npz has the layout of
+    magnetism-field-map for grids and arrays of shape (3, n) plus the
+    points for point sets.
+    """
+    job = _read_json(os.path.join(directory, JOB_MANIFEST))
+    results = {
+        quantity: np.empty((3, job["n_points"])) for quantity in job["quantities"]
+    }
+    problems = []
+    for manifest in job["shards"]:
+        shard = _read_json(os.path.join(directory, manifest))
+        _, done_path = _get_paths(directory, manifest)
+        output = os.path.join(directory, shard["output"])
+        if not os.path.exists(done_path):
+            problems.append(f"{manifest}: not done")
+            continue
+        done = _read_json(done_path)
+        if done["parameters_hash"] != job["parameters_hash"]:
+            problems.append(f"{manifest}: evaluated for a different job")
+        elif done["sha256"] != _get_file_hash(output):
+            problems.append(f"{manifest}: output does not match its checksum")
+        else:
+            data = np.load(output)
+            n = shard["stop"] - shard["start"]
+            for quantity, result in results.items():
+                if data[quantity].shape != (3, n):
+                    problems.append(f"{manifest}: {quantity} has the wrong shape")
+                    break
+                result[:, shard["start"] : shard["stop"]] = data[quantity]
+    if problems:
+        raise ValueError("Cannot merge shards:\n" + "\n".join(problems))
+
+    extra = {"magnetic_parameters": json.dumps(job["magnetic_parameters"])}
+    if job["grid"] is not None:
+        axes = get_grid_axes(job["grid"])
+        extra.update(x=axes[0], y=axes[1], z=axes[2])
+        shape = (3,) + tuple(len(axis) for axis in axes)
+        results = {
+            quantity: result.reshape(shape) for quantity, result in results.items()
+        }
+    else:
+        extra["points"] = np.load(job["points"])
+    np.savez(output_path, **extra, **results)
+
+
+def main(argv=None):
+    """Create, evaluate and merge sharded maps on a shared directory."""
+    parser = argparse.ArgumentParser(
+        description="Generate field and force maps in shards evaluated by "
+        "independent workers sharing a directory.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="split a map into shards")
+    create.add_argument(
+        "config",
+        help='JSON file with "magnetic_parameters" and either "grid" or "points" '
+        "(path of a .npy file of shape (n, 3))",
+    )
+    create.add_argument("directory")
+    create.add_argument("--shard-size", type=int, default=1_000_000)
+    work = commands.add_parser("work", help="evaluate shards until none is left")
+    work.add_argument("directory")
+    work.add_argument("--max-shards", type=int)
+    work.add_argument(
+        "--lock-timeout",
+        type=float,
+        help="take over locks older than this many seconds; live workers "
+        f"refresh their locks every {HEARTBEAT_INTERVAL:g} s between chunks",
+    )
+    work.add_argument("--chunk-size", type=int, default=65536)
+    status = commands.add_parser("status", help="count done, claimed and open shards")
+    status.add_argument("directory")
+    merge = commands.add_parser("merge", help="verify and merge the shards")
+    merge.add_argument("directory")
+    merge.add_argument("output", help="output .npz file")
+    args = parser.parse_args(argv)
+
+    if args.command == "create":
+        with open(args.config) as file:
+            config = json.load(file)
+        job = create_shards(
+            args.directory,
+            config["magnetic_parameters"],
+            config.get("grid"),
+            config.get("points"),
+            config.get("quantities", ["field", "force"]),
+            args.shard_size,
+        )
+        print(f"Created {len(job['shards'])} shards of job {job['parameters_hash']}")
+    elif args.command == "work":
+        n_shards = run_worker(
+            args.directory, args.max_shards, args.lock_timeout, args.chunk_size
+        )
+        print(f"Evaluated {n_shards} shard(s)")
+    elif args.command == "status":
+        print(json.dumps(get_job_status(args.directory)))
+    else:
+        merge_shards(args.directory, args.output)
+        print(f"Merged the shards of {args.directory} into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
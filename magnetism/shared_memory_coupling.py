@@ -0,0 +1,330 @@
+import argparse
+import json
+import logging
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from magnetism.batch_evaluation import Workspace
+from magnetism.concentration_transport import get_drag_coefficient
+from magnetism.field_map import QUANTITIES
+
+# int64 slots at the start of the region, followed by the positions, field
+# and force arrays of shape (3, capacity) in float64
+HEADER = [
+    "capacity",
+    "n_points",
+    "quantities",
+    "requested",
+    "completed",
+    "stop",
+    "error",
+    "kernel_ns",
+]
+HEADER_BYTES = 8 * len(HEADER)
+
+# bit flags of the requested quantities
+QUANTITY_FLAGS = {"field": 1, "force": 2}
+
+# names of the regions created by this process
+_created = set()
+
+
+def _attach(name, timeout):
+    # attach to an existing region, waiting for its creation up to timeout;
+    # the creator owns the region, so the resource tracker of another
+    # process must not unlink it at exit
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            memory = shared_memory.SharedMemory(name)
+            break
+        except FileNotFoundError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(1e-3)
+    if memory.name not in _created:
+        resource_tracker.unregister(memory._name, "shared_memory")
+    return memory
+
+
+def _wait_for(condition, timeout, spin_time, poll_interval):
+    # spin for spin_time, then poll every poll_interval until condition()
+    start = time.perf_counter()
+    while not condition():
+        elapsed = time.perf_counter() - start
+        if timeout is not None and elapsed > timeout:
+            raise TimeoutError("Timed out waiting for the coupled process.")
+        if elapsed > spin_time:
+            time.sleep(poll_interval)
+    return True
+
+
+class CouplingRegion:
+    """
+    Shared-memory region exchanging particle positions, field and force.
+
+    The region holds a header of int64 step counters and the arrays
+    positions, field and force of shape (3, capacity), whose components are
+    contiguous so that the batch kernels read and write them in place. With
+    a capacity the region is created (by the solver, which owns and unlinks
+    it), without one an existing region of the given name is attached.
+
+    A solver step writes the first n positions, then submit increments the
+    "requested" counter; the CouplingServer evaluates the requested
+    quantities into field and force and sets "completed" to the step, which
+    wait polls for. Use as a context manager or call close (and unlink on
+    the creating side).
+    """
+
+    def __init__(self, name=None, capacity=None, timeout=10.0):
+        self.created = capacity is not None
+        if self.created:
+            size = HEADER_BYTES + 3 * 3 * 8 * int(capacity)
+            self.memory = shared_memory.SharedMemory(name, create=True, size=size)
+            _created.add(self.memory.name)
+        else:
+            self.memory = _attach(name, timeout)
+        self.name = self.memory.name
+        self.header = np.ndarray(len(HEADER), np.int64, self.memory.buf)
+        if self.created:
+            self.header[:] = 0
+            self.header[HEADER.index("capacity")] = capacity
+        else:
+            # a new region is zeroed, the creator sets the capacity last
+            _wait_for(lambda: self["capacity"] > 0, timeout, 0.0, 1e-3)
+        self.capacity = int(self.header[HEADER.index("capacity")])
+        arrays = np.ndarray(
+            (3, 3, self.capacity), np.float64, self.memory.buf, HEADER_BYTES
+        )
+        self.positions, self.field, self.force = arrays
+
+    def __getitem__(self, slot):
+        return int(self.header[HEADER.index(slot)])
+
+    def __setitem__(self, slot, value):
+        self.header[HEADER.index(slot)] = value
+
+    def submit(self, n_points, quantities=("force",)):
+        """Request the quantities at the first n_points positions."""
+        if not 0 <= n_points <= self.capacity:
+            raise ValueError("The number of points exceeds the capacity.")
+        self["n_points"] = n_points
+        self["quantities"] = sum(QUANTITY_FLAGS[quantity] for quantity in quantities)
+        step = self["requested"] + 1
+        self["requested"] = step
+        return step
+
+    def wait(self, step=None, timeout=None, spin_time=1e-4, poll_interval=2e-5):
+        """
+        Wait until a step (default the last requested one) is completed.
+
+        Returns the time in seconds that the kernels took for the step.
+        """
+        step = self["requested"] if step is None else step
+        _wait_for(lambda: self["completed"] >= step, timeout, spin_time, poll_interval)
+        if self["error"]:
+            raise RuntimeError("The evaluation of the coupled step failed.")
+        return 1e-9 * self["kernel_ns"]
+
+    def evaluate(self, n_points, quantities=("force",), timeout=None):
+        """Submit a step and wait for it, see submit and wait."""
+        return self.wait(self.submit(n_points, quantities), timeout)
+
+    def stop(self):
+        """Ask the server to return after the current step."""
+        self["stop"] = 1
+
+    def close(self):
+        # the views must be released before the memory can be closed
+        del self.header, self.positions, self.field, self.force
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
+        _created.discard(self.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        created = self.created
+        self.close()
+        if created:
+            self.unlink()
+
+
+class CouplingServer:
+    """
+    Evaluate the field and force for a solver through a CouplingRegion.
+
+    The server attaches to the region of the given name (waiting up to
+    timeout seconds for the solver to create it) and answers every step
+    with one batch kernel call per quantity, reading the positions and
+    writing the results in place with a reused Workspace: besides the
+    kernels a step costs a few header reads and writes.
+    """
+
+    def __init__(self, name, magnetic_parameters, timeout=10.0):
+        self.region = CouplingRegion(name, timeout=timeout)
+        self.magnetic_parameters = magnetic_parameters
+        self.workspace = Workspace()
+        self.steps = 0
+        self.points = 0
+        self.kernel_time = 0.0
+
+    def evaluate_step(self):
+        """Evaluate the last requested step and mark it completed."""
+        region = self.region
+        step = region["requested"]
+        n = region["n_points"]
+        quantities = region["quantities"]
+        start = time.perf_counter_ns()
+        try:
+            for quantity, flag in QUANTITY_FLAGS.items():
+                if quantities & flag:
+                    out = getattr(region, quantity)
+                    QUANTITIES[quantity](
+                        *region.positions[:, :n],
+                        self.magnetic_parameters,
+                        out=list(out[:, :n]),
+                        workspace=self.workspace,
+                    )
+            region["error"] = 0
+        except Exception:
+            logging.exception("The evaluation of step %d failed.", step)
+            region["error"] = 1
+        kernel_ns = time.perf_counter_ns() - start
+        region["kernel_ns"] = kernel_ns
+        region["completed"] = step
+        self.steps += 1
+        self.points += n
+        self.kernel_time += 1e-9 * kernel_ns
+
+    def serve(self, timeout=None, spin_time=1e-4, poll_interval=2e-5):
+        """
+        Answer steps until the solver calls stop or no step is requested
+        for timeout seconds; returns the statistics.
+        """
+        region = self.region
+        while True:
+            try:
+                _wait_for(
+                    lambda: region["stop"] or region["requested"] > region["completed"],
+                    timeout,
+                    spin_time,
+                    poll_interval,
+                )
+            except TimeoutError:
+                break
+            if region["requested"] > region["completed"]:
+                self.evaluate_step()
+            elif region["stop"]:
+                break
+        return self.get_statistics()
+
+    def get_statistics(self):
+        """Return the number of steps and points and the kernel time in s."""
+        return {
+            "steps": self.steps,
+            "points": self.points,
+            "kernel_time": self.kernel_time,
+        }
+
+    def close(self):
+        self.region.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_standin_solver(
+    name,
+    magnetic_parameters,
+    n_particles=10000,
+    n_steps=100,
+    time_step=1e-2,
+    seed=0,
+):
+    """
+    Stand-in for an external particle solver, for testing the coupling.
+
+    Creates the region of the given name, places n_particles at random in a
+    box next to the magnet and moves them for n_steps with the magnetic
+    drift velocity F / (6 pi eta a) obtained from the CouplingServer. The
+    server is stopped at the end.
+
+    Returns a dictionary with the final "positions" (3, n), the "round_trip"
+    time of every step from submitting it to its completion and the
+    "kernel_time" of the server for it, both in s.
+    """
+    rng = np.random.default_rng(seed)
+    R = magnetic_parameters["radius_magnet"]
+    centre = np.array([[magnetic_parameters[f"{axis}_position"]] for axis in "xyz"])
+    drag = get_drag_coefficient(magnetic_parameters)
+    round_trip = np.empty(n_steps)
+    kernel_time = np.empty(n_steps)
+    with CouplingRegion(name, capacity=n_particles) as region:
+        region.positions[:] = centre + rng.uniform(
+            [[-2 * R], [-2 * R], [1.5 * R]],
+            [[2 * R], [2 * R], [4 * R]],
+            (3, n_particles),
+        )
+        for step in range(n_steps):
+            start = time.perf_counter()
+            kernel_time[step] = region.evaluate(n_particles, ("force",))
+            round_trip[step] = time.perf_counter() - start
+            region.positions += time_step / drag * region.force
+        final = region.positions.copy()
+        region.stop()
+    return {"positions": final, "round_trip": round_trip, "kernel_time": kernel_time}
+
+
+def main(argv=None):
+    """Couple a particle solver through shared memory, or stand in for one."""
+    parser = argparse.ArgumentParser(
+        description="Attach to the shared-memory region of a particle solver "
+        "and evaluate the field and force at its positions every step; with "
+        "--standin run the stand-in solver that creates the region instead.",
+    )
+    parser.add_argument("config", help='JSON file with "magnetic_parameters"')
+    parser.add_argument("--name", required=True, help="name of the region")
+    parser.add_argument(
+        "--timeout", type=float, help="return after this many s without a step"
+    )
+    parser.add_argument(
+        "--standin",
+        type=int,
+        metavar="N_PARTICLES",
+        help="run the stand-in solver with this many particles",
+    )
+    parser.add_argument("--steps", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    with open(args.config) as file:
+        magnetic_parameters = json.load(file)["magnetic_parameters"]
+    if args.standin:
+        result = run_standin_solver(
+            args.name, magnetic_parameters, args.standin, args.steps
+        )
+        overhead = result["round_trip"] - result["kernel_time"]
+        statistics = {
+            "steps": args.steps,
+            "round_trip_p50": float(np.median(result["round_trip"])),
+            "kernel_time_p50": float(np.median(result["kernel_time"])),
+            "overhead_p50": float(np.median(overhead)),
+        }
+    else:
+        with CouplingServer(
+            args.name, magnetic_parameters, args.timeout or 10.0
+        ) as server:
+            statistics = server.serve(args.timeout)
+    print(json.dumps(statistics, indent=2))
+
+
+if __name__ == "__main__":
+    main()
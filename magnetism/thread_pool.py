@@ -0,0 +1,91 @@
+import concurrent.futures
+import os
+import threading
+
+import numpy as np
+
+from magnetism.batch_evaluation import Workspace
+from magnetism.field_map import QUANTITIES
+
+
+class ThreadPoolEvaluator:
+    """
+    Evaluate the batch kernels on a pool of threads in one process.
+
+    The elliptic integrals of SciPy and the NumPy array operations of the
+    kernels release the GIL, so chunks of chunk_size points evaluated by
+    different threads run in parallel without the pickling and startup
+    costs of a process pool. Every thread has its own Workspace and writes
+    into its own slice of the output. Use as a context manager or call
+    close to stop the threads.
+    """
+
+    def __init__(self, threads=None, chunk_size=65536):
+        self.threads = threads or os.cpu_count() or 1
+        self.chunk_size = int(chunk_size)
+        self._local = threading.local()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            self.threads, thread_name_prefix="magnetism"
+        )
+
+    def _get_workspace(self):
+        workspace = getattr(self._local, "workspace", None)
+        if workspace is None:
+            workspace = self._local.workspace = Workspace(self.chunk_size)
+        return workspace
+
+    def evaluate(self, quantity, x, y, z, magnetic_parameters, out=None):
+        """
+        Evaluate "field" or "force" for a batch of points.
+
+        The result is the same as that of evaluate_magnetic_field_batch or
+        evaluate_magnetic_force_batch: an array of shape (3,) + shape of the
+        points, written into out if given.
+        """
+        kernel = QUANTITIES[quantity]
+        x, y, z = np.broadcast_arrays(x, y, z)
+        if out is None:
+            out = np.empty((3,) + x.shape)
+        if x.size == 0:
+            return out
+        x, y, z = x.reshape(-1), y.reshape(-1), z.reshape(-1)
+        out_flat = [component.reshape(-1) for component in out]
+        for component, target in zip(out_flat, out):
+            if not np.shares_memory(component, target):
+                raise ValueError("out must be contiguous.")
+
+        def evaluate_chunk(start):
+            chunk = slice(start, start + self.chunk_size)
+            kernel(
+                x[chunk],
+                y[chunk],
+                z[chunk],
+                magnetic_parameters,
+                out=[component[chunk] for component in out_flat],
+                workspace=self._get_workspace(),
+            )
+
+        futures = [
+            self._executor.submit(evaluate_chunk, start)
+            for start in range(0, len(x), self.chunk_size)
+        ]
+        for future in futures:
+            future.result()
+        return out
+
+    def field(self, x, y, z, magnetic_parameters, out=None):
+        """Evaluate the magnetic field H, see evaluate."""
+        return self.evaluate("field", x, y, z, magnetic_parameters, out)
+
+    def force(self, x, y, z, magnetic_parameters, out=None):
+        """Evaluate the magnetic force, see evaluate."""
+        return self.evaluate("force", x, y, z, magnetic_parameters, out)
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
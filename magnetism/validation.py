@@ -0,0 +1,301 @@
+import argparse
+import json
+
+import numpy as np
+
+from magnetism.batch_evaluation import (
+    evaluate_magnetic_field_batch,
+    evaluate_magnetic_force_batch,
+)
+from magnetism.benchmark import (
+    BENCHMARK_PARAMETERS,
+    ROTATIONS,
+    measure_throughput,
+)
+from magnetism.coordinate_transformation import (
+    is_inside_magnet,
+    transform_vector_backward,
+)
+from magnetism.magnetic_field import evaluate_magnetic_field
+from magnetism.magnetic_force import evaluate_magnetic_force
+from magnetism.magnetisation_model import evaluate_magnetisation_model
+
+STRATA = ["edge", "axis", "inside", "far_field", "near_field"]
+
+# evaluation modes as quantity -> function(x, y, z, magnetic_parameters)
+MODES = {
+    "reference": {
+        "field": evaluate_magnetic_field,
+        "force": evaluate_magnetic_force,
+    },
+    "float32": {
+        "field": lambda x, y, z, p: evaluate_magnetic_field(x, y, z, p, np.float32),
+        "force": lambda x, y, z, p: evaluate_magnetic_force(
+            x, y, z, p, dtype=np.float32
+        ),
+    },
+    "batch": {
+        "field": evaluate_magnetic_field_batch,
+        "force": evaluate_magnetic_force_batch,
+    },
+}
+
+
+def generate_validation_points(stratum, n, magnetic_parameters, rng):
+    """
+    Generate n validation points of a stratum around the magnet.
+
+    The strata are "edge" (within 5 % of the rim of an end face, inside and
+    outside), "axis" (a quarter exactly on the axis, the others up to 1 % of
+    the radius away, up to three half lengths from the centre), "inside"
+    (uniform in the magnet), "far_field" (5 to 500 radii away, uniform in
+    the logarithm of the distance) and "near_field" (in a box reaching two
+    magnet lengths from the centre). The points are generated in the frame
+    of the magnet and returned in the lab frame.
+    """
+    R = magnetic_parameters["radius_magnet"]
+    half_length = 0.5 * magnetic_parameters["length"]
+    phi = rng.uniform(-np.pi, np.pi, n)
+
+    if stratum == "edge":
+        rho = R * (1 + rng.uniform(-0.05, 0.05, n))
+        z = (
+            np.sign(rng.uniform(-1, 1, n))
+            * half_length
+            * (1 + rng.uniform(-0.05, 0.05, n))
+        )
+    elif stratum == "axis":
+        rho = np.where(
+            rng.uniform(0, 1, n) < 0.25, 0.0, R * 10 ** rng.uniform(-9, -2, n)
+        )
+        z = rng.uniform(-3 * half_length, 3 * half_length, n)
+    elif stratum == "inside":
+        rho = R * np.sqrt(rng.uniform(0, 1, n))
+        z = rng.uniform(-half_length, half_length, n)
+    elif stratum == "far_field":
+        distance = R * 10 ** rng.uniform(np.log10(5), np.log10(500), n)
+        theta = np.arccos(rng.uniform(-1, 1, n))
+        rho = distance * np.sin(theta)
+        z = distance * np.cos(theta)
+    elif stratum == "near_field":
+        xi, eta, z = rng.uniform(-4 * half_length, 4 * half_length, (3, n))
+        rho, phi = np.hypot(xi, eta), np.arctan2(eta, xi)
+    else:
+        raise ValueError("Invalid validation stratum.")
+
+    x, y, z = transform_vector_backward(rho, z, phi, magnetic_parameters)
+    return (
+        x + magnetic_parameters["x_position"],
+        y + magnetic_parameters["y_position"],
+        z + magnetic_parameters["z_position"],
+    )
+
+
+def _get_rotation_matrix(magnetic_parameters, mp):
+    # get_rotation_matrix in the working precision of mpmath
+    gamma = mp.radians(magnetic_parameters["rotation_x"])
+    beta = mp.radians(magnetic_parameters["rotation_y"])
+    return mp.matrix(
+        [
+            [mp.cos(beta), 0, -mp.sin(beta)],
+            [mp.sin(beta) * mp.sin(gamma), mp.cos(gamma), mp.sin(gamma) * mp.cos(beta)],
+            [
+                mp.sin(beta) * mp.cos(gamma),
+                -mp.sin(gamma),
+                mp.cos(beta) * mp.cos(gamma),
+            ],
+        ]
+    )
+
+
+def _get_reference_field(point, magnetic_parameters, rotation, mp):
+    # H at a point (mpmath vector in the lab frame) from the formulation of
+    # Derby and Olbert with the generalized complete elliptic integral
+    # C(k_c, p, c, s) in terms of Carlson's integrals
+    def C(k_c, p, c, s):
+        K = mp.elliprf(0, k_c**2, 1)
+        if s - c * p == 0:
+            return c * K
+        return c * K + (s - c * p) / 3 * mp.elliprj(0, k_c**2, 1, p)
+
+    centre = mp.matrix([magnetic_parameters[f"{axis}_position"] for axis in "xyz"])
+    xi, eta, z = rotation.T * (point - centre)
+    rho = mp.sqrt(xi**2 + eta**2)
+    a = mp.mpf(magnetic_parameters["radius_magnet"])
+    b = mp.mpf(magnetic_parameters["length"]) / 2
+    M = mp.mpf(magnetic_parameters["magnetization"])
+
+    gamma = (a - rho) / (a + rho)
+    H_rho = H_z = 0
+    for sign in (1, -1):
+        z_end = z + sign * b
+        root = mp.sqrt(z_end**2 + (rho + a) ** 2)
+        k = mp.sqrt(z_end**2 + (a - rho) ** 2) / root
+        H_rho += sign * a / root * C(k, 1, 1, -1)
+        H_z += sign * z_end / root * a / (a + rho) * C(k, gamma**2, 1, gamma)
+    H_rho *= M / mp.pi
+    H_z *= M / mp.pi
+    if rho < a and abs(z) < b:
+        H_z -= M
+
+    if rho == 0:
+        local = mp.matrix([0, 0, H_z])
+    else:
+        local = mp.matrix([H_rho * xi / rho, H_rho * eta / rho, H_z])
+    return rotation * local
+
+
+def evaluate_reference(
+    x, y, z, magnetic_parameters, quantities=("field", "force"), dps=30
+):
+    """
+    Evaluate high-precision reference values of the field and force.
+
+    The field of the axially magnetized cylinder follows from the formulas
+    of Derby and Olbert (Am. J. Phys. 78, 229, 2010), independent of the
+    formulation of the package, with mpmath at dps decimal digits. The force
+    mu_0 f_H grad(|H|^2) / 2 uses central differences of |H|^2 with steps of
+    10^(-dps/3) magnet radii, exact to about 2 dps / 3 digits. Requires the
+    optional dependency mpmath. Returns a dictionary mapping each quantity
+    to an array of shape (3, n) rounded to float64.
+    """
+    import mpmath
+
+    x, y, z = (np.asarray(c, dtype=np.float64).ravel() for c in (x, y, z))
+    results = {quantity: np.empty((3, len(x))) for quantity in quantities}
+    with mpmath.workdps(dps):
+        mp = mpmath.mp
+        rotation = _get_rotation_matrix(magnetic_parameters, mp)
+        h = mp.mpf(magnetic_parameters["radius_magnet"]) * mp.mpf(10) ** (-dps // 3)
+        for i in range(len(x)):
+            point = mp.matrix([mp.mpf(x[i]), mp.mpf(y[i]), mp.mpf(z[i])])
+            H = _get_reference_field(point, magnetic_parameters, rotation, mp)
+            if "field" in results:
+                results["field"][:, i] = [float(component) for component in H]
+            if "force" in results:
+                gradient = []
+                for axis in range(3):
+                    step = mp.matrix(3, 1)
+                    step[axis] = h
+                    H_plus = _get_reference_field(
+                        point + step, magnetic_parameters, rotation, mp
+                    )
+                    H_minus = _get_reference_field(
+                        point - step, magnetic_parameters, rotation, mp
+                    )
+                    gradient.append(
+                        (mp.norm(H_plus) ** 2 - mp.norm(H_minus) ** 2) / (2 * h)
+                    )
+                f_H = evaluate_magnetisation_model(
+                    magnetic_parameters, float(mp.norm(H)), None
+                )
+                scale = mp.mpf(magnetic_parameters["magnetic_permeability"]) * f_H / 2
+                results["force"][:, i] = [float(scale * g) for g in gradient]
+    return results
+
+
+def get_relative_errors(values, reference):
+    """Return the norm of the deviation relative to the norm of the reference."""
+    values = np.asarray(values, dtype=np.float64).reshape(3, -1)
+    deviation = np.linalg.norm(values - reference, axis=0)
+    return deviation / np.linalg.norm(reference, axis=0)
+
+
+def run_validation(
+    modes=None,
+    quantities=("field", "force"),
+    strata=STRATA,
+    rotations=tuple(ROTATIONS),
+    n_points=100,
+    dps=30,
+    magnetic_parameters=BENCHMARK_PARAMETERS,
+    min_time=0.05,
+    seed=0,
+):
+    """
+    Validate evaluation modes against high-precision reference values.
+
+    modes maps names to {quantity: function(x, y, z, magnetic_parameters)}
+    (default MODES: the reference kernels, float32 and the batch kernels);
+    e.g. a tabulated map can be added as {"force": lambda x, y, z, p:
+    interpolator(x, y, z)} when validating a single magnet. For every
+    stratum and rotation of the magnet n_points points are drawn and the
+    reference values are computed once with evaluate_reference. The force
+    is only validated at the points outside the magnet.
+
+    Returns a dictionary keyed by "mode/quantity/stratum/rotation" with the
+    "max", "p50" and "p99" of the relative errors (see
+    get_relative_errors) and the "throughput" of the mode in points/s.
+    """
+    modes = MODES if modes is None else modes
+    rng = np.random.default_rng(seed)
+    results = {}
+    for rotation in rotations:
+        parameters = dict(magnetic_parameters)
+        parameters["rotation_x"], parameters["rotation_y"] = ROTATIONS[rotation]
+        for stratum in strata:
+            points = generate_validation_points(stratum, n_points, parameters, rng)
+            reference = evaluate_reference(*points, parameters, quantities, dps)
+            outside = ~is_inside_magnet(*points, parameters)
+            for mode, functions in modes.items():
+                for quantity in quantities:
+                    # the force on particles is only defined outside the magnet
+                    valid = outside if quantity == "force" else slice(None)
+                    if quantity not in functions or not np.any(valid):
+                        continue
+                    function = functions[quantity]
+                    errors = get_relative_errors(
+                        function(*points, parameters), reference[quantity]
+                    )[valid]
+                    results[f"{mode}/{quantity}/{stratum}/{rotation}"] = {
+                        "max": float(np.max(errors)),
+                        "p50": float(np.percentile(errors, 50)),
+                        "p99": float(np.percentile(errors, 99)),
+                        "throughput": measure_throughput(
+                            lambda x, y, z: function(x, y, z, parameters),
+                            points,
+                            min_time,
+                        ),
+                    }
+    return results
+
+
+def main(argv=None):
+    """Validate the accuracy of the evaluation modes against mpmath."""
+    parser = argparse.ArgumentParser(
+        description="Report the relative errors of the field and force "
+        "evaluation modes against high-precision reference values, next to "
+        "their throughput.",
+    )
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES))
+    parser.add_argument("--quantities", nargs="+", default=["field", "force"])
+    parser.add_argument("--strata", nargs="+", default=STRATA)
+    parser.add_argument("--rotations", nargs="+", default=list(ROTATIONS))
+    parser.add_argument("--points", type=int, default=100)
+    parser.add_argument("--dps", type=int, default=30)
+    parser.add_argument("--min-time", type=float, default=0.05)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    modes = {mode: MODES[mode] for mode in args.modes or MODES}
+    results = run_validation(
+        modes,
+        args.quantities,
+        args.strata,
+        args.rotations,
+        args.points,
+        args.dps,
+        min_time=args.min_time,
+    )
+    for key, result in results.items():
+        print(
+            f"{key:<40} max {result['max']:9.2e} p50 {result['p50']:9.2e} "
+            f"p99 {result['p99']:9.2e} {result['throughput']:12.0f} points/s"
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,5 +3,16 @@ from setuptools import find_packages, setup
 setup(
     name="magnetism",
     version="0.1.0",
-    packages=find_packages("magnetism"),
+    packages=find_packages(exclude=["tests"]),
+    entry_points={
+        "console_scripts": [
+            "magnetism-benchmark=magnetism.benchmark:main",
+            "magnetism-coupling=magnetism.shared_memory_coupling:main",
+            "magnetism-evaluate-mesh=magnetism.mesh_evaluation:main",
+            "magnetism-field-map=magnetism.field_map:main",
+            "magnetism-query-service=magnetism.query_service:main",
+            "magnetism-shards=magnetism.sharding:main",
+            "magnetism-validate=magnetism.validation:main",
+        ],
+    },
 )
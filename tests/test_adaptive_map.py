@@ -0,0 +1,43 @@
+import numpy as np
+from magnetism.adaptive_map import build_adaptive_map, query_adaptive_map
+from magnetism.coordinate_transformation import transform_coordinates_forward
+from magnetism.magnetic_field import evaluate_magnetic_field
+from magnetism.magnetic_force import evaluate_magnetic_force
+
+
+def test_adaptive_quadtree_accuracy(magnetic_parameters_base):
+    # Test the interpolation error of a planar map away from the magnet surface
+    parameters = dict(magnetic_parameters_base, rotation_x=30)
+    max_depth = 8
+    tree = build_adaptive_map(
+        [[-7, 7], [0, 0], [-7, 7]], parameters, tolerance=1e-2, max_depth=max_depth
+    )
+    # far fewer evaluations than a uniform grid of the finest cells
+    assert tree["evaluations"] < 0.25 * (2**max_depth + 1) ** 2
+
+    rng = np.random.default_rng(0)
+    x, z = rng.uniform(-7, 7, (2, 2000))
+    y = np.zeros_like(x)
+    rho, _, zeta = transform_coordinates_forward(x, y, z, parameters)
+    away = (rho > 3.0) | (np.abs(zeta) > 3.0)
+    x, y, z = x[away], y[away], z[away]
+
+    result = query_adaptive_map(tree, x, y, z)
+    expected = np.array(evaluate_magnetic_field(x, y, z, parameters))
+    error = np.linalg.norm(result - expected, axis=0) / np.linalg.norm(expected, axis=0)
+    assert error.max() < 2e-2
+
+
+def test_adaptive_octree_query(magnetic_parameters_base):
+    tree = build_adaptive_map(
+        [[3, 6], [-1, 1], [-1, 2]], magnetic_parameters_base, "force", max_depth=4
+    )
+    # the corners of the map are exact, points outside it are NaN
+    x, y, z = np.array([[3.0, 6.0, 7.0], [-1.0, 1.0, 0.0], [-1.0, 2.0, 0.0]])
+    result = query_adaptive_map(tree, x.reshape(3, 1), y.reshape(3, 1), z.reshape(3, 1))
+    assert result.shape == (3, 3, 1)
+    expected = np.array(
+        evaluate_magnetic_force(x[:2], y[:2], z[:2], magnetic_parameters_base)
+    )
+    assert np.allclose(result[:, :2, 0], expected, rtol=1e-9)
+    assert np.all(np.isnan(result[:, 2]))
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from magnetism.batch_evaluation import (
+    Workspace,
+    evaluate_magnetic_field_batch,
+    evaluate_magnetic_force_batch,
+)
+from magnetism.coordinate_transformation import get_rotation_matrix
+from magnetism.magnetic_field import evaluate_magnetic_field
+from magnetism.magnetic_force import evaluate_magnetic_force
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    return rng.uniform(-8.0, 8.0, (3, 1000))
+
+
+@pytest.mark.parametrize("magnetisation_model", ["constant", "linear_saturation"])
+@pytest.mark.parametrize("magnetization_direction", [None, [1, 0, 0], [0.3, -1, 0.5]])
+def test_batch_matches_kernels(
+    magnetic_parameters_base, points, magnetisation_model, magnetization_direction
+):
+    # Test the batched kernels against the reference kernels
+    tolerance = 1e-9
+    if magnetization_direction is not None:
+        magnetic_parameters_base["magnetization_direction"] = magnetization_direction
+        # the transverse force is differentiated numerically, which amplifies
+        # the rounding errors of the far field
+        tolerance = 1e-7
+    magnetic_parameters_base["rotation_x"] = 20
+    magnetic_parameters_base["rotation_y"] = -35
+    magnetic_parameters_base["z_position"] = 0.5
+    magnetic_parameters_base["magnetisation_model"] = magnetisation_model
+    magnetic_parameters_base["particle_saturation_magnetization"] = 400.0
+    workspace = Workspace(chunk_size=128)
+
+    for batch, kernel in [
+        (evaluate_magnetic_field_batch, evaluate_magnetic_field),
+        (evaluate_magnetic_force_batch, evaluate_magnetic_force),
+    ]:
+        result = batch(*points, magnetic_parameters_base, workspace=workspace)
+        expected = np.array(kernel(*points, magnetic_parameters_base))
+        scale = np.max(np.abs(expected), axis=0)
+        assert np.all(np.abs(result - expected) <= tolerance * scale)
+
+
+def test_batch_reuses_workspace(magnetic_parameters_base, points):
+    # Test that repeated calls write into out without growing the workspace
+    workspace = Workspace(memory_budget=2**20)
+    out = np.empty((3, points.shape[1]), dtype=np.float32)
+    evaluate_magnetic_force_batch(
+        *points, magnetic_parameters_base, out=out, workspace=workspace
+    )
+    nbytes = workspace.nbytes
+    result = evaluate_magnetic_force_batch(
+        *points, magnetic_parameters_base, out=out, workspace=workspace
+    )
+
+    assert result is out
+    assert workspace.nbytes == nbytes
+    assert nbytes <= 2**20
+    assert out[0, 0] == pytest.approx(
+        evaluate_magnetic_force(*points[:, 0], magnetic_parameters_base)[0], 1e-6
+    )
+
+
+@pytest.mark.parametrize("rotation", [(0, 0), (20, -35)])
+def test_batch_force_on_axis(magnetic_parameters_base, rotation):
+    # Test that the radial force vanishes on and next to the axis
+    magnetic_parameters_base["rotation_x"], magnetic_parameters_base["rotation_y"] = (
+        rotation
+    )
+    axis = get_rotation_matrix(magnetic_parameters_base)[:, 2]
+    distance = np.array([3.0, 5.0, 7.5, 12.0, -5.0, -7.5])
+    x, y, z = axis[:, None] * distance
+
+    batch = evaluate_magnetic_force_batch(x, y, z, magnetic_parameters_base)
+    reference = np.array(evaluate_magnetic_force(x, y, z, magnetic_parameters_base))
+    magnitude = np.linalg.norm(reference, axis=0)
+    assert np.all(np.linalg.norm(np.cross(batch.T, axis), axis=1) < 1e-9 * magnitude)
+    assert np.all(np.linalg.norm(batch - reference, axis=0) < 1e-9 * magnitude)
+
+
+def test_batch_empty(magnetic_parameters_base):
+    empty = np.empty(0)
+    for batch in [evaluate_magnetic_field_batch, evaluate_magnetic_force_batch]:
+        assert batch(empty, empty, empty, magnetic_parameters_base).shape == (3, 0)
+        out = np.empty((3, 0))
+        assert batch(empty, empty, empty, magnetic_parameters_base, out=out) is out
@@ -0,0 +1,75 @@
+import json
+import multiprocessing
+
+import numpy as np
+import pytest
+from magnetism.benchmark import (
+    BENCHMARK_PARAMETERS,
+    compare_to_baseline,
+    generate_points,
+    main,
+    measure_parallel_efficiency,
+    run_benchmarks,
+)
+from magnetism.coordinate_transformation import transform_coordinates_forward
+
+
+def test_generate_points():
+    # Test that the near-edge points lie around the rim of an end face
+    rng = np.random.default_rng(1)
+    parameters = dict(BENCHMARK_PARAMETERS, rotation_x=40, z_position=1.0)
+    x, y, z = generate_points("near_edge", 50, parameters, rng)
+    rho, _, z = transform_coordinates_forward(x, y, z, parameters)
+    assert np.all(np.abs(rho / parameters["radius_magnet"] - 1) <= 0.05 + 1e-12)
+    assert np.all(np.abs(np.abs(z) / (0.5 * parameters["length"]) - 1) <= 0.05 + 1e-12)
+
+
+def test_run_benchmarks():
+    results = run_benchmarks(
+        sizes=[10], targets=["force_batch"], mixes=["far_field"], min_time=1e-3
+    )
+    assert set(results) == {
+        "force_batch/far_field/aligned/10",
+        "force_batch/far_field/rotated/10",
+    }
+    assert all(value > 0 for value in results.values())
+
+
+def test_measure_parallel_efficiency():
+    children = set(multiprocessing.active_children())
+    results = measure_parallel_efficiency(
+        workers=[1, 2], quantities=["field"], size=1000, chunk_size=300, min_time=1e-3
+    )
+    assert set(results) == {
+        "threads/field/1",
+        "threads/field/2",
+        "processes/field/1",
+        "processes/field/2",
+    }
+    for key, result in results.items():
+        assert result["throughput"] > 0
+        assert result["efficiency"] == pytest.approx(
+            result["speedup"] / int(key.split("/")[-1])
+        )
+    # the workers of every configuration are stopped
+    assert set(multiprocessing.active_children()) <= children
+
+
+def test_compare_to_baseline():
+    baseline = {"a": 100.0, "b": 100.0, "c": 100.0}
+    results = {"a": 85.0, "b": 75.0}
+    assert compare_to_baseline(results, baseline, threshold=0.2) == [("b", 100.0, 75.0)]
+
+
+def test_benchmark_main_regression(tmp_path):
+    # A baseline far above any achievable throughput must fail the run
+    arguments = ["--sizes", "10", "--targets", "field_batch", "--min-time", "1e-3"]
+    arguments += ["--mixes", "uniform", "--rotations", "aligned"]
+    output = tmp_path / "results.json"
+    assert main(arguments + ["--output", str(output)]) == 0
+
+    baseline = json.loads(output.read_text())
+    baseline["results"] = {key: 1e30 for key in baseline["results"]}
+    baseline_path = tmp_path / "baseline.json"
+    baseline_path.write_text(json.dumps(baseline))
+    assert main(arguments + ["--baseline", str(baseline_path)]) == 1
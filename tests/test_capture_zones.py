@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from magnetism.capture_zones import (
+    _get_evaluator,
+    find_iso_contours,
+    find_iso_surface,
+    write_surface_vtk,
+)
+from magnetism.field_map import QUANTITIES
+
+
+@pytest.fixture
+def level(magnetic_parameters_base):
+    # force magnitude three radii from the centre in the mid plane
+    force = QUANTITIES["force"](*np.array([[7.5], [0], [0]]), magnetic_parameters_base)
+    return np.linalg.norm(force)
+
+
+def test_contour_around_magnet(magnetic_parameters_base, level):
+    # node counts keep the grid off the axis
+    grid = {"x": [-10, 10, 16], "y": [0, 0, 1], "z": [-10, 10, 16]}
+    result = find_iso_contours(grid, magnetic_parameters_base, level)
+    assert len(result["lines"]) == 1
+    line = result["lines"][0]
+    assert np.array_equal(line[0], line[-1])
+    assert np.all(line[:, 1] == 0)
+    assert np.all(np.hypot(line[:, 0], line[:, 2]) > 5)
+
+    evaluate, _ = _get_evaluator(magnetic_parameters_base, "force_magnitude", level)
+    assert np.max(np.abs(evaluate(line.T))) < 1e-5 * level
+    assert result["evaluations"] < 3 * 16**2
+
+
+def test_exact_node_and_no_contour(magnetic_parameters_base, level):
+    grid = {"x": [5, 10, 5], "y": [0, 0, 1], "z": [-1.25, 1.25, 3]}
+    line = find_iso_contours(grid, magnetic_parameters_base, level)["lines"][0]
+    assert np.any(np.all(np.isclose(line, [7.5, 0, 0], atol=1e-9), axis=1))
+
+    result = find_iso_contours(grid, magnetic_parameters_base, 1e3 * level)
+    assert result["lines"] == []
+    with pytest.raises(ValueError):
+        find_iso_surface(grid, magnetic_parameters_base, level)
+
+
+def test_closed_surface(magnetic_parameters_base, level, tmp_path):
+    grid = {axis: [-10, 10, 10] for axis in "xyz"}
+    result = find_iso_surface(grid, magnetic_parameters_base, level)
+    vertices, faces = result["vertices"], result["faces"]
+
+    # every edge is shared by two faces and the normals point outwards
+    edges = np.sort(
+        np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]]), axis=1
+    )
+    assert np.all(np.unique(edges, axis=0, return_counts=True)[1] == 2)
+    volume = np.sum(
+        vertices[faces[:, 0]] * np.cross(vertices[faces[:, 1]], vertices[faces[:, 2]])
+    )
+    assert volume > 0
+
+    evaluate, _ = _get_evaluator(magnetic_parameters_base, "force_magnitude", level)
+    assert np.max(np.abs(evaluate(vertices.T))) < 1e-5 * level
+
+    write_surface_vtk(tmp_path / "zone.vtk", vertices, faces)
+    assert f"POLYGONS {len(faces)}" in (tmp_path / "zone.vtk").read_text()
+
+
+def test_radial_velocity(magnetic_parameters_base):
+    grid = {"x": [-10, 10, 16], "y": [0, 0, 1], "z": [-10, 10, 16]}
+    result = find_iso_contours(grid, magnetic_parameters_base, 1e-3, "radial_velocity")
+    assert len(result["lines"]) >= 1
+    evaluate, _ = _get_evaluator(magnetic_parameters_base, "radial_velocity", 1e-3)
+    # the contour follows the magnet where the force pushes particles away
+    for line in result["lines"]:
+        on_level = np.abs(evaluate(line.T)) < 1e-8
+        rho, z = np.hypot(line[:, 0], line[:, 1]), line[:, 2]
+        on_magnet = np.isclose(rho, 2.5, atol=1e-5) | np.isclose(
+            np.abs(z), 2.5, atol=1e-5
+        )
+        assert np.any(on_level)
+        assert np.all(on_level | on_magnet)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from magnetism.concentration_transport import (
+    assemble_transport,
+    get_stokes_einstein_diffusion,
+    solve_steady_concentration,
+    solve_transient_concentration,
+)
+
+
+def test_stokes_einstein_diffusion(magnetic_parameters_base):
+    # 100 nm particles in water at room temperature: about 2.1e-12 m^2/s
+    D = get_stokes_einstein_diffusion(magnetic_parameters_base)
+    assert D == pytest.approx(2.147e-6, rel=1e-3)
+
+
+def test_steady_constant_drift(magnetic_parameters_base):
+    # Test the Scharfetter-Gummel fluxes against the exact 1D profile with a
+    # constant velocity, without a magnet in the domain
+    magnetic_parameters = dict(magnetic_parameters_base, magnetization=0.0)
+    magnetic_parameters["x_position"] = 100.0
+    v, D = 3.0, 0.5
+    transport = assemble_transport(
+        {"x": [0, 1, 21], "y": [0, 0, 1], "z": [0, 0.5, 3]},
+        magnetic_parameters,
+        D,
+        flow_velocity=[v, 0, 0],
+    )
+    result = solve_steady_concentration(transport, {"x_min": 1.0, "x_max": 0.0})
+    assert result["converged"]
+
+    x = transport["axes"][0]
+    expected = (np.exp(v * x / D) - np.exp(v / D)) / (1 - np.exp(v / D))
+    assert np.allclose(result["concentration"], expected[:, None, None], atol=1e-12)
+
+
+def test_steady_capture(magnetic_parameters_base):
+    grid = {"x": [-10, 10, 81], "y": [0, 0, 1], "z": [-10, 10, 81]}
+    transport = assemble_transport(grid, magnetic_parameters_base)
+    result = solve_steady_concentration(transport)
+    assert result["converged"]
+    assert np.all(result["concentration"][transport["inside"]] == 0)
+    assert result["capture_rate"] > 0
+
+    other = solve_steady_concentration(
+        transport, solver="bicgstab", preconditioner="ilu"
+    )
+    assert other["capture_rate"] == pytest.approx(result["capture_rate"], rel=1e-6)
+
+    # the drift points towards the magnet, which depletes its surroundings
+    without_drift = assemble_transport(
+        grid, dict(magnetic_parameters_base, magnetization=0.0)
+    )
+    diffusion_only = solve_steady_concentration(without_drift)
+    assert result["capture_rate"] > 10 * diffusion_only["capture_rate"]
+
+
+def test_transient_mass_balance(magnetic_parameters_base):
+    # Test that particles in a closed box are either in the fluid or captured
+    transport = assemble_transport(
+        {"x": [-6, 6, 41], "y": [0, 0, 1], "z": [-6, 6, 41]},
+        magnetic_parameters_base,
+        1e-2,
+    )
+    result = solve_transient_concentration(transport, [0.5, 1.0, 2.0], 1.0, boundary={})
+    assert result["converged"]
+
+    initial = np.sum(transport["volumes"] * ~transport["inside"].ravel())
+    mass = np.einsum(
+        "n,tn->t", transport["volumes"], result["concentration"].reshape(3, -1)
+    )
+    assert np.allclose(mass + result["captured"], initial, rtol=1e-9)
+    assert np.all(np.diff(result["captured"]) > 0)
+
+
+def test_transient_approaches_steady(magnetic_parameters_base):
+    transport = assemble_transport(
+        {"x": [-8, 8, 33], "y": [0, 0, 1], "z": [-8, 8, 33]},
+        magnetic_parameters_base,
+        1.0,
+    )
+    steady = solve_steady_concentration(transport)
+    transient = solve_transient_concentration(transport, [1.0, 200.0], time_step=1.0)
+    assert not np.allclose(transient["concentration"][0], steady["concentration"])
+    assert np.allclose(
+        transient["concentration"][-1], steady["concentration"], atol=1e-6
+    )
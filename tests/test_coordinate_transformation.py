@@ -1,6 +1,7 @@
 import numpy as np
 import pytest
 from magnetism.coordinate_transformation import (
+    get_rotation_matrix,
     transform_coordinates_forward,
     transform_vector_backward,
 )
@@ -123,3 +124,21 @@ def test_coordinate_transformation_rotation_3():
     assert rho == pytest.approx(2.8381162459829663, 1e-14)
     assert phi == pytest.approx(-1.4957457178897988, 1e-14)
     assert z == pytest.approx(6.476503391050418, 1e-14)
+
+
+def test_rotation_matrix():
+    # Test that the rotation matrix inverts the forward transformation
+    params = {
+        "x_position": 4.0,
+        "y_position": 5.0,
+        "z_position": -3.0,
+        "rotation_x": -30,
+        "rotation_y": 40,
+    }
+    local = np.array([0.5, -1.2, 2.0])
+    X, Y, Z = get_rotation_matrix(params) @ local + [4.0, 5.0, -3.0]
+    rho, phi, z = transform_coordinates_forward(X, Y, Z, params)
+
+    assert rho == pytest.approx(np.hypot(0.5, -1.2), 1e-14)
+    assert phi == pytest.approx(np.arctan2(-1.2, 0.5), 1e-14)
+    assert z == pytest.approx(2.0, 1e-14)
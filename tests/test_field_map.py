@@ -0,0 +1,43 @@
+import json
+
+import numpy as np
+import pytest
+from magnetism.field_map import evaluate_grid, get_grid_axes, main
+from magnetism.magnetic_force import evaluate_magnetic_force
+
+
+def test_evaluate_grid(magnetic_parameters_base):
+    # Test the chunked grid evaluation against the force kernel
+    axes = get_grid_axes({"x": [-4.0, 4.0, 4], "y": [0.0, 0.0, 1], "z": [3.0, 6.0, 4]})
+    result = evaluate_grid(axes, magnetic_parameters_base, ["force"], chunk_size=3)
+
+    x, y, z = np.meshgrid(*axes, indexing="ij")
+    expected = np.array(evaluate_magnetic_force(x, y, z, magnetic_parameters_base))
+    assert result["force"].shape == (3, 4, 1, 4)
+    assert np.allclose(
+        result["force"], expected, rtol=0, atol=1e-9 * np.abs(expected).max()
+    )
+
+
+def test_field_map_main(magnetic_parameters_base, tmp_path, capsys):
+    # Test the command line interface with several workers
+    config = {
+        "magnetic_parameters": magnetic_parameters_base,
+        "grid": {"x": [-4.0, 4.0, 6], "y": [-1.0, 1.0, 2], "z": [3.0, 6.0, 5]},
+    }
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps(config))
+    output_path = tmp_path / "map.npz"
+
+    main([str(config_path), str(output_path), "--workers", "2", "--chunk-size", "7"])
+
+    result = np.load(output_path)
+    assert result["field"].shape == (3, 6, 2, 5)
+    assert result["force"].shape == (3, 6, 2, 5)
+    assert result["field"][0, 0, 0, 0] == pytest.approx(
+        evaluate_grid(
+            get_grid_axes(config["grid"]), magnetic_parameters_base, ["field"]
+        )["field"][0, 0, 0, 0],
+        1e-14,
+    )
+    assert "points/s" in capsys.readouterr().out
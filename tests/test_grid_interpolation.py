@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from magnetism.field_map import evaluate_grid, get_grid_axes
+from magnetism.grid_interpolation import GridInterpolator
+from magnetism.ring_magnet import evaluate_ring_magnetic_field
+
+
+def test_grid_interpolator_accuracy(magnetic_parameters_base):
+    # Test the tricubic interpolation of a force grid against the exact force
+    parameters = dict(magnetic_parameters_base, rotation_x=30)
+    axes = get_grid_axes({"x": [-7, 7, 29], "y": [-7, 7, 29], "z": [-7, 7, 29]})
+    force = evaluate_grid(axes, parameters, ["force"])["force"]
+    interpolator = GridInterpolator(axes, force, parameters, "force")
+
+    rng = np.random.default_rng(0)
+    x, y, z = rng.uniform(-6, 6, (3, 2000))
+    error = interpolator.measure_error(x, y, z)
+    assert error["median"] < 1e-3
+    assert error["max"] < 0.1
+
+    # the grid nodes are reproduced, the interior of the magnet is masked
+    result = interpolator(axes[0][[3, 14]], axes[1][[5, 14]], axes[2][[27, 14]])
+    assert np.allclose(result[:, 0], force[:, 3, 5, 27], rtol=1e-12)
+    assert np.all(np.isnan(result[:, 1]))
+
+
+def test_grid_interpolator_memmap_and_bounds(magnetic_parameters_base, tmp_path):
+    axes = get_grid_axes({"x": [3, 6, 7], "y": [0, 0, 1], "z": [-2, 2, 9]})
+    field = evaluate_grid(axes, magnetic_parameters_base, ["field"])["field"]
+    np.save(tmp_path / "field.npy", field)
+    field_map = np.load(tmp_path / "field.npy", mmap_mode="r")
+
+    interpolator = GridInterpolator(axes, field_map)
+    x = np.array([3.0, 4.2, 7.0])
+    result = interpolator(x, 0.0, 0.3)
+    assert result.shape == (3, 3)
+    assert np.all(np.isnan(result[:, 2]))
+
+    clipped = GridInterpolator(axes, field_map, out_of_bounds="clip")(x, 0.0, 0.3)
+    assert np.allclose(clipped[:, 2], interpolator(6.0, 0.0, 0.3))
+
+    with pytest.raises(ValueError):
+        GridInterpolator(axes, field_map, out_of_bounds="raise")(x, 0.0, 0.3)
+
+
+def test_grid_interpolator_ring_magnet(magnetic_parameters_base):
+    # Test that the bore of a ring magnet is interpolated, not masked
+    parameters = dict(magnetic_parameters_base, radius_inner=1.5)
+    axes = get_grid_axes({"x": [-6, 6, 49], "y": [-6, 6, 49], "z": [0, 0, 1]})
+    x, y, z = np.meshgrid(*axes, indexing="ij")
+    field = np.array(evaluate_ring_magnetic_field(x, y, z, parameters))
+    interpolator = GridInterpolator(axes, field, parameters, "field")
+
+    bore = np.array([[0.1, 0.0, 0.0], [0.6, -0.4, 0.0], [1.3, 0.2, 0.0]]).T
+    result = interpolator(*bore)
+    expected = np.array(evaluate_ring_magnetic_field(*bore, parameters))
+    assert np.allclose(result, expected, rtol=1e-3)
+    assert np.all(np.isnan(interpolator(2.0, 0.0, 0.0)))
+
+    # the error skips points inside the magnet and reports without any
+    error = interpolator.measure_error(bore[0], bore[1], bore[2])
+    assert error["points"] == 3 and error["max"] < 1e-3
+    error = interpolator.measure_error([2.0], [0.0], [0.0])
+    assert error["points"] == 0 and np.isnan(error["max"])
@@ -0,0 +1,52 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# cold-start budget for importing the physics core in a fresh interpreter,
+# dominated by numpy and scipy.special
+IMPORT_TIME_BUDGET = 2.0  # s
+
+PHYSICS_MODULES = [
+    "magnetism.coordinate_transformation",
+    "magnetism.elliptic_integrals",
+    "magnetism.magnetic_field",
+    "magnetism.magnetic_force",
+    "magnetism.batch_evaluation",
+    "magnetism.field_map",
+]
+
+
+def _import_in_subprocess(module):
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(json.dumps({'time': elapsed, 'modules': sorted(sys.modules)}))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).parents[1],
+    ).stdout
+    return json.loads(output)
+
+
+@pytest.mark.parametrize("module", PHYSICS_MODULES)
+def test_physics_import_without_matplotlib(module):
+    # Test that the physics modules do not pull in matplotlib
+    result = _import_in_subprocess(module)
+
+    assert not any(name.split(".")[0] == "matplotlib" for name in result["modules"])
+
+
+def test_magnetic_force_import_time():
+    # Test the cold-start time of the force module
+    result = _import_in_subprocess("magnetism.magnetic_force")
+
+    assert result["time"] < IMPORT_TIME_BUDGET
@@ -0,0 +1,36 @@
+import numpy as np
+from magnetism.elliptic_integrals import EllipticK
+from magnetism.instrumentation import is_enabled, profile, report
+from magnetism.magnetic_force import evaluate_magnetic_force
+
+
+def test_profile_counts_stages(magnetic_parameters_base):
+    # Test call counts and own times of the force evaluation
+    x = np.array([1.0, 2.0, 3.0])
+    with profile() as counters:
+        assert is_enabled()
+        evaluate_magnetic_force(x, x, x, magnetic_parameters_base)
+    assert not is_enabled()
+
+    assert counters.calls["magnetic_force"] == 1
+    assert counters.calls["magnetic_field"] == 1
+    assert counters.calls["magnetisation_model"] == 1
+    assert counters.calls["coordinate_transformation.forward"] == 2
+    assert counters.calls["elliptic_integrals.Pi"] == 2
+    assert counters.calls["elliptic_integrals.carlson"] == 2
+    own_time = sum(counters.own_time.values())
+    assert np.isclose(own_time, counters.total_time["magnetic_force"])
+    assert "magnetic_force" in report(counters)
+
+
+def test_profile_counts_clamps():
+    with profile() as counters:
+        EllipticK(np.array([0.5, 1.0, 1.0]))
+        # scalar calls give Python bools as masks
+        EllipticK(0.5)
+        EllipticK(1.0)
+    assert counters.clamps["elliptic_integrals.m"] == 3
+
+    # nothing is collected outside of the with-block
+    EllipticK(1.0)
+    assert counters.clamps["elliptic_integrals.m"] == 3
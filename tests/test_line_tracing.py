@@ -0,0 +1,42 @@
+import numpy as np
+from magnetism.coordinate_transformation import transform_coordinates_forward
+from magnetism.line_tracing import trace_lines, write_lines_vtk
+from magnetism.magnetic_field import evaluate_magnetic_field
+
+
+def test_trace_field_lines(magnetic_parameters_base, tmp_path):
+    # Test that field lines follow H and run from surface to surface
+    parameters = dict(magnetic_parameters_base, rotation_x=20)
+    phi = np.linspace(0, 2 * np.pi, 100, endpoint=False)
+    seeds = np.stack([3.5 * np.cos(phi), 3.5 * np.sin(phi), np.cos(3 * phi)], axis=1)
+    result = trace_lines(seeds, parameters, "field", direction=0)
+
+    assert result["evaluations"] < 500
+    assert all(reasons == ("surface", "surface") for reasons in result["stop_reasons"])
+
+    lines = result["lines"]
+    segments = np.concatenate([line[1:] - line[:-1] for line in lines])
+    midpoints = np.concatenate([0.5 * (line[1:] + line[:-1]) for line in lines])
+    field = np.array(evaluate_magnetic_field(*midpoints.T, parameters)).T
+    cosine = np.sum(segments * field, axis=1) / (
+        np.linalg.norm(segments, axis=1) * np.linalg.norm(field, axis=1)
+    )
+    assert cosine.min() > 0.98
+
+    ends = np.array([line[[0, -1]] for line in lines]).reshape(-1, 3)
+    rho, _, z = transform_coordinates_forward(*ends.T, parameters)
+    distance = np.hypot(np.maximum(rho - 2.5, 0), np.maximum(np.abs(z) - 2.5, 0))
+    assert distance.max() < 2.5e-3
+
+    write_lines_vtk(tmp_path / "lines.vtk", lines)
+    text = (tmp_path / "lines.vtk").read_text()
+    assert f"LINES {len(lines)} " in text
+
+
+def test_trace_force_lines_to_boundary(magnetic_parameters_base):
+    bounds = [[-8, 8], [-8, 8], [-8, 8]]
+    seeds = [[4.0, 0.0, 1.0], [0.0, 0.5, 0.0]]
+    result = trace_lines(seeds, magnetic_parameters_base, "force", -1, bounds)
+    assert result["stop_reasons"] == ["boundary", "surface"]
+    assert np.isclose(np.abs(result["lines"][0][-1]).max(), 8)
+    assert len(result["lines"][1]) == 1
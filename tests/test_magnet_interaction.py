@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from magnetism.magnet_interaction import evaluate_magnet_interaction
+
+
+def test_dipole_limit(magnetic_parameters_base):
+    # Test far apart magnets against the force and torque of two dipoles
+    p = magnetic_parameters_base
+    m = p["magnetization"] * np.pi * p["radius_magnet"] ** 2 * p["length"]
+    d = 200.0
+
+    coaxial = evaluate_magnet_interaction(p, dict(p, z_position=d))
+    expected = -3 * p["magnetic_permeability"] * m**2 / (2 * np.pi * d**4)
+    assert coaxial["converged"]
+    assert coaxial["force"] == pytest.approx([0, 0, expected], rel=1e-3, abs=1e-9)
+
+    # a target rotated by 90 degrees about x is turned back by the field
+    rotated = evaluate_magnet_interaction(p, dict(p, z_position=d, rotation_x=90))
+    H = np.array([0.0, 0.0, m / (2 * np.pi * d**3)])
+    m_target = m * np.array([0.0, 1.0, 0.0])
+    expected = p["magnetic_permeability"] * np.cross(m_target, H)
+    assert rotated["torque"] == pytest.approx(expected, rel=1e-3, abs=1e-9)
+
+
+def test_action_and_reaction(magnetic_parameters_base):
+    # Test that force and torque balance between two arbitrary magnets
+    a = dict(
+        magnetic_parameters_base,
+        x_position=0.3,
+        rotation_x=20,
+        rotation_y=-35,
+        magnetization_direction=[1, 0.5, 0.2],
+    )
+    b = dict(
+        magnetic_parameters_base,
+        radius_magnet=1.5,
+        length=3.0,
+        x_position=4.0,
+        y_position=2.0,
+        z_position=5.0,
+        rotation_x=-50,
+        rotation_y=10,
+        magnetization=800.0,
+        magnetization_direction=[0.3, -1, 0.4],
+    )
+    on_b = evaluate_magnet_interaction(a, b, rtol=1e-9)
+    on_a = evaluate_magnet_interaction(b, a, rtol=1e-9)
+    assert on_a["converged"] and on_b["converged"]
+
+    scale = np.linalg.norm(on_b["force"])
+    assert np.allclose(on_a["force"], -on_b["force"], rtol=0, atol=1e-8 * scale)
+    arm = np.array([4.0 - 0.3, 2.0, 5.0])
+    total_torque = on_a["torque"] + on_b["torque"] + np.cross(arm, on_b["force"])
+    assert np.allclose(total_torque, 0, atol=1e-8 * scale * np.linalg.norm(arm))
+
+
+def test_close_separation(magnetic_parameters_base):
+    # Test that adaptive refinement resolves magnets 0.05 mm apart
+    p = magnetic_parameters_base
+    target = dict(p, z_position=5.05)
+    result = evaluate_magnet_interaction(p, target, rtol=1e-8)
+    reference = evaluate_magnet_interaction(p, target, rtol=1e-11, max_level=12)
+    assert result["converged"]
+    assert result["force"][2] == pytest.approx(reference["force"][2], rel=1e-7)
+    assert result["evaluations"] < reference["evaluations"]
+
+
+def test_sweep(magnetic_parameters_base):
+    # Test that a batch of poses gives the results of the single poses
+    p = magnetic_parameters_base
+    poses = [
+        dict(p, x_position=x, z_position=8.0, rotation_y=angle)
+        for x in (-3.0, 0.0, 4.0)
+        for angle in (0, 30, 90)
+    ]
+    sweep = evaluate_magnet_interaction(p, poses)
+    assert sweep["force"].shape == (9, 3)
+    assert sweep["converged"].all()
+    for i in (0, 4, 8):
+        single = evaluate_magnet_interaction(p, poses[i])
+        assert np.allclose(single["force"], sweep["force"][i], rtol=1e-5)
+        assert np.allclose(single["torque"], sweep["torque"][i], rtol=1e-5)
@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 from magnetism.magnetic_field import evaluate_magnetic_field
 
@@ -63,3 +64,70 @@ def test_magnetic_field_5(magnetic_parameters_base):
     assert result[0] == pytest.approx(45.5237803563867, 1e-14)
     assert result[1] == pytest.approx(36.419024285109366, 1e-14)
     assert result[2] == pytest.approx(371.5106772862314, 1e-14)
+
+
+def test_magnetic_field_array(magnetic_parameters_base):
+    # Test that arrays of points give the same result as single points
+    X = np.array([3.0, 0.0, -3.0, -3.0, 0.5])
+    Y = np.array([0.0, 3.0, 0.0, 0.0, 0.4])
+    Z = np.array([4.0, 4.0, 4.0, -4.0, 2.9])
+    result = evaluate_magnetic_field(X, Y, Z, magnetic_parameters_base)
+
+    for i in range(len(X)):
+        expected = evaluate_magnetic_field(X[i], Y[i], Z[i], magnetic_parameters_base)
+        for component, value in zip(result, expected):
+            assert component[i] == pytest.approx(value, 1e-14)
+
+
+@pytest.mark.parametrize(
+    "point, expected",
+    [
+        ((3.0, 1.0, 4.0), (1.6175131314061417, 21.30919461382161, 91.42841685246928)),
+        ((1.0, 0.5, 0.5), (-365.7010059180325, -5.3633039058727805, 20.67075296792564)),
+    ],
+)
+def test_magnetic_field_transverse(magnetic_parameters_base, point, expected):
+    # Test a diametrically magnetized magnet outside and inside against a
+    # quadrature of its surface charges
+    magnetic_parameters_base["magnetization_direction"] = [1, 0, 0]
+    result = evaluate_magnetic_field(*point, magnetic_parameters_base)
+
+    assert result == pytest.approx(expected, rel=1e-12, abs=1e-12)
+
+
+def test_magnetic_field_direction_superposition(magnetic_parameters_base):
+    # Test that the field is linear in the magnetization direction
+    X = np.array([3.0, 0.5, -2.0, 1.0])
+    Y = np.array([1.0, 0.4, 5.0, -0.5])
+    Z = np.array([4.0, 2.9, -1.0, 0.5])
+    magnetic_parameters_base["rotation_x"] = 30
+    d = np.array([0.6, -0.8, 1.2])
+
+    result = np.array(
+        evaluate_magnetic_field(
+            X, Y, Z, {**magnetic_parameters_base, "magnetization_direction": d}
+        )
+    )
+    expected = sum(
+        component
+        * np.array(
+            evaluate_magnetic_field(
+                X, Y, Z, {**magnetic_parameters_base, "magnetization_direction": axis}
+            )
+        )
+        for component, axis in zip(d / np.linalg.norm(d), np.eye(3))
+    )
+    axial = np.array(evaluate_magnetic_field(X, Y, Z, magnetic_parameters_base))
+
+    assert result == pytest.approx(expected, rel=1e-12, abs=1e-9)
+    assert axial == pytest.approx(
+        np.array(
+            evaluate_magnetic_field(
+                X,
+                Y,
+                Z,
+                {**magnetic_parameters_base, "magnetization_direction": [0, 0, 1]},
+            )
+        ),
+        1e-14,
+    )
@@ -1,4 +1,6 @@
+import numpy as np
 import pytest
+from magnetism.magnetic_field import evaluate_magnetic_field
 from magnetism.magnetic_force import evaluate_magnetic_force
 
 
@@ -60,3 +62,53 @@ def test_magnetic_force_5(magnetic_parameters_base):
     assert result[0] == pytest.approx(6.350220130923992e-09, 1e-14)
     assert result[1] == pytest.approx(5.080176104739194e-09, 1e-14)
     assert result[2] == pytest.approx(-3.682112343191538e-07, 1e-14)
+
+
+def test_magnetic_force_array(magnetic_parameters_base):
+    # Test that arrays of points give the same result as single points
+    X = np.array([3.0, 0.0, -3.0, -3.0, 0.5])
+    Y = np.array([0.0, 3.0, 0.0, 0.0, 0.4])
+    Z = np.array([4.0, 4.0, 4.0, -4.0, 2.9])
+    result = evaluate_magnetic_force(X, Y, Z, magnetic_parameters_base)
+
+    for i in range(len(X)):
+        expected = evaluate_magnetic_force(X[i], Y[i], Z[i], magnetic_parameters_base)
+        for component, value in zip(result, expected):
+            assert component[i] == pytest.approx(value, 1e-14)
+
+
+def test_magnetic_force_transverse(magnetic_parameters_base):
+    # Test the force of a magnet with an oblique magnetization against
+    # central differences of |H|^2
+    magnetic_parameters_base.update(
+        rotation_x=25, rotation_y=-40, magnetization_direction=[0.3, -1.0, 0.5]
+    )
+    points = np.array([[3.0, 1.0, 4.0], [0.5, 0.4, 4.5], [-6.0, 2.0, -1.0]]).T
+
+    def get_field_energy(points):
+        H = np.array(evaluate_magnetic_field(*points, magnetic_parameters_base))
+        return np.sum(H**2, axis=0)
+
+    h = 1e-4
+    gradient = np.array(
+        [
+            (
+                get_field_energy(points + h * np.eye(3)[:, [i]])
+                - get_field_energy(points - h * np.eye(3)[:, [i]])
+            )
+            / (2 * h)
+            for i in range(3)
+        ]
+    )
+    magnetic_volume = (4 / 3) * np.pi * magnetic_parameters_base["radius_particle"] ** 3
+    expected = (
+        0.5
+        * magnetic_parameters_base["magnetic_permeability"]
+        * magnetic_volume
+        * gradient
+    )
+
+    result = np.array(evaluate_magnetic_force(*points, magnetic_parameters_base))
+
+    error = np.linalg.norm(result - expected, axis=0)
+    assert np.all(error < 1e-6 * np.linalg.norm(expected, axis=0))
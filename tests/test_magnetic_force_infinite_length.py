@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from magnetism.coordinate_transformation import transform_coordinates_forward
+from magnetism.magnetic_field import evaluate_magnetic_field
+from magnetism.magnetic_force import evaluate_magnetic_force
+from magnetism.magnetic_force_infinite_length import (
+    evaluate_magnetic_field_inf,
+    evaluate_magnetic_force_auto,
+    evaluate_magnetic_force_inf,
+    evaluate_magnetic_force_inf_3d,
+    get_infinite_length_region,
+)
+
+
+def test_magnetic_force_inf_3d_reproduces_2d(magnetic_parameters_base):
+    # Test that the magnet rotated onto the y axis gives the 2D model
+    magnetic_parameters_base["rotation_x"] = 90
+    magnetic_parameters_base["x_position"] = 0.5
+    magnetic_parameters_base["z_position"] = -1.0
+    X = np.array([3.0, -4.0, 0.5])
+    Y = np.array([0.0, 2.0, -7.0])
+    Z = np.array([4.0, 1.0, -6.0])
+    result = evaluate_magnetic_force_inf_3d(X, Y, Z, magnetic_parameters_base)
+
+    for i in range(len(X)):
+        expected = evaluate_magnetic_force_inf(
+            X[i], Y[i], Z[i], magnetic_parameters_base
+        )
+        assert result[0][i] == pytest.approx(expected[0], 1e-12)
+        assert result[1][i] == pytest.approx(0, abs=1e-20)
+        assert result[2][i] == pytest.approx(expected[2], 1e-12)
+
+
+def test_magnetic_field_inf_outside(magnetic_parameters_base):
+    # Test the line dipole field in the plane perpendicular to the axis
+    result = evaluate_magnetic_field_inf(0.0, 5.0, 0.0, magnetic_parameters_base)
+
+    assert result[0] == pytest.approx(-0.5 * 1e3 * 2.5**2 / 5.0**2, 1e-14)
+    assert result[1] == pytest.approx(0, abs=1e-10)
+    assert result[2] == pytest.approx(0, 1e-14)
+
+
+def test_magnetic_force_auto(magnetic_parameters_base):
+    # Test that the selector agrees with the finite-length model
+    magnetic_parameters_base["rotation_y"] = 30
+    rng = np.random.default_rng(0)
+    X, Y, Z = rng.uniform(-8.0, 8.0, (3, 200))
+    result = np.array(
+        evaluate_magnetic_force_auto(X, Y, Z, magnetic_parameters_base, 1e-2)
+    )
+    expected = np.array(evaluate_magnetic_force(X, Y, Z, magnetic_parameters_base))
+
+    deviation = np.sqrt(np.sum((result - expected) ** 2, axis=0))
+    assert np.all(deviation <= 2e-2 * np.sqrt(np.sum(expected**2, axis=0)))
+
+
+def test_magnetic_force_auto_transverse(magnetic_parameters_base):
+    # Test the selector on a long diametrically magnetized rod, where the
+    # infinite-length model covers a part of the points
+    magnetic_parameters_base.update(
+        length=100.0, rotation_x=30, magnetization_direction=[0, 1, 0]
+    )
+    region = get_infinite_length_region(magnetic_parameters_base, 1e-2)
+    rng = np.random.default_rng(0)
+    X, Y, Z = rng.uniform(-10.0, 10.0, (3, 200))
+    result = np.array(
+        evaluate_magnetic_force_auto(
+            X, Y, Z, magnetic_parameters_base, 1e-2, region=region
+        )
+    )
+    expected = np.array(evaluate_magnetic_force(X, Y, Z, magnetic_parameters_base))
+
+    assert region[2].any()
+    deviation = np.sqrt(np.sum((result - expected) ** 2, axis=0))
+    assert np.all(deviation <= 2e-2 * np.sqrt(np.sum(expected**2, axis=0)))
+
+
+@pytest.mark.parametrize("magnetization_direction", [[1, 0, 0], [0.3, -1, 0.5]])
+def test_magnetic_field_inf_direction(
+    magnetic_parameters_base, magnetization_direction
+):
+    # Test the field against a long finite magnet near its mid-plane, away
+    # from the surface where the field is discontinuous
+    magnetic_parameters_base.update(
+        length=1000.0,
+        rotation_x=30,
+        magnetization_direction=magnetization_direction,
+    )
+    rng = np.random.default_rng(0)
+    X, Y, Z = rng.uniform(-8.0, 8.0, (3, 50))
+    rho = transform_coordinates_forward(X, Y, Z, magnetic_parameters_base)[0]
+    X, Y, Z = (c[np.abs(rho - 2.5) > 0.1] for c in (X, Y, Z))
+    result = np.array(evaluate_magnetic_field_inf(X, Y, Z, magnetic_parameters_base))
+    expected = np.array(evaluate_magnetic_field(X, Y, Z, magnetic_parameters_base))
+
+    assert result == pytest.approx(expected, rel=1e-3, abs=1e-2)
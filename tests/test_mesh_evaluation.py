@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from magnetism.batch_evaluation import (
+    evaluate_magnetic_field_batch,
+    evaluate_magnetic_force_batch,
+)
+from magnetism.mesh_evaluation import evaluate_mesh, read_mesh_nodes
+
+
+@pytest.fixture
+def nodes():
+    rng = np.random.default_rng(0)
+    return rng.uniform(3, 6, (101, 3))
+
+
+def _write_nodes(path, nodes, mesh_format):
+    if mesh_format == "npy":
+        np.save(path, nodes)
+    elif mesh_format == "raw":
+        nodes.astype("<f8").tofile(path)
+    elif mesh_format == "csv":
+        np.savetxt(path, nodes, delimiter=",", header="x,y,z", comments="")
+    elif mesh_format == "vtk-ascii":
+        with open(path, "w") as file:
+            file.write("# vtk DataFile Version 3.0\nnodes\nASCII\n")
+            file.write(f"DATASET POLYDATA\nPOINTS {len(nodes)} double\n")
+            np.savetxt(file, nodes)
+    elif mesh_format == "vtk-binary":
+        with open(path, "wb") as file:
+            file.write(b"# vtk DataFile Version 3.0\nnodes\nBINARY\n")
+            file.write(f"DATASET POLYDATA\nPOINTS {len(nodes)} float\n".encode())
+            file.write(nodes.astype(">f4").tobytes())
+
+
+@pytest.mark.parametrize(
+    "mesh_format, extension",
+    [
+        ("npy", ".npy"),
+        ("raw", ".bin"),
+        ("csv", ".csv"),
+        ("vtk-ascii", ".vtk"),
+        ("vtk-binary", ".vtk"),
+    ],
+)
+def test_read_mesh_nodes(nodes, tmp_path, mesh_format, extension):
+    path = str(tmp_path / f"nodes{extension}")
+    _write_nodes(path, nodes, mesh_format)
+    n_nodes, chunks = read_mesh_nodes(path, chunk_size=16)
+    chunks = list(chunks)
+    assert n_nodes == len(nodes)
+    assert all(len(chunk) == 16 for chunk in chunks[:-1])
+    rtol = 1e-7 if mesh_format == "vtk-binary" else 1e-15
+    assert np.allclose(np.concatenate(chunks), nodes, rtol=rtol, atol=0)
+
+
+@pytest.mark.parametrize("workers, output", [(1, "result.csv"), (2, "result.npy")])
+def test_evaluate_mesh(magnetic_parameters_base, nodes, tmp_path, workers, output):
+    # Test that the results are written in node order
+    input_path = str(tmp_path / "nodes.npy")
+    output_path = str(tmp_path / output)
+    np.save(input_path, nodes)
+    evaluate_mesh(
+        input_path,
+        output_path,
+        magnetic_parameters_base,
+        ["force", "field"],
+        chunk_size=10,
+        workers=workers,
+    )
+
+    if output.endswith(".csv"):
+        result = np.loadtxt(output_path, delimiter=",", skiprows=1)
+    else:
+        result = np.load(output_path)
+    x, y, z = nodes.T
+    expected = np.concatenate(
+        [
+            evaluate_magnetic_force_batch(x, y, z, magnetic_parameters_base),
+            evaluate_magnetic_field_batch(x, y, z, magnetic_parameters_base),
+        ]
+    ).T
+    assert result.shape == (len(nodes), 6)
+    assert np.allclose(result, expected, rtol=1e-14)
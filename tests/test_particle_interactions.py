@@ -0,0 +1,84 @@
+import numpy as np
+from magnetism.batch_evaluation import evaluate_magnetic_force_batch
+from magnetism.particle_interactions import (
+    ParticleInteractions,
+    build_neighbor_list,
+    evaluate_dipole_forces,
+    step_particles,
+)
+
+
+def test_neighbor_list_brute_force():
+    points = np.random.default_rng(0).uniform(0, 1, (3, 500))
+    pairs = build_neighbor_list(points, 0.15)
+    distance = np.linalg.norm(points[:, :, None] - points[:, None, :], axis=0)
+    i, j = np.nonzero(np.triu(distance < 0.15, k=1))
+    assert set(map(tuple, np.sort(pairs.T, axis=1))) == set(zip(i, j))
+    assert pairs.shape[1] == len(i)
+
+
+def test_dipole_pair():
+    # two moments along their separation attract each other with
+    # 6 mu_0 m^2 / (4 pi d^4)
+    points = np.array([[0.0, 0.0], [0.0, 0.0], [0.0, 2.0]])
+    moments = np.array([[0.0, 0.0], [0.0, 0.0], [3.0, 3.0]])
+    forces = evaluate_dipole_forces(points, moments, np.array([[0], [1]]), 1.5)
+    expected = 6 * 1.5 * 9 / (4 * np.pi * 16)
+    assert np.allclose(forces, [[0, 0], [0, 0], [expected, -expected]])
+
+    # side by side they repel
+    points = np.array([[0.0, 2.0], [0.0, 0.0], [0.0, 0.0]])
+    forces = evaluate_dipole_forces(points, moments, np.array([[0], [1]]), 1.5)
+    assert forces[0, 0] < 0 < forces[0, 1]
+
+
+def test_interactions_reuse_neighbor_list(magnetic_parameters_base):
+    a = magnetic_parameters_base["radius_particle"]
+    rng = np.random.default_rng(1)
+    points = np.array([[0.0], [0.0], [4.0]]) + rng.uniform(0, 40 * a, (3, 2000))
+    interactions = ParticleInteractions(magnetic_parameters_base)
+    result = interactions.evaluate(points)
+    assert np.array_equal(
+        result["magnet_force"],
+        evaluate_magnetic_force_batch(*points, magnetic_parameters_base),
+    )
+    assert np.any(result["interaction_force"] != 0)
+    assert np.allclose(result["interaction_force"].sum(axis=1), 0, atol=1e-12)
+
+    # small moves reuse the list with the same result as a fresh one
+    moved = points + rng.uniform(-0.5, 0.5, points.shape) * 0.2 * a
+    reused = interactions.evaluate(moved)["force"]
+    assert interactions.rebuilds == 1
+    fresh = ParticleInteractions(magnetic_parameters_base).evaluate(moved)["force"]
+    assert np.allclose(reused, fresh, rtol=1e-12, atol=0)
+    interactions.evaluate(moved + 5 * a)
+    assert interactions.rebuilds == 2
+
+
+def test_step_particles(magnetic_parameters_base):
+    points = np.array([[0.0, 0.1, 1.0], [0.0, 0.0, 0.0], [2.6, 3.0, 8.0]])
+    interactions = ParticleInteractions(magnetic_parameters_base)
+    steps = []
+    result = step_particles(
+        interactions, points, 1.0, 10, lambda step, *_: steps.append(step)
+    )
+    assert steps == list(range(10))
+    assert result["captured"][0] and not result["captured"][2]
+    assert result["points"][2, 2] < 8.0
+
+
+def test_step_all_captured(magnetic_parameters_base):
+    interactions = ParticleInteractions(magnetic_parameters_base)
+    empty = interactions.evaluate(np.empty((3, 0)))
+    assert empty["force"].shape == (3, 0)
+    assert interactions.evaluate(np.empty((3, 0)))["force"].shape == (3, 0)
+
+    # two particles inside the magnet from the start, one captured on the way
+    points = np.array([[0.0, 1.0, 0.0], [0.0, 0.0, 0.0], [0.0, 1.0, 2.6]])
+    steps = []
+    result = step_particles(
+        interactions, points, 1.0, 50, lambda step, *_: steps.append(step)
+    )
+    assert np.all(result["captured"])
+    assert 0 < len(steps) < 50
+    assert np.array_equal(result["points"][:, :2], points[:, :2])
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from magnetism.placement_optimization import PlacementObjective, optimize_placement
+
+
+@pytest.fixture
+def target_points():
+    rng = np.random.default_rng(0)
+    return rng.uniform([-1, -1, 9], [1, 1, 11], (200, 3))
+
+
+def test_objective_cache_and_workers(magnetic_parameters_base, target_points):
+    bounds = {"x_position": (-5, 5), "rotation_y": (-90, 90)}
+    candidates = np.array([[0.5, 0.5], [0.2, 0.9], [0.5, 0.5]])
+    with PlacementObjective(magnetic_parameters_base, bounds, target_points) as serial:
+        values = serial.evaluate(candidates)
+        assert serial.evaluations == 2 and serial.cache_hits == 1
+        assert np.array_equal(serial.evaluate(candidates[:2]), values[:2])
+        assert serial.evaluations == 2 and serial.cache_hits == 3
+        assert serial.get_parameters([0.2, 0.9])["rotation_y"] == pytest.approx(72)
+
+    with PlacementObjective(
+        magnetic_parameters_base, bounds, target_points.T, workers=2
+    ) as parallel:
+        assert np.array_equal(parallel.evaluate(candidates), values)
+
+
+def test_directed_objective(magnetic_parameters_base, target_points):
+    # the magnet below the target points attracts them downwards
+    with PlacementObjective(
+        magnetic_parameters_base,
+        {"z_position": (0, 5)},
+        target_points,
+        "mean_directed_force",
+        direction=[0, 0, -2],
+    ) as objective:
+        value, gradient = objective.evaluate_gradient([0.5])
+        assert value > 0
+        assert gradient[0] > 0
+
+    # a directed objective needs a direction of non-zero length
+    for direction in (None, [0, 0, 0]):
+        with pytest.raises(ValueError, match="direction"):
+            PlacementObjective(
+                magnetic_parameters_base,
+                {"z_position": (0, 5)},
+                target_points,
+                "min_directed_force",
+                direction=direction,
+            )
+
+
+@pytest.mark.parametrize("method", ["population", "gradient"])
+def test_optimize_placement(magnetic_parameters_base, target_points, method):
+    # Test that the magnet is moved as close as possible to the target points
+    with PlacementObjective(
+        magnetic_parameters_base,
+        {"z_position": (0, 5), "radius_magnet": (1, 2.5)},
+        target_points,
+    ) as objective:
+        start = objective.evaluate([0.3, 0.3])[0]
+        result = optimize_placement(
+            objective, method, x0=[0.3, 0.3], maxiter=50, seed=1
+        )
+
+    assert result["value"] > start
+    assert result["parameters"]["z_position"] == pytest.approx(5, abs=1e-3)
+    assert result["parameters"]["radius_magnet"] == pytest.approx(2.5, abs=1e-3)
+    assert result["evaluations"] > 0
@@ -0,0 +1,62 @@
+import functools
+import tracemalloc
+
+import numpy as np
+import pytest
+from magnetism.magnetic_field import evaluate_magnetic_field
+from magnetism.magnetic_force import evaluate_magnetic_force
+from magnetism.precision import evaluate_in_chunks, evaluate_precision_error
+
+
+def test_single_precision_dtype(magnetic_parameters_base):
+    # Test that single precision evaluation returns single precision arrays
+    X = np.array([3.0, 0.5], dtype=np.float32)
+    Y = np.array([0.0, 0.4], dtype=np.float32)
+    Z = np.array([4.0, 2.9], dtype=np.float32)
+    field = evaluate_magnetic_field(X, Y, Z, magnetic_parameters_base, np.float32)
+    force = evaluate_magnetic_force(X, Y, Z, magnetic_parameters_base, dtype=np.float32)
+
+    for component in field + force:
+        assert component.dtype == np.float32
+
+
+def test_single_precision_error(magnetic_parameters_base):
+    # Test the error against double precision near and far from the magnet
+    magnetic_parameters_base["rotation_x"] = 20
+    magnetic_parameters_base["rotation_y"] = -35
+    rng = np.random.default_rng(0)
+    X, Y, Z = rng.uniform(-100.0, 100.0, (3, 1000))
+    errors = evaluate_precision_error(X, Y, Z, magnetic_parameters_base)
+
+    assert errors["field"]["max"] == pytest.approx(0, abs=1e-5)
+    assert errors["force"]["max"] == pytest.approx(0, abs=1e-5)
+
+
+def test_single_precision_chunks(magnetic_parameters_base):
+    # Test that the chunks of the single precision mode join seamlessly
+    X, Y, Z = np.random.default_rng(0).uniform(-8.0, 8.0, (3, 4, 25))
+    force = functools.partial(
+        evaluate_magnetic_force,
+        magnetic_parameters=magnetic_parameters_base,
+        dtype=np.float32,
+    )
+    result = evaluate_in_chunks(force, X, Y, Z, np.float32, chunk_size=7)
+    expected = force(X, Y, Z)
+
+    assert np.array_equal(result, expected)
+    assert result[0].shape == (4, 25)
+
+
+@pytest.mark.parametrize("evaluate", [evaluate_magnetic_field, evaluate_magnetic_force])
+def test_single_precision_memory(magnetic_parameters_base, evaluate):
+    # Test that the single precision mode bounds the memory of large batches
+    points = np.random.default_rng(0).uniform(3.0, 8.0, (3, 200000))
+    peaks = []
+    for dtype in (None, np.float32):
+        x, y, z = points if dtype is None else points.astype(dtype)
+        tracemalloc.start()
+        evaluate(x, y, z, magnetic_parameters_base, dtype=dtype)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    assert peaks[1] < 0.5 * peaks[0]
@@ -0,0 +1,150 @@
+import asyncio
+import json
+
+import numpy as np
+from magnetism.field_map import QUANTITIES
+from magnetism.magnetic_field import evaluate_magnetic_field
+from magnetism.query_service import QueryClient, QueryService
+
+
+async def _request(path, message):
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write(json.dumps(message).encode() + b"\n")
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    writer.close()
+    return response
+
+
+def _query_blocking(path):
+    with QueryClient(path) as client:
+        return client.evaluate("field", [4.0, 5.0], 0.0, 2.0)
+
+
+def test_query_service_coalesces_requests(magnetic_parameters_base, tmp_path):
+    # Test that concurrent clients are answered from a single batch
+    path = str(tmp_path / "magnetism.sock")
+    service = QueryService(magnetic_parameters_base, latency_window=0.2)
+    points = np.array([[4.0, 0.5 * i, 1.0] for i in range(8)])
+
+    async def scenario():
+        server = await service.start(path)
+        async with server:
+            responses = await asyncio.gather(
+                *(
+                    _request(
+                        path, {"id": i, "quantity": "field", "points": [point.tolist()]}
+                    )
+                    for i, point in enumerate(points)
+                )
+            )
+            # the blocking client, used from a thread as a script would
+            values = await asyncio.get_running_loop().run_in_executor(
+                None, _query_blocking, path
+            )
+        return responses, values
+
+    responses, values = asyncio.run(scenario())
+
+    assert [response["id"] for response in responses] == list(range(8))
+    result = np.array([response["values"][0] for response in responses]).T
+    expected = np.array(evaluate_magnetic_field(*points.T, magnetic_parameters_base))
+    assert np.allclose(result, expected, rtol=1e-10)
+    assert np.allclose(
+        values,
+        evaluate_magnetic_field(
+            np.array([4.0, 5.0]), 0.0, 2.0, magnetic_parameters_base
+        ),
+        rtol=1e-10,
+    )
+
+    statistics = service.get_statistics()
+    assert statistics["requests"] == 9
+    assert statistics["batches"] == 2
+    assert statistics["max_batch_points"] == 8
+
+
+def test_query_service_errors(magnetic_parameters_base, tmp_path):
+    path = str(tmp_path / "magnetism.sock")
+    service = QueryService(magnetic_parameters_base)
+
+    async def scenario():
+        server = await service.start(path)
+        async with server:
+            return await _request(path, {"id": 3, "quantity": "potential"})
+
+    response = asyncio.run(scenario())
+    assert response["id"] == 3
+    assert "error" in response
+
+
+def test_query_service_invalid_json(magnetic_parameters_base, tmp_path):
+    # Test that the reply to a malformed line does not interleave with others
+    path = str(tmp_path / "magnetism.sock")
+    service = QueryService(magnetic_parameters_base, latency_window=0.01)
+
+    async def scenario():
+        server = await service.start(path)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path)
+            request = {"id": 1, "quantity": "field", "points": [[4.0, 0.0, 1.0]]}
+            writer.write(json.dumps(request).encode() + b"\n{invalid\n")
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in range(2)]
+            writer.close()
+        return responses
+
+    responses = asyncio.run(scenario())
+    assert sorted("id" in response for response in responses) == [False, True]
+    assert any("values" in response for response in responses)
+
+
+def test_query_service_large_requests(magnetic_parameters_base, tmp_path):
+    # Test requests beyond the default 64 KiB line limit of asyncio streams
+    path = str(tmp_path / "magnetism.sock")
+    points = np.random.default_rng(0).uniform(3, 8, (3000, 3))
+    request = {"id": 1, "quantity": "field", "points": points.tolist()}
+    assert len(json.dumps(request)) > 2**16
+
+    async def scenario(service):
+        server = await service.start(path)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path, limit=2**24)
+            responses = []
+            for message in (request, {"id": 2, "command": "statistics"}):
+                writer.write(json.dumps(message).encode() + b"\n")
+                await writer.drain()
+                responses.append(json.loads(await reader.readline()))
+            writer.close()
+        return responses
+
+    responses = asyncio.run(scenario(QueryService(magnetic_parameters_base)))
+    expected = np.array(evaluate_magnetic_field(*points.T, magnetic_parameters_base))
+    assert np.allclose(np.array(responses[0]["values"]).T, expected, rtol=1e-10)
+
+    # a line beyond the limit of the service is answered with an error and
+    # the connection stays usable
+    service = QueryService(magnetic_parameters_base, max_batch_points=100)
+    responses = asyncio.run(scenario(service))
+    assert "exceeds" in responses[0]["error"]
+    assert responses[1]["id"] == 2 and "statistics" in responses[1]
+
+
+def test_query_service_kernel_error(magnetic_parameters_base, tmp_path, monkeypatch):
+    # Test that any failure of a kernel is answered, not only invalid requests
+    def fail(x, y, z, magnetic_parameters):
+        raise RuntimeError("kernel failed")
+
+    monkeypatch.setitem(QUANTITIES, "force", fail)
+    path = str(tmp_path / "magnetism.sock")
+    service = QueryService(magnetic_parameters_base)
+
+    async def scenario():
+        server = await service.start(path)
+        async with server:
+            return await _request(
+                path, {"id": 4, "quantity": "force", "points": [[4.0, 0.0, 1.0]]}
+            )
+
+    response = asyncio.run(scenario())
+    assert response == {"id": 4, "error": "RuntimeError: kernel failed"}
@@ -0,0 +1,63 @@
+import numpy as np
+from magnetism.batch_evaluation import evaluate_magnetic_force_batch
+from magnetism.region_averaging import integrate_box, integrate_cylinder
+
+
+def test_integrate_box(magnetic_parameters_base):
+    # Test the mean force over a box against a fine midpoint rule
+    bounds = [[3, 5], [-1, 1], [-1, 2]]
+    result = integrate_box(bounds, magnetic_parameters_base, "force", rtol=1e-6)
+    assert result["converged"]
+    assert result["measure"] == 12.0
+
+    n = 60
+    axes = [
+        (np.arange(n) + 0.5) / n * (upper - lower) + lower for lower, upper in bounds
+    ]
+    x, y, z = np.meshgrid(*axes, indexing="ij")
+    expected = evaluate_magnetic_force_batch(x, y, z, magnetic_parameters_base)
+    expected = expected.reshape(3, -1).mean(axis=1)
+    scale = np.linalg.norm(expected)
+    assert np.allclose(result["mean"], expected, rtol=0, atol=1e-3 * scale)
+    assert result["evaluations"] < n**3 / 4
+
+
+def test_integrate_cylinder_and_disk(magnetic_parameters_base):
+    # the force on a disk centred on the magnet axis points along the axis
+    disk = integrate_cylinder(
+        [0, 0, 4], [0, 0, 1], 2.0, 0.0, magnetic_parameters_base, "force"
+    )
+    assert np.isclose(disk["measure"], np.pi * 4)
+    assert disk["integral"][2] < 0
+    assert np.allclose(disk["integral"][:2], 0, atol=1e-9 * abs(disk["integral"][2]))
+
+    # the same cylinder described along another axis direction
+    cylinder = integrate_cylinder(
+        [4, 0, 0], [0, 0, 1], 1.0, 2.0, magnetic_parameters_base, "force_magnitude"
+    )
+    flipped = integrate_cylinder(
+        [4, 0, 0], [0, 0, -1], 1.0, 2.0, magnetic_parameters_base, "force_magnitude"
+    )
+    assert np.isclose(cylinder["measure"], 2 * np.pi)
+    assert np.isclose(cylinder["integral"], flipped["integral"], rtol=1e-4)
+    assert cylinder["error"] < 1e-3 * cylinder["integral"]
+
+
+def test_integrate_excluded_magnet(magnetic_parameters_base):
+    # the mean over a disk through the magnet is taken outside of it only
+    disk = integrate_cylinder(
+        [0, 0, 0], [0, 0, 1], 4.0, 0.0, magnetic_parameters_base, "field_magnitude"
+    )
+    assert np.isclose(disk["measure"], np.pi * (4.0**2 - 2.5**2))
+    assert np.isclose(disk["mean"], disk["integral"] / disk["measure"])
+
+    whole = integrate_cylinder(
+        [0, 0, 0],
+        [0, 0, 1],
+        4.0,
+        0.0,
+        magnetic_parameters_base,
+        "field_magnitude",
+        exclude_magnet=False,
+    )
+    assert np.isclose(whole["measure"], np.pi * 4.0**2)
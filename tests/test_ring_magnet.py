@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from magnetism.coordinate_transformation import is_inside_magnet
+from magnetism.magnetic_field import evaluate_magnetic_field
+from magnetism.magnetic_force import evaluate_magnetic_force
+from magnetism.ring_magnet import (
+    evaluate_ring_magnetic_field,
+    evaluate_ring_magnetic_force,
+)
+
+
+@pytest.fixture
+def ring_parameters(magnetic_parameters_base):
+    magnetic_parameters = dict(magnetic_parameters_base, radius_inner=1.0)
+    magnetic_parameters["x_position"] = 0.5
+    return magnetic_parameters
+
+
+def test_ring_magnetic_field(ring_parameters):
+    # Test the field against the difference of two solid cylinders in the
+    # hole, in the ring and outside
+    x = np.array([0.5, 0.2, 1.5, 0.0, 4.0, 6.0])
+    y = np.array([0.0, 0.3, 0.5, 2.0, 1.0, -3.0])
+    z = np.array([0.0, 2.0, 0.5, -1.0, 3.0, 4.0])
+    inner_parameters = dict(ring_parameters, radius_magnet=1.0)
+    inner_parameters.pop("radius_inner")
+
+    result = np.array(evaluate_ring_magnetic_field(x, y, z, ring_parameters))
+    outer = np.array(evaluate_magnetic_field(x, y, z, ring_parameters))
+    inner = np.array(evaluate_magnetic_field(x, y, z, inner_parameters))
+
+    assert result.shape == (3, 6)
+    assert result == pytest.approx(outer - inner, rel=1e-12, abs=1e-9)
+    assert is_inside_magnet(x, y, z, ring_parameters).tolist() == [
+        False,
+        False,
+        True,
+        True,
+        False,
+        False,
+    ]
+
+
+def test_ring_magnetic_force_thin_hole(magnetic_parameters_base):
+    # Test that a ring with a tiny hole exerts the force of a solid cylinder
+    ring_parameters = dict(magnetic_parameters_base, radius_inner=1e-4)
+    rng = np.random.default_rng(0)
+    x, y, z = rng.uniform(-8, 8, (3, 500))
+    away = (np.hypot(x, y) > 3.0) | (np.abs(z) > 3.0)
+    x, y, z = x[away], y[away], z[away]
+
+    result = np.array(evaluate_ring_magnetic_force(x, y, z, ring_parameters))
+    expected = np.array(evaluate_magnetic_force(x, y, z, magnetic_parameters_base))
+
+    error = np.linalg.norm(result - expected, axis=0)
+    assert np.all(error < 1e-6 * np.linalg.norm(expected, axis=0))
+
+
+def test_ring_magnetic_force_gradient(ring_parameters):
+    # Test the force against central differences of |H|^2 in cartesian
+    # coordinates, including a point on the axis above the hole
+    ring_parameters.update(rotation_x=20, rotation_y=-35)
+    points = np.array([[0.5, 0.0, 4.0], [4.0, 1.0, 3.0], [-2.0, 3.0, -4.5]]).T
+
+    def get_field_energy(points):
+        H = np.array(evaluate_ring_magnetic_field(*points, ring_parameters))
+        return np.sum(H**2, axis=0)
+
+    h = 1e-4
+    gradient = np.array(
+        [
+            (
+                get_field_energy(points + h * np.eye(3)[:, [i]])
+                - get_field_energy(points - h * np.eye(3)[:, [i]])
+            )
+            / (2 * h)
+            for i in range(3)
+        ]
+    )
+    magnetic_volume = (4 / 3) * np.pi * ring_parameters["radius_particle"] ** 3
+    expected = (
+        0.5 * ring_parameters["magnetic_permeability"] * magnetic_volume * gradient
+    )
+
+    result = np.array(evaluate_ring_magnetic_force(*points, ring_parameters))
+
+    error = np.linalg.norm(result - expected, axis=0)
+    assert np.all(error < 1e-6 * np.linalg.norm(expected, axis=0))
+
+
+def test_ring_transverse_magnetization(ring_parameters):
+    # Test that a magnetization with a transverse component is rejected
+    ring_parameters["magnetization_direction"] = [1, 0, 1]
+    with pytest.raises(ValueError):
+        evaluate_ring_magnetic_field(4.0, 0.0, 1.0, ring_parameters)
+    with pytest.raises(ValueError):
+        evaluate_ring_magnetic_force(4.0, 0.0, 1.0, ring_parameters)
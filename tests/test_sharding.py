@@ -0,0 +1,67 @@
+import json
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+from magnetism.field_map import evaluate_grid, get_grid_axes
+from magnetism.sharding import (
+    claim_shard,
+    create_shards,
+    get_job_status,
+    merge_shards,
+    run_worker,
+)
+
+GRID = {"x": [3.0, 6.0, 5], "y": [-1.0, 1.0, 3], "z": [-2.0, 2.0, 4]}
+
+
+def test_sharded_map_with_several_workers(magnetic_parameters_base, tmp_path):
+    # Test that independent processes evaluate every shard exactly once
+    directory = str(tmp_path / "job")
+    job = create_shards(directory, magnetic_parameters_base, grid=GRID, shard_size=7)
+    assert len(job["shards"]) == 9
+
+    with multiprocessing.Pool(3) as pool:
+        n_shards = pool.map(run_worker, [directory] * 3)
+    assert sum(n_shards) == 9
+    assert get_job_status(directory) == {"done": 9, "claimed": 0, "open": 0}
+
+    merge_shards(directory, str(tmp_path / "map.npz"))
+    result = np.load(tmp_path / "map.npz")
+    expected = evaluate_grid(get_grid_axes(GRID), magnetic_parameters_base)
+    assert np.allclose(result["field"], expected["field"], rtol=1e-14)
+    assert np.allclose(result["force"], expected["force"], rtol=1e-14)
+    assert json.loads(str(result["magnetic_parameters"])) == magnetic_parameters_base
+
+
+def test_sharded_points_and_verification(magnetic_parameters_base, tmp_path):
+    directory = str(tmp_path / "job")
+    points_path = str(tmp_path / "points.npy")
+    np.save(points_path, np.random.default_rng(0).uniform(3, 6, (20, 3)))
+    create_shards(directory, magnetic_parameters_base, points=points_path, shard_size=8)
+
+    # an abandoned lock is only taken over after the timeout
+    first = claim_shard(directory)
+    assert claim_shard(directory).endswith("shard-00001.json")
+    os.utime(first.replace(".json", ".lock"), (0, 0))
+    assert claim_shard(directory, lock_timeout=3600) == first
+    assert claim_shard(directory, lock_timeout=3600).endswith("shard-00002.json")
+    assert not any(
+        name.endswith(".stale")
+        for name in os.listdir(os.path.join(directory, "shards"))
+    )
+    with pytest.raises(ValueError, match="not done"):
+        merge_shards(directory, str(tmp_path / "map.npz"))
+
+    for lock in ("shard-00000.lock", "shard-00001.lock", "shard-00002.lock"):
+        os.remove(os.path.join(directory, "shards", lock))
+    assert run_worker(directory) == 3
+
+    # a modified shard output fails the verification
+    output = os.path.join(directory, "shards", "shard-00002.npz")
+    data = dict(np.load(output))
+    data["field"][0, 0] += 1
+    np.savez(output, **data)
+    with pytest.raises(ValueError, match="checksum"):
+        merge_shards(directory, str(tmp_path / "map.npz"))
@@ -0,0 +1,87 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+from magnetism.batch_evaluation import (
+    evaluate_magnetic_field_batch,
+    evaluate_magnetic_force_batch,
+)
+from magnetism.shared_memory_coupling import CouplingRegion, CouplingServer
+
+
+def test_coupled_step(magnetic_parameters_base):
+    name = f"magnetism_test_{os.getpid()}"
+    points = np.random.default_rng(0).uniform(3, 8, (3, 40))
+    with CouplingRegion(name, capacity=64) as region:
+        server = CouplingServer(name, magnetic_parameters_base)
+        statistics = {}
+        thread = threading.Thread(
+            target=lambda: statistics.update(server.serve(timeout=10))
+        )
+        thread.start()
+
+        region.positions[:, :40] = points
+        kernel_time = region.evaluate(40, ("field", "force"), timeout=10)
+        with pytest.raises(ValueError):
+            region.submit(65)
+        region.stop()
+        thread.join()
+        server.close()
+
+        field = evaluate_magnetic_field_batch(*points, magnetic_parameters_base)
+        force = evaluate_magnetic_force_batch(*points, magnetic_parameters_base)
+        assert np.array_equal(region.field[:, :40], field)
+        assert np.array_equal(region.force[:, :40], force)
+    assert statistics["steps"] == 1 and statistics["points"] == 40
+    assert 0 < kernel_time <= statistics["kernel_time"]
+
+
+def test_standin_solver_process(magnetic_parameters_base, tmp_path):
+    # Test the coupling with the stand-in solver as a separate process
+    name = f"magnetism_solver_{os.getpid()}"
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"magnetic_parameters": magnetic_parameters_base}))
+    solver = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "magnetism.shared_memory_coupling",
+            str(config),
+            "--name",
+            name,
+            "--standin",
+            "1000",
+            "--steps",
+            "20",
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+        cwd=Path(__file__).parents[1],
+    )
+    with CouplingServer(name, magnetic_parameters_base) as server:
+        statistics = server.serve(timeout=30)
+    result = json.loads(solver.communicate(timeout=30)[0])
+
+    assert solver.returncode == 0
+    assert statistics["steps"] == result["steps"] == 20
+    assert statistics["points"] == 20 * 1000
+    assert result["round_trip_p50"] >= result["kernel_time_p50"] > 0
+
+
+def test_failed_step(magnetic_parameters_base, caplog):
+    # Test that a failing step is logged and reported to the solver
+    name = f"magnetism_error_{os.getpid()}"
+    del magnetic_parameters_base["magnetization"]
+    with CouplingRegion(name, capacity=8) as region:
+        with CouplingServer(name, magnetic_parameters_base) as server:
+            region.submit(8)
+            server.evaluate_step()
+        with pytest.raises(RuntimeError):
+            region.wait(timeout=1)
+    assert "step 1 failed" in caplog.text
+    assert "KeyError" in caplog.text
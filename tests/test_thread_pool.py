@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from magnetism.batch_evaluation import (
+    evaluate_magnetic_field_batch,
+    evaluate_magnetic_force_batch,
+)
+from magnetism.thread_pool import ThreadPoolEvaluator
+
+
+@pytest.mark.parametrize(
+    "quantity, reference",
+    [
+        ("field", evaluate_magnetic_field_batch),
+        ("force", evaluate_magnetic_force_batch),
+    ],
+)
+def test_thread_pool_matches_batch(magnetic_parameters_base, quantity, reference):
+    # Test that chunks evaluated by several threads give the serial result
+    magnetic_parameters = dict(magnetic_parameters_base, rotation_x=30)
+    rng = np.random.default_rng(3)
+    x, y, z = rng.uniform(-10, 10, (3, 25, 41))
+    expected = reference(x, y, z, magnetic_parameters)
+
+    with ThreadPoolEvaluator(threads=3, chunk_size=100) as pool:
+        result = pool.evaluate(quantity, x, y, z, magnetic_parameters)
+        out = np.empty((3, 25, 41))
+        getattr(pool, quantity)(x, y, z, magnetic_parameters, out=out)
+        empty = pool.evaluate(quantity, [], [], [], magnetic_parameters)
+
+    assert result.shape == (3, 25, 41)
+    assert empty.shape == (3, 0)
+    assert np.array_equal(result, expected, equal_nan=True)
+    assert np.array_equal(out, expected, equal_nan=True)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from magnetism.benchmark import BENCHMARK_PARAMETERS
+from magnetism.coordinate_transformation import (
+    is_inside_magnet,
+    transform_coordinates_forward,
+)
+from magnetism.magnetic_field import evaluate_magnetic_field
+from magnetism.magnetic_force import evaluate_magnetic_force
+from magnetism.validation import (
+    MODES,
+    evaluate_reference,
+    generate_validation_points,
+    get_relative_errors,
+    run_validation,
+)
+
+pytest.importorskip("mpmath")
+
+
+def test_generate_validation_points():
+    rng = np.random.default_rng(2)
+    parameters = dict(BENCHMARK_PARAMETERS, rotation_x=40, y_position=1.0)
+    inside = generate_validation_points("inside", 50, parameters, rng)
+    assert np.all(is_inside_magnet(*inside, parameters))
+
+    axis = generate_validation_points("axis", 50, parameters, rng)
+    rho, _, _ = transform_coordinates_forward(*axis, parameters)
+    assert np.all(rho <= 0.01 * parameters["radius_magnet"] + 1e-12)
+
+
+def test_reference_values(magnetic_parameters_base):
+    # Test the independent reference against the kernels away from the axis
+    parameters = dict(magnetic_parameters_base, rotation_x=20, rotation_y=-35)
+    x = np.array([3.0, 1.0, -4.0, 0.5])
+    y = np.array([0.5, 1.0, 2.0, -0.3])
+    z = np.array([4.0, 0.5, -6.0, 2.0])
+    reference = evaluate_reference(x, y, z, parameters)
+
+    field = evaluate_magnetic_field(x, y, z, parameters)
+    assert np.all(get_relative_errors(field, reference["field"]) < 1e-13)
+    outside = ~is_inside_magnet(x, y, z, parameters)
+    force = evaluate_magnetic_force(x, y, z, parameters)
+    assert np.all(get_relative_errors(force, reference["force"])[outside] < 1e-12)
+
+
+def test_run_validation():
+    results = run_validation(
+        {"batch": MODES["batch"]},
+        strata=["near_field", "inside"],
+        rotations=["rotated"],
+        n_points=4,
+        min_time=1e-3,
+    )
+    assert set(results) == {
+        "batch/field/near_field/rotated",
+        "batch/force/near_field/rotated",
+        "batch/field/inside/rotated",
+    }
+    for result in results.values():
+        assert result["max"] < 1e-12
+        assert result["p50"] <= result["p99"] <= result["max"]
+        assert result["throughput"] > 0